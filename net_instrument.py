@@ -0,0 +1,584 @@
+"""
+网络请求的耗时统计，供本目录下的各个脚本共用（weixin-word-ppt.py、weixin-gui.py、爬取七猫小说.py、爬起七猫小说GUI.py）。
+
+使用方法：用 get_http_session()（每个线程复用一个会话）或 create_http_session() 发送请求，
+请求的各阶段耗时自动记入全局的 network_stats；调用 configure_egress() 后请求分配到出口线路池的各条线路上。
+配置的线路池保存在模块变量 egress_pool 中，脚本中用 net_instrument.egress_pool 读取当前值。
+"""
+import datetime
+import ipaddress
+import json
+import math
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+import requests.adapters
+import urllib3
+
+
+# --- 网络耗时统计 ---
+# 每个请求按阶段记录耗时：建立连接（DNS 解析 + TCP 连接）、TLS握手（只有新建连接时才有）、首字节（服务器处理）
+# 和正文传输，按主机汇总到 HDR 风格的直方图（按 2 的幂分段、段内 64 个线性子桶，相对误差约 3%，内存占用固定），
+# 运行结束时输出 p50/p90/p99 和吞吐量，并可导出为 JSON，用于调整连接池大小和超时时间。
+NETWORK_PHASES = ('connect', 'tls', 'ttfb', 'transfer', 'total')
+NETWORK_PHASE_LABELS = {'connect': '建立连接', 'tls': 'TLS握手',
+                        'ttfb': '首字节', 'transfer': '传输', 'total': '总耗时'}
+HISTOGRAM_SUB_BUCKET_BITS = 6
+
+
+class LatencyHistogram:
+    """以微秒为单位记录耗时的 HDR 风格直方图，只保存非空桶的计数。"""
+
+    def __init__(self):
+        self.counts = {} # 桶序号 -> 次数
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    @staticmethod
+    def bucket_index(value_us: int) -> int:
+        shift = max(0, value_us.bit_length() - HISTOGRAM_SUB_BUCKET_BITS)
+        return (shift << HISTOGRAM_SUB_BUCKET_BITS) | (value_us >> shift)
+
+    @staticmethod
+    def bucket_upper_us(index: int) -> int:
+        shift = index >> HISTOGRAM_SUB_BUCKET_BITS
+        sub_bucket = index & ((1 << HISTOGRAM_SUB_BUCKET_BITS) - 1)
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        value_us = max(0, int(seconds * 1_000_000))
+        index = self.bucket_index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total_us += value_us
+        self.max_us = max(self.max_us, value_us)
+
+    def percentile_us(self, percent: float) -> int:
+        if not self.count:
+            return 0
+        target = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self.bucket_upper_us(index), self.max_us)
+        return self.max_us
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total_us += other.total_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_us / self.count / 1000, 3) if self.count else 0,
+            'p50_ms': self.percentile_us(50) / 1000,
+            'p90_ms': self.percentile_us(90) / 1000,
+            'p99_ms': self.percentile_us(99) / 1000,
+            'max_ms': self.max_us / 1000,
+            'buckets': [[self.bucket_upper_us(index), self.counts[index]] for index in sorted(self.counts)],
+        }
+
+
+class NetworkStats:
+    """按主机汇总的请求耗时、字节数和失败次数（线程安全）。"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.hosts = {}
+            self.started_at = time.time()
+
+    def record(self, host: str, phases: dict, bytes_read: int, failed: bool = False):
+        with self.lock:
+            host_stats = self.hosts.get(host)
+            if host_stats is None:
+                host_stats = self.hosts[host] = {
+                    'requests': 0, 'failed': 0, 'new_connections': 0, 'bytes': 0, 'busy_seconds': 0.0,
+                    'phases': {phase: LatencyHistogram() for phase in NETWORK_PHASES}}
+            host_stats['requests'] += 1
+            host_stats['failed'] += 1 if failed else 0
+            host_stats['new_connections'] += 1 if 'connect' in phases else 0
+            host_stats['bytes'] += bytes_read
+            host_stats['busy_seconds'] += phases.get('total', 0)
+            for phase, seconds in phases.items():
+                host_stats['phases'][phase].record(seconds)
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            wall_seconds = time.time() - self.started_at
+            total_bytes = sum(host_stats['bytes'] for host_stats in self.hosts.values())
+            return {
+                'started_at': datetime.datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+                'wall_seconds': round(wall_seconds, 3),
+                'bytes': total_bytes,
+                'throughput_bytes_per_s': round(total_bytes / wall_seconds) if wall_seconds > 0 else 0,
+                'hosts': {host: {
+                    'requests': host_stats['requests'],
+                    'failed': host_stats['failed'],
+                    'new_connections': host_stats['new_connections'],
+                    'bytes': host_stats['bytes'],
+                    # 按请求实际占用的时间计算，多个并发请求时可能高于整体吞吐量
+                    'throughput_bytes_per_s': round(host_stats['bytes'] / host_stats['busy_seconds'])
+                    if host_stats['busy_seconds'] > 0 else 0,
+                    'phases': {phase: histogram.to_dict() for phase, histogram in host_stats['phases'].items()
+                               if histogram.count},
+                } for host, host_stats in self.hosts.items()},
+            }
+
+    def export_json(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def report_lines(self) -> list[str]:
+        """多行文字报告：每个主机的请求数、吞吐量和各阶段 p50/p90/p99。"""
+        stats = self.to_dict()
+        lines = [f"网络统计: {sum(h['requests'] for h in stats['hosts'].values())} 次请求，"
+                 f"{stats['bytes'] / 1024 / 1024:.2f} MB，用时 {stats['wall_seconds']:.1f} 秒，"
+                 f"平均 {stats['throughput_bytes_per_s'] / 1024:.1f} KB/s"]
+        for host, host_stats in sorted(stats['hosts'].items(), key=lambda item: -item[1]['requests']):
+            lines.append(f"  {host}: {host_stats['requests']} 次请求（新建连接 {host_stats['new_connections']}，"
+                         f"失败 {host_stats['failed']}），{host_stats['bytes'] / 1024:.1f} KB，"
+                         f"{host_stats['throughput_bytes_per_s'] / 1024:.1f} KB/s")
+            for phase in NETWORK_PHASES:
+                if phase in host_stats['phases']:
+                    phase_stats = host_stats['phases'][phase]
+                    lines.append(f"    {NETWORK_PHASE_LABELS[phase]:<6} p50 {phase_stats['p50_ms']:8.1f}ms  "
+                                 f"p90 {phase_stats['p90_ms']:8.1f}ms  p99 {phase_stats['p99_ms']:8.1f}ms")
+        return lines
+
+    def live_summary(self) -> str:
+        """一行的实时摘要，供界面显示。"""
+        with self.lock:
+            requests_count = sum(host_stats['requests'] for host_stats in self.hosts.values())
+            total_bytes = sum(host_stats['bytes'] for host_stats in self.hosts.values())
+            ttfb = LatencyHistogram()
+            for host_stats in self.hosts.values():
+                ttfb.merge(host_stats['phases']['ttfb'])
+            wall_seconds = max(time.time() - self.started_at, 0.001)
+        return (f"网络: {requests_count} 次请求，{total_bytes / 1024 / 1024:.2f} MB，"
+                f"{total_bytes / wall_seconds / 1024:.1f} KB/s，首字节 p50 {ttfb.percentile_us(50) / 1000:.0f}ms / "
+                f"p99 {ttfb.percentile_us(99) / 1000:.0f}ms")
+
+
+network_stats = NetworkStats()
+_request_timing = threading.local() # 当前线程正在发送的请求的阶段耗时
+
+
+class TimedConnectionMixin:
+    """
+    为 urllib3 连接记录建立连接和 TLS 握手的耗时。
+    DNS 解析和 TCP 连接都在 urllib3 的 _new_conn 中完成（含多地址依次尝试），两者合计为一个阶段，
+    只在外面计时，不改变连接过程。
+    """
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        conn = super()._new_conn()
+        phases = getattr(_request_timing, 'phases', None)
+        if phases is not None:
+            phases['connect'] = time.perf_counter() - start
+        return conn
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        phases = getattr(_request_timing, 'phases', None)
+        if phases is not None and 'connect' in phases and isinstance(self, urllib3.connection.HTTPSConnection):
+            phases['tls'] = max(0.0, time.perf_counter() - start - phases['connect'])
+
+
+class TimedHTTPConnection(TimedConnectionMixin, urllib3.connection.HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, urllib3.connection.HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(requests.adapters.HTTPAdapter):
+    """使用带计时连接的 requests 适配器，每个请求的阶段耗时和字节数在正文读完（或响应关闭）时记入 network_stats。"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+    def send(self, request, *args, **kwargs):
+        host = urlsplit(request.url).hostname or ''
+        phases = _request_timing.phases = {}
+        start = time.perf_counter()
+        try:
+            response = super().send(request, *args, **kwargs)
+        except Exception:
+            phases['total'] = time.perf_counter() - start
+            network_stats.record(host, phases, 0, failed=True)
+            raise
+        finally:
+            _request_timing.phases = None
+
+        headers_at = time.perf_counter()
+        phases['ttfb'] = max(0.0, headers_at - start - sum(phases.get(phase, 0) for phase in ('connect', 'tls')))
+        raw_response = response.raw
+        original_stream = raw_response.stream
+        original_release_conn = raw_response.release_conn
+        state = {'bytes': 0, 'reading': False, 'finished': False}
+
+        def finish():
+            if not state['finished']:
+                state['finished'] = True
+                end = time.perf_counter()
+                phases['transfer'] = end - headers_at
+                phases['total'] = end - start
+                network_stats.record(host, phases, max(state['bytes'], raw_response.tell()),
+                                     failed=response.status_code >= 400)
+
+        def counting_stream(*stream_args, **stream_kwargs):
+            # urllib3 在读到最后一块数据的过程中就会归还连接，所以正文读完后再统计
+            chunks = original_stream(*stream_args, **stream_kwargs)
+            while True:
+                state['reading'] = True
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                finally:
+                    state['reading'] = False
+                state['bytes'] += len(chunk)
+                yield chunk
+            finish()
+
+        def release_conn():
+            if not state['reading']: # 响应被提前关闭（如只读取了文件头）
+                finish()
+            original_release_conn()
+
+        if raw_response.connection is None: # 没有正文、连接已经归还
+            finish()
+        else:
+            raw_response.stream = counting_stream
+            raw_response.release_conn = release_conn
+        return response
+
+
+# --- 出口线路池 ---
+# 可配置多条出口线路：HTTP/SOCKS 代理（如 http://127.0.0.1:8080）、本机的源 IP 地址（如 192.168.1.20，
+# 用于多网卡/多 IP 的机器）或 direct（直连）。配置后所有请求按负载和错误率分配到各线路：
+# 得分 =（进行中的请求数 + 1）/（1 - 错误率），选择得分最低的线路，吞吐量随线路数增加。
+# 连接失败、被限流（403/429）和 5xx 计为错误；连续失败或错误率过高的线路自动隔离（每次隔离时间加倍），
+# 到期后通过健康检查重新启用：配置了检查地址时在后台请求该地址，否则放行一个真实请求试探。
+# 连接失败或被限流的 GET/HEAD 请求自动换一条线路重试。
+EGRESS_FAILOVER_ATTEMPTS = 3 # 一个请求最多尝试的线路数
+EGRESS_ERROR_STATUS = (403, 429) # 视为被限流的状态码（另外所有 5xx 也计为错误）
+EGRESS_ERROR_EWMA_ALPHA = 0.2 # 错误率（指数加权平均）的平滑系数
+EGRESS_MAX_CONSECUTIVE_FAILURES = 3
+EGRESS_MAX_ERROR_RATE = 0.5 # 至少 EGRESS_MIN_SAMPLES 个请求后错误率超过此值即隔离
+EGRESS_MIN_SAMPLES = 10
+EGRESS_QUARANTINE_SECONDS = 30 # 首次隔离时间，之后每次加倍
+EGRESS_MAX_QUARANTINE_SECONDS = 600
+EGRESS_HEALTH_CHECK_TIMEOUT = 10
+EGRESS_POOL_MAXSIZE = 32 # 每条线路对每个主机保持的最大连接数
+SOCKS_PROXY_SCHEMES = ('socks4', 'socks4a', 'socks5', 'socks5h')
+
+
+class SourceAddressHTTPAdapter(TimedHTTPAdapter):
+    """从指定的本机 IP 地址发起连接的适配器。"""
+
+    def __init__(self, source_ip: str, *args, **kwargs):
+        self.source_ip = source_ip # init_poolmanager 在父类构造函数中调用，需要先设置
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['source_address'] = (self.source_ip, 0)
+        super().init_poolmanager(*args, **kwargs)
+
+
+class EgressRoute:
+    """一条出口线路：自己的连接池，以及负载、错误统计和隔离状态（由 EgressPool 加锁维护）。"""
+
+    def __init__(self, spec: str):
+        self.name = spec
+        self.proxies = None # None 表示沿用会话的代理设置（direct）
+        if spec == 'direct':
+            self.adapter = TimedHTTPAdapter(pool_maxsize=EGRESS_POOL_MAXSIZE)
+        elif '://' in spec:
+            scheme = urlsplit(spec).scheme.lower()
+            if scheme in SOCKS_PROXY_SCHEMES:
+                try:
+                    import socks # noqa: F401  requests 的 SOCKS 支持依赖 PySocks
+                except ImportError:
+                    raise ValueError(f"SOCKS 代理需要安装 PySocks（pip install requests[socks]）: {spec}")
+            elif scheme not in ('http', 'https'):
+                raise ValueError(f"不支持的代理类型: {spec}")
+            self.proxies = {'http': spec, 'https': spec}
+            self.adapter = TimedHTTPAdapter(pool_maxsize=EGRESS_POOL_MAXSIZE)
+        else:
+            source_ip = spec[len('source:'):] if spec.startswith('source:') else spec
+            try:
+                ipaddress.ip_address(source_ip)
+            except ValueError:
+                raise ValueError(f"无法识别的出口线路（应为代理URL、本机IP地址或 direct）: {spec}")
+            self.proxies = {} # 从指定地址直连，不经过环境变量中的代理
+            self.adapter = SourceAddressHTTPAdapter(source_ip, pool_maxsize=EGRESS_POOL_MAXSIZE)
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.quarantined_until = 0.0 # time.monotonic() 时间；非 0 表示处于隔离或等待检查状态
+        self.quarantine_seconds = EGRESS_QUARANTINE_SECONDS
+        self.probing = False # 正在进行健康检查或试探请求
+
+    def score(self) -> float:
+        return (self.in_flight + 1) / max(0.05, 1.0 - self.error_rate)
+
+
+class EgressPool:
+    """出口线路池：按负载和错误率选择线路，自动隔离和重新启用不健康的线路（线程安全）。"""
+
+    def __init__(self, specs, check_url: str = None, log=print, check_headers: dict = None):
+        self.routes = [EgressRoute(spec) for spec in dict.fromkeys(spec.strip() for spec in specs if spec.strip())]
+        if not self.routes:
+            raise ValueError("没有配置出口线路")
+        self.check_url = check_url
+        self.check_headers = check_headers or {}
+        self.log = log
+        self.lock = threading.Lock()
+
+    def acquire(self, exclude=()):
+        """选出一条线路并计入进行中的请求；exclude 中的线路不参与选择（不能排除全部线路）。"""
+        now = time.monotonic()
+        with self.lock:
+            candidates = []
+            probe_route = None
+            for route in self.routes:
+                if route in exclude or route.quarantined_until > now:
+                    continue
+                if route.quarantined_until: # 隔离已到期，等待健康检查
+                    if route.probing:
+                        continue
+                    route.probing = True
+                    if self.check_url:
+                        threading.Thread(target=self._health_check, args=(route,), daemon=True).start()
+                        continue
+                    probe_route = route # 没有检查地址：放行这一个请求作为试探
+                    break
+                candidates.append(route)
+            if probe_route is not None:
+                route = probe_route
+            elif candidates:
+                route = min(candidates, key=lambda candidate: (candidate.score(), random.random()))
+            else:
+                # 其余线路都在隔离中：使用最早到期的线路，而不是让请求直接失败
+                route = min((route for route in self.routes if route not in exclude),
+                            key=lambda candidate: candidate.quarantined_until)
+            route.in_flight += 1
+            return route
+
+    def release(self, route: EgressRoute, ok: bool):
+        """请求结束（正文读完、响应关闭或失败）后更新线路的统计，必要时隔离或重新启用。"""
+        with self.lock:
+            route.in_flight -= 1
+            route.requests += 1
+            route.error_rate += EGRESS_ERROR_EWMA_ALPHA * ((0.0 if ok else 1.0) - route.error_rate)
+            if ok:
+                route.consecutive_failures = 0
+                if route.probing and not self.check_url:
+                    self._readmit(route)
+                return
+            route.failures += 1
+            route.consecutive_failures += 1
+            if route.quarantined_until > time.monotonic():
+                return # 已在隔离中，隔离前发出的请求陆续失败
+            if route.probing or route.consecutive_failures >= EGRESS_MAX_CONSECUTIVE_FAILURES or (
+                    route.requests >= EGRESS_MIN_SAMPLES and route.error_rate > EGRESS_MAX_ERROR_RATE):
+                self._quarantine(route)
+
+    def _quarantine(self, route: EgressRoute):
+        if route.quarantined_until: # 检查或试探失败：隔离时间加倍
+            route.quarantine_seconds = min(route.quarantine_seconds * 2, EGRESS_MAX_QUARANTINE_SECONDS)
+        route.quarantined_until = time.monotonic() + route.quarantine_seconds
+        route.probing = False
+        self.log(f"出口线路 {route.name} 不健康（错误率 {route.error_rate:.0%}），隔离 {route.quarantine_seconds:.0f} 秒")
+
+    def _readmit(self, route: EgressRoute):
+        route.quarantined_until = 0.0
+        route.quarantine_seconds = EGRESS_QUARANTINE_SECONDS
+        route.probing = False
+        route.consecutive_failures = 0
+        route.error_rate = 0.0
+        self.log(f"出口线路 {route.name} 已恢复")
+
+    def _health_check(self, route: EgressRoute):
+        try:
+            request = requests.Request('GET', self.check_url, headers=self.check_headers).prepare()
+            with route.adapter.send(request, timeout=EGRESS_HEALTH_CHECK_TIMEOUT,
+                                    proxies=route.proxies or {}) as response:
+                ok = response.status_code < 400
+        except requests.exceptions.RequestException:
+            ok = False
+        with self.lock:
+            if ok:
+                self._readmit(route)
+            else:
+                self._quarantine(route)
+
+    def to_dict(self) -> dict:
+        now = time.monotonic()
+        with self.lock:
+            return {route.name: {
+                'state': 'quarantined' if route.quarantined_until > now else (
+                    'checking' if route.quarantined_until else 'healthy'),
+                'in_flight': route.in_flight,
+                'requests': route.requests,
+                'failures': route.failures,
+                'error_rate': round(route.error_rate, 3),
+            } for route in self.routes}
+
+    def report_lines(self) -> list[str]:
+        state_labels = {'healthy': '正常', 'quarantined': '隔离中', 'checking': '等待检查'}
+        return ["出口线路:"] + [
+            f"  {name}: {state_labels[route['state']]}，{route['requests']} 次请求，失败 {route['failures']}，"
+            f"错误率 {route['error_rate']:.0%}" for name, route in self.to_dict().items()]
+
+    def close(self):
+        for route in self.routes:
+            route.adapter.close()
+
+
+class EgressHTTPAdapter(requests.adapters.BaseAdapter):
+    """把每个请求分配到出口线路池中的一条线路发送；连接失败或被限流的 GET/HEAD 请求换线路重试。"""
+
+    def __init__(self, pool: EgressPool):
+        super().__init__()
+        self.pool = pool
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        attempts = min(EGRESS_FAILOVER_ATTEMPTS, len(self.pool.routes)) if request.method in ('GET', 'HEAD') else 1
+        tried_routes = []
+        while True:
+            route = self.pool.acquire(exclude=tried_routes)
+            tried_routes.append(route)
+            try:
+                response = route.adapter.send(request, stream=stream, timeout=timeout, verify=verify, cert=cert,
+                                              proxies=proxies if route.proxies is None else route.proxies)
+            except requests.exceptions.ConnectionError: # 包括代理错误和连接超时
+                self.pool.release(route, False)
+                if len(tried_routes) >= attempts:
+                    raise
+                continue
+            except Exception:
+                self.pool.release(route, False)
+                raise
+            ok = response.status_code < 500 and response.status_code not in EGRESS_ERROR_STATUS
+            if response.status_code not in EGRESS_ERROR_STATUS or len(tried_routes) >= attempts:
+                self._release_when_done(route, response, ok)
+                return response
+            response.close() # 被限流：换一条线路
+            self.pool.release(route, False)
+
+    def _release_when_done(self, route: EgressRoute, response, ok: bool):
+        """正文读完（或响应关闭）时才归还线路，读取正文出错也记为该线路的失败。"""
+        raw_response = response.raw
+        if raw_response.connection is None: # 没有正文、连接已经归还
+            self.pool.release(route, ok)
+            return
+        original_stream = raw_response.stream
+        original_release_conn = raw_response.release_conn
+        state = {'ok': ok, 'reading': False, 'released': False}
+
+        def release():
+            if not state['released']:
+                state['released'] = True
+                self.pool.release(route, state['ok'])
+
+        def tracking_stream(*stream_args, **stream_kwargs):
+            # 与 TimedHTTPAdapter 相同：urllib3 在读最后一块数据（或出错）时就会归还连接，所以等正文读完再归还线路
+            chunks = original_stream(*stream_args, **stream_kwargs)
+            while True:
+                state['reading'] = True
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                except Exception:
+                    state['ok'] = False
+                    release()
+                    raise
+                finally:
+                    state['reading'] = False
+                yield chunk
+            release()
+
+        def release_conn():
+            original_release_conn()
+            if not state['reading']: # 响应被提前关闭
+                release()
+
+        raw_response.stream = tracking_stream
+        raw_response.release_conn = release_conn
+
+    def close(self):
+        pass # 各线路的连接池由 EgressPool 统一持有
+
+
+egress_pool = None # 配置了出口线路时为 EgressPool
+
+
+def configure_egress(specs, check_url: str = None, log=print, check_headers: dict = None):
+    """
+    按线路配置（代理URL、本机IP地址或 direct）设置全局出口线路池；specs 为空时恢复直连。
+    check_headers 为健康检查请求使用的请求头（如各脚本的 User-Agent）。
+    """
+    global egress_pool
+    new_pool = EgressPool(specs, check_url, log, check_headers) if specs else None # 配置有误时保留原来的线路池
+    if egress_pool is not None:
+        egress_pool.close()
+    egress_pool = new_pool
+    return egress_pool
+
+
+def read_egress_file(path: str) -> list[str]:
+    """读取线路配置文件：每行一条线路，# 开头的行为注释。"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+
+
+# --- 会话 ---
+def create_http_session() -> requests.Session:
+    """创建记录网络耗时的 requests.Session；配置了出口线路池时请求经由线路池发送。"""
+    session = requests.Session()
+    adapter = EgressHTTPAdapter(egress_pool) if egress_pool is not None else TimedHTTPAdapter()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_thread_local = threading.local()
+
+
+def get_http_session() -> requests.Session:
+    """返回当前线程复用的 requests.Session（保持连接复用），请求耗时记入 network_stats。"""
+    session = getattr(_thread_local, 'http_session', None)
+    if session is None or _thread_local.egress_pool is not egress_pool: # 出口线路配置改变后重新创建
+        session = create_http_session()
+        _thread_local.http_session = session
+        _thread_local.egress_pool = egress_pool
+    return session
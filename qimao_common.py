@@ -0,0 +1,856 @@
+"""
+七猫小说抓取脚本共用的章节处理代码（爬取七猫小说.py、爬起七猫小说GUI.py）：编码识别、流式章节提取、
+重复行去除、章节存储和全文索引。两个脚本打开同一个全文索引数据库，表结构和切分方式只在这里维护。
+"""
+import codecs
+import collections
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+import unicodedata
+import zlib
+from html.parser import HTMLParser
+from urllib.parse import urlsplit, urljoin
+
+from net_instrument import get_http_session
+
+
+# --- 编码识别 ---
+# 依次使用 Content-Type 头、页面开头的 <meta charset>、按域名缓存的结果，
+# 最后才对有限长度的样本做统计检测，避免 apparent_encoding 对整页做字符集检测。
+ENCODING_SNIFF_BYTES = 4096 # 查找 <meta charset> 时读取的字节数
+ENCODING_DETECT_BYTES = 32 * 1024 # 统计检测时最多使用的样本字节数
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([A-Za-z0-9_\-]+)', re.IGNORECASE)
+host_encoding_cache = {} # 域名 -> 上次识别出的编码
+
+
+def normalize_encoding(name):
+    """规范化编码名称；GBK/GB2312 统一为其超集 GB18030。无法识别时返回 None。"""
+    try:
+        encoding = codecs.lookup(name.strip().strip('"\'')).name
+    except (LookupError, AttributeError):
+        return None
+    return 'gb18030' if encoding in ('gbk', 'gb2312') else encoding
+
+
+def detect_sample_encoding(sample: bytes):
+    """对有限长度的样本做编码检测：先严格按 UTF-8 解码，失败再用 charset_normalizer。"""
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        if e.start >= len(sample) - 3 and len(sample) == ENCODING_DETECT_BYTES: # 只是样本截断在多字节字符中间
+            return 'utf-8'
+    try:
+        from charset_normalizer import from_bytes
+        best_match = from_bytes(sample).best()
+        if best_match:
+            return normalize_encoding(best_match.encoding)
+    except ImportError:
+        pass
+    return 'gb18030'
+
+
+def resolve_encoding(host, content_type, head: bytes):
+    """根据 Content-Type 头和正文开头的字节（至少 ENCODING_DETECT_BYTES，正文更短时为全部）确定编码。"""
+    for param in content_type.split(';')[1:]:
+        key, _, value = param.partition('=')
+        if key.strip().lower() == 'charset':
+            encoding = normalize_encoding(value)
+            if encoding:
+                host_encoding_cache[host] = encoding
+                return encoding
+
+    meta_match = META_CHARSET_PATTERN.search(head[:ENCODING_SNIFF_BYTES])
+    if meta_match:
+        encoding = normalize_encoding(meta_match.group(1).decode('ascii'))
+        if encoding:
+            host_encoding_cache[host] = encoding
+            return encoding
+
+    if host in host_encoding_cache:
+        return host_encoding_cache[host]
+
+    encoding = detect_sample_encoding(head[:ENCODING_DETECT_BYTES])
+    host_encoding_cache[host] = encoding
+    return encoding
+
+
+def resolve_response_encoding(response):
+    """返回 response 正文应使用的编码。"""
+    return resolve_encoding(urlsplit(response.url).hostname, response.headers.get('Content-Type', ''),
+                            response.content[:ENCODING_DETECT_BYTES])
+
+
+# --- 流式章节提取 ---
+# ChapterStream 边下载边用增量 HTML 解析器提取章节：迭代时先产生标题，再逐段产生正文，
+# 各个输出端（文件、屏幕/日志、组装为列表）直接消费这个流。内存中只保留正在解析的一段和网络缓冲区，
+# 不再同时持有整页 HTML、解析树和段落列表，大量章节并发处理时每个章节的内存占用基本固定。
+# 正文区域按 content_selectors 中的选择器查找，取文档中第一个与任一选择器匹配的元素。
+STREAM_CHUNK_BYTES = 16 * 1024 # 流式解析时每次从网络读取的字节数
+STREAM_WRITE_BUFFER_BYTES = 64 * 1024 # 流式写入章节文件时的缓冲区大小
+STREAM_TIMEOUT_SECONDS = 20
+STREAM_CONTENT_SELECTORS = ( # (标签, 属性, 值)，属性为 None 时只按标签匹配
+    ('div', 'class', 'article'),
+    ('div', 'id', 'content'),
+    ('article', None, None),
+    ('div', 'class', 'content'),
+    ('div', 'class', 'entry-content'),
+)
+
+
+class ChapterStreamParser(HTMLParser):
+    """
+    增量解析章节页面：第一个 h2.chapter-title 为标题（正文开始前没有时使用第一个 <h1>），
+    第一个正文区域中的每个 <p> 为一段，正文区域中没有 <p> 时按文字行分段；同时记录第一个“下一章”链接。
+    解析结果按出现顺序放入 events（('title', 文本) 或 ('paragraph', 文本)）。
+    """
+
+    def __init__(self, page_url, content_selectors=STREAM_CONTENT_SELECTORS):
+        super().__init__(convert_charrefs=True)
+        self.page_url = page_url
+        self.content_selectors = content_selectors
+        self.events = collections.deque()
+        self.next_url = None
+        self.content_found = False
+        self._title_found = False
+        self._title_parts = None # 正在读取的标题文字片段
+        self._h1_title = None
+        self._h1_parts = None
+        self._content_tag = None # 位于正文区域内时，正文区域的标签名
+        self._content_depth = 0 # 正文区域内同名标签的嵌套层数
+        self._paragraph_count = 0
+        self._paragraph_parts = None # 正在读取的段落文字片段
+        self._loose_lines = [] # 正文区域中 <p> 之外的文字行，只保留到出现第一个 <p> 为止
+        self._link = None # 正在读取的链接 (href, 文字片段)
+
+    @staticmethod
+    def _has_class(attrs, class_name):
+        return class_name in (dict(attrs).get('class') or '').split()
+
+    def _matches_content_selector(self, tag, attrs):
+        attributes = dict(attrs)
+        for selector_tag, attribute, value in self.content_selectors:
+            if tag != selector_tag:
+                continue
+            if attribute is None:
+                return True
+            attribute_value = attributes.get(attribute) or ''
+            if (value in attribute_value.split()) if attribute == 'class' else attribute_value == value:
+                return True
+        return False
+
+    def _emit_title(self, title):
+        self._title_found = True
+        self.events.append(('title', title))
+
+    def _end_paragraph(self):
+        if self._paragraph_parts is not None:
+            self._paragraph_count += 1
+            self.events.append(('paragraph', ''.join(self._paragraph_parts)))
+            self._paragraph_parts = None
+
+    def handle_starttag(self, tag, attrs):
+        if self._content_tag:
+            if tag == self._content_tag:
+                self._content_depth += 1
+            if tag == 'p':
+                self._end_paragraph() # 未闭合的 <p> 遇到下一个 <p> 时结束
+                self._paragraph_parts = []
+                self._loose_lines = []
+        elif not self.content_found and self._matches_content_selector(tag, attrs):
+            self.content_found = True
+            self._content_tag = tag
+            self._content_depth = 1
+            if not self._title_found and self._title_parts is None and self._h1_title is not None:
+                self._emit_title(self._h1_title) # 正文之前没有 h2.chapter-title
+        if tag == 'h2' and not self._title_found and self._has_class(attrs, 'chapter-title'):
+            self._title_parts = []
+        elif tag == 'h1' and self._h1_title is None:
+            self._h1_parts = []
+        elif tag == 'a' and self.next_url is None and dict(attrs).get('href'):
+            self._link = (dict(attrs)['href'], [])
+
+    def handle_endtag(self, tag):
+        if tag == 'p':
+            self._end_paragraph()
+        elif tag == self._content_tag:
+            self._content_depth -= 1
+            if not self._content_depth:
+                self._end_paragraph()
+                self._content_tag = None
+                if not self._paragraph_count: # 没有 <p>：按正文区域的文字行分段
+                    for line in self._loose_lines:
+                        self.events.append(('paragraph', line))
+                self._loose_lines = []
+        if tag == 'h2' and self._title_parts is not None:
+            self._emit_title(''.join(self._title_parts))
+            self._title_parts = None
+        elif tag == 'h1' and self._h1_parts is not None:
+            self._h1_title = ''.join(self._h1_parts)
+            self._h1_parts = None
+        elif tag == 'a' and self._link is not None:
+            href, link_parts = self._link
+            self._link = None
+            if '下一章' in ''.join(link_parts) and not href.startswith('javascript'):
+                self.next_url = urljoin(self.page_url, href)
+
+    def handle_data(self, data):
+        if self._link is not None:
+            self._link[1].append(data)
+        text = data.strip() # 与 get_text(strip=True) 一致：每段文字去掉首尾空白后直接拼接
+        if not text:
+            return
+        for parts in (self._title_parts, self._h1_parts, self._paragraph_parts):
+            if parts is not None:
+                parts.append(text)
+        if self._content_tag and self._paragraph_parts is None and not self._paragraph_count:
+            self._loose_lines.extend(line.strip() for line in text.split('\n') if line.strip())
+
+    def close(self):
+        super().close()
+        if not self._title_found and self._h1_title is not None:
+            self._emit_title(self._h1_title)
+
+
+class ChapterStream:
+    """
+    流式获取一个章节。迭代时第一项为章节标题（未找到时为 "未找到标题"），之后依次为各段正文。
+    迭代结束后 next_url 为“下一章”URL（没有时为 None），content_found 表示是否找到正文区域。
+    请求或读取失败时在迭代过程中抛出 requests.exceptions.RequestException。
+    """
+
+    def __init__(self, url, session=None, headers=None, timeout=STREAM_TIMEOUT_SECONDS,
+                 content_selectors=STREAM_CONTENT_SELECTORS, chunk_size=STREAM_CHUNK_BYTES):
+        self.url = url
+        self.session = session
+        self.headers = headers
+        self.timeout = timeout
+        self.content_selectors = content_selectors
+        self.chunk_size = chunk_size
+        self.next_url = None
+        self.content_found = False
+
+    def __iter__(self):
+        response = (self.session or get_http_session()).get(self.url, headers=self.headers, timeout=self.timeout,
+                                                            stream=True)
+        with response:
+            response.raise_for_status()
+            chunks = response.iter_content(self.chunk_size)
+            head = b''
+            for chunk in chunks: # 只缓冲确定编码所需的开头部分
+                head += chunk
+                if len(head) >= ENCODING_DETECT_BYTES:
+                    break
+            encoding = resolve_encoding(urlsplit(response.url).hostname, response.headers.get('Content-Type', ''), head)
+            decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+            parser = ChapterStreamParser(response.url, self.content_selectors)
+            pending_paragraphs = [] # 标题出现之前解析出的段落（正常页面中为空）
+            title_sent = False
+
+            for data in itertools.chain((head,), chunks, (None,)):
+                if data is None:
+                    parser.feed(decoder.decode(b'', final=True))
+                    parser.close()
+                else:
+                    parser.feed(decoder.decode(data))
+                while parser.events:
+                    kind, text = parser.events.popleft()
+                    if kind == 'title':
+                        title_sent = True
+                        yield text
+                        yield from pending_paragraphs
+                        pending_paragraphs = []
+                    elif title_sent:
+                        yield text
+                    else:
+                        pending_paragraphs.append(text)
+
+            self.next_url = parser.next_url
+            self.content_found = parser.content_found
+            if not title_sent:
+                yield "未找到标题"
+                yield from pending_paragraphs
+
+    def error_message(self, paragraph_count):
+        """迭代结束后调用：没有找到正文时返回错误信息，否则返回 None。"""
+        if not self.content_found:
+            return "未能找到主要内容区域。请检查HTML结构或尝试不同的选择器。"
+        if not paragraph_count:
+            return "未能提取到小说正文内容。"
+        return None
+
+
+class ChapterAssembler:
+    """把章节流组装为 (标题, 段落列表)，用于需要完整章节的场合（全文索引、章节存储）。"""
+
+    def __init__(self):
+        self.chapter_title = None
+        self.novel_paragraphs_text = []
+
+    def start(self, chapter_title):
+        self.chapter_title = chapter_title
+
+    def paragraph(self, paragraph_text):
+        self.novel_paragraphs_text.append(paragraph_text)
+
+    def finish(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+def pump_chapter(chapter_stream, *sinks):
+    """
+    把章节流依次送入各个输出端（start(标题)、paragraph(段落)...、finish()）。
+    流中途失败时调用各输出端的 abort() 并重新抛出异常。返回 (章节标题, 正文段落数)。
+    """
+    chapter_title = None
+    paragraph_count = 0
+    started = False
+    try:
+        for item in chapter_stream:
+            if not started:
+                started = True
+                chapter_title = item
+                for sink in sinks:
+                    sink.start(item)
+            else:
+                paragraph_count += 1
+                for sink in sinks:
+                    sink.paragraph(item)
+    except BaseException:
+        if started:
+            for sink in sinks:
+                sink.abort()
+        raise
+    for sink in sinks:
+        sink.finish()
+    return chapter_title, paragraph_count
+
+
+# --- 重复行去除：同一本书各章节中反复出现的推广、水印行 ---
+# 每行正文先规范化（全角转半角、去空白、数字统一为 0）再取 64 位哈希，按“出现在多少章中”计数。
+# 计数使用有损计数（lossy counting）：每 BOILERPLATE_BUCKET_CHAPTERS 章清理一次只出现过零星几次的行，
+# 内存只与近期章节和高频行有关，不随全书章节数增长；高频行的计数误差不超过 1/BUCKET 的章节数。
+# 一本书至少处理了 BOILERPLATE_MIN_CHAPTERS 章后，出现在 BOILERPLATE_MIN_FREQUENCY 以上章节中的行
+# 在保存时去除。对白（以引号开头的行）和很短的行（文字少于 BOILERPLATE_MIN_LINE_CHARS 个，如“嗯。”、“……”、
+# 场景分隔符）即使重复也视为正文，不会被去除。
+# 计数器保存在书籍目录下，之后同步新章节时继续使用；开始阶段的前几章还无法判断，会原样保存。
+BOILERPLATE_FILE_NAME = '.boilerplate.json'
+BOILERPLATE_MIN_CHAPTERS = 8
+BOILERPLATE_MIN_FREQUENCY = 0.5
+BOILERPLATE_BUCKET_CHAPTERS = 50
+BOILERPLATE_REPORT_LINES = 5 # 报告中列出的被去除最多的行数
+BOILERPLATE_REPORT_HEADER = "去除重复行 {total} 处（{distinct} 种，{kilobytes:.1f} KB）:"
+DIALOGUE_QUOTES = ('"', "'", '“', '‘', '「', '『')
+BOILERPLATE_MIN_LINE_CHARS = 5 # 规范化后文字（字母、数字、汉字）少于此数的行不参与统计
+
+
+def boilerplate_line_hash(paragraph_text):
+    """规范化一行正文并返回 64 位哈希；空行、对白和很短的行返回 None（不参与统计）。"""
+    text = re.sub(r'\d+', '0', re.sub(r'\s+', '', unicodedata.normalize('NFKC', paragraph_text).lower()))
+    if text.startswith(DIALOGUE_QUOTES) or sum(char.isalnum() for char in text) < BOILERPLATE_MIN_LINE_CHARS:
+        return None
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class BoilerplateDetector:
+    """一本书的重复行计数器（线程安全），path 为 None 时不保存到文件。"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.chapters = 0
+        self.counts = {} # 行哈希 -> [出现的章节数, 加入计数器时可能漏计的最大章节数]
+        self.dropped = {} # 被去除的行哈希 -> [去除次数, 原文]
+        self.dropped_bytes = 0
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+                self.chapters = saved['chapters']
+                self.counts = {line_hash: [count, delta] for line_hash, count, delta in saved['counts']}
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"警告：重复行计数器读取失败，重新开始统计 - {e}")
+
+    def check(self, paragraph_text, line_hash, observed=False):
+        """
+        判断一行是否应去除，并记入报告。line_hash 为 boilerplate_line_hash 的结果；
+        observed 表示所在章节已计入计数器，否则把正在处理的这一章计算在内。
+        """
+        if line_hash is None:
+            return False
+        pending = 0 if observed else 1
+        with self.lock:
+            chapters = self.chapters + pending
+            if (chapters < BOILERPLATE_MIN_CHAPTERS or
+                    (self.counts.get(line_hash, (0,))[0] + pending) / chapters < BOILERPLATE_MIN_FREQUENCY):
+                return False
+            dropped = self.dropped.setdefault(line_hash, [0, paragraph_text])
+            dropped[0] += 1
+            self.dropped_bytes += len(paragraph_text.encode('utf-8')) + 1
+            return True
+
+    def observe(self, line_hashes):
+        """一章处理完毕后，把该章出现过的行（哈希集合）计入计数器。"""
+        with self.lock:
+            self.chapters += 1
+            bucket = -(-self.chapters // BOILERPLATE_BUCKET_CHAPTERS)
+            for line_hash in line_hashes:
+                entry = self.counts.get(line_hash)
+                if entry is None:
+                    self.counts[line_hash] = [1, bucket - 1]
+                else:
+                    entry[0] += 1
+            if self.chapters % BOILERPLATE_BUCKET_CHAPTERS == 0:
+                self.counts = {line_hash: entry for line_hash, entry in self.counts.items()
+                               if entry[0] + entry[1] > bucket}
+
+    def filter(self, novel_paragraphs_text, observe=True):
+        """返回去除重复行后的段落列表；observe 为 False 时只按已有的统计去除（如两遍处理的第二遍）。"""
+        line_hashes = [boilerplate_line_hash(paragraph_text) for paragraph_text in novel_paragraphs_text]
+        kept = [paragraph_text for paragraph_text, line_hash in zip(novel_paragraphs_text, line_hashes)
+                if not self.check(paragraph_text, line_hash, observed=not observe)]
+        if observe:
+            self.observe({line_hash for line_hash in line_hashes if line_hash is not None})
+        return kept
+
+    def save(self):
+        """把计数器写入文件；写入失败时抛出 OSError。"""
+        if not self.path:
+            return
+        with self.lock:
+            data = {'chapters': self.chapters,
+                    'counts': [[line_hash, count, delta] for line_hash, (count, delta) in self.counts.items()]}
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+
+    def report_lines(self, header=BOILERPLATE_REPORT_HEADER):
+        """被去除的行的摘要：总次数、节省的字节数和出现最多的几行。header 为第一行的格式。"""
+        with self.lock:
+            if not self.dropped:
+                return []
+            total = sum(count for count, _ in self.dropped.values())
+            lines = [header.format(total=total, distinct=len(self.dropped), kilobytes=self.dropped_bytes / 1024)]
+            for count, paragraph_text in sorted(self.dropped.values(), key=lambda item: -item[0])[:BOILERPLATE_REPORT_LINES]:
+                lines.append(f"  {count} 次: {paragraph_text[:40]}")
+            return lines
+
+
+class BoilerplateFilterSink:
+    """去除章节流中的重复行后再交给后面的输出端；章节结束时把该章计入计数器。"""
+
+    def __init__(self, detector, *sinks):
+        self.detector = detector
+        self.sinks = sinks
+        self.line_hashes = set()
+
+    def start(self, chapter_title):
+        for sink in self.sinks:
+            sink.start(chapter_title)
+
+    def paragraph(self, paragraph_text):
+        line_hash = boilerplate_line_hash(paragraph_text)
+        if line_hash is not None:
+            self.line_hashes.add(line_hash)
+        if not self.detector.check(paragraph_text, line_hash):
+            for sink in self.sinks:
+                sink.paragraph(paragraph_text)
+
+    def finish(self):
+        self.detector.observe(self.line_hashes)
+        for sink in self.sinks:
+            sink.finish()
+
+    def abort(self):
+        for sink in self.sinks:
+            sink.abort()
+
+
+# --- 章节存储：每本书一个压缩文件 + 按章节序号定长的偏移索引 ---
+# 数据文件（chapters.qcs）：32 字节文件头之后依次追加各章节的 zlib 压缩块。
+# 前几章的原文拼接为共享字典（zlib zdict）写入数据文件，之后的章节都用它压缩，单章也能获得较高压缩率。
+# 索引文件（chapters.qcs.idx）：第 n 章的记录位于 (n - 1) * 20 字节处，随机读取任意章节为 O(1)。
+STORE_FILE_NAME = 'chapters.qcs'
+STORE_MAGIC = b'QMCSTOR1'
+STORE_HEADER = struct.Struct('<8sQIQI') # 标识, 字典偏移, 字典长度, 元数据偏移, 元数据长度
+STORE_INDEX_RECORD = struct.Struct('<QIIB3x') # 块偏移, 压缩后长度, 原始长度, 是否使用字典
+STORE_COMPRESS_LEVEL = 9
+STORE_DICT_SAMPLE_CHAPTERS = 3 # 用前几章的原文构建共享字典
+STORE_DICT_BYTES = 32 * 1024 # zlib 字典最多使用 32KB（压缩窗口大小）
+
+
+class ChapterStore:
+    """
+    一本书的压缩章节存储，章节按目录序号（从 1 开始）写入和读取，可以乱序、多线程写入。
+    读取通过 mmap 映射数据文件和索引文件，不把整本书读入内存。
+    """
+
+    def __init__(self, path, **metadata):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.lock = threading.Lock()
+        for file_path in (self.path, self.index_path):
+            if not os.path.exists(file_path):
+                with open(file_path, 'wb') as f:
+                    if file_path == self.path:
+                        f.write(STORE_HEADER.pack(STORE_MAGIC, 0, 0, 0, 0))
+        self.data_file = open(self.path, 'r+b')
+        self.index_file = open(self.index_path, 'r+b')
+        magic, dict_offset, dict_length, meta_offset, meta_length = STORE_HEADER.unpack(
+            self.data_file.read(STORE_HEADER.size))
+        if magic != STORE_MAGIC:
+            raise ValueError(f"不是章节存储文件: {path}")
+        self.zdict = self._read_raw(dict_offset, dict_length) if dict_length else None
+        self.metadata = json.loads(self._read_raw(meta_offset, meta_length)) if meta_length else {}
+        self.dict_samples = []
+        self.data_map = self.index_map = None
+        changed = {key: value for key, value in metadata.items() if value and self.metadata.get(key) != value}
+        if changed: # 如书名、书籍ID
+            self.set_metadata(**changed)
+
+    def _read_raw(self, offset, length):
+        self.data_file.seek(offset)
+        return self.data_file.read(length)
+
+    def _append(self, data):
+        self.data_file.seek(0, os.SEEK_END)
+        offset = self.data_file.tell()
+        self.data_file.write(data)
+        return offset
+
+    @property
+    def header_fields(self):
+        self.data_file.seek(0)
+        return STORE_HEADER.unpack(self.data_file.read(STORE_HEADER.size))[1:]
+
+    def set_metadata(self, **values):
+        """更新书籍信息（如书名），以 JSON 块追加并更新文件头。"""
+        with self.lock:
+            self.metadata.update(values)
+            raw = json.dumps(self.metadata, ensure_ascii=False).encode('utf-8')
+            offset = self._append(raw)
+            dict_offset, dict_length, _, _ = self.header_fields
+            self.data_file.seek(0)
+            self.data_file.write(STORE_HEADER.pack(STORE_MAGIC, dict_offset, dict_length, offset, len(raw)))
+            self.data_file.flush()
+
+    def put(self, number, chapter_title, novel_paragraphs_text):
+        """写入（或覆盖）第 number 章。覆盖时旧的压缩块留在文件中不再被引用。"""
+        raw = (chapter_title + "\n" + "\n".join(novel_paragraphs_text)).encode('utf-8')
+        with self.lock:
+            if self.zdict:
+                compressor = zlib.compressobj(STORE_COMPRESS_LEVEL, zdict=self.zdict)
+            else:
+                compressor = zlib.compressobj(STORE_COMPRESS_LEVEL)
+            block = compressor.compress(raw) + compressor.flush()
+            offset = self._append(block)
+            self.data_file.flush() # 先写数据块再写索引，中断时索引不会指向不完整的块
+            self.index_file.seek((number - 1) * STORE_INDEX_RECORD.size)
+            self.index_file.write(STORE_INDEX_RECORD.pack(offset, len(block), len(raw), 1 if self.zdict else 0))
+            self.index_file.flush()
+
+            if self.zdict is None:
+                self.dict_samples.append(raw)
+                if len(self.dict_samples) >= STORE_DICT_SAMPLE_CHAPTERS:
+                    # zlib 优先匹配字典末尾的内容，只保留样本的最后 32KB
+                    self.zdict = b"".join(self.dict_samples)[-STORE_DICT_BYTES:]
+                    self.dict_samples = []
+                    dict_offset = self._append(self.zdict)
+                    _, _, meta_offset, meta_length = self.header_fields
+                    self.data_file.seek(0)
+                    self.data_file.write(STORE_HEADER.pack(STORE_MAGIC, dict_offset, len(self.zdict), meta_offset, meta_length))
+                    self.data_file.flush()
+
+    def _refresh_maps(self):
+        """文件有新写入时重新映射（mmap 长度在映射时固定）。"""
+        data_size = os.fstat(self.data_file.fileno()).st_size
+        if self.data_map is None or len(self.data_map) != data_size:
+            if self.data_map is not None:
+                self.data_map.close()
+            self.data_map = mmap.mmap(self.data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        index_size = os.fstat(self.index_file.fileno()).st_size
+        if index_size and (self.index_map is None or len(self.index_map) != index_size):
+            if self.index_map is not None:
+                self.index_map.close()
+            self.index_map = mmap.mmap(self.index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return index_size
+
+    def get(self, number):
+        """读取第 number 章，返回 (章节标题, 段落列表)；该章不存在时返回 None。"""
+        with self.lock:
+            index_size = self._refresh_maps()
+            record_offset = (number - 1) * STORE_INDEX_RECORD.size
+            if number < 1 or record_offset + STORE_INDEX_RECORD.size > index_size:
+                return None
+            offset, length, raw_length, uses_dict = STORE_INDEX_RECORD.unpack_from(self.index_map, record_offset)
+            if not length:
+                return None
+            block = self.data_map[offset:offset + length]
+            zdict = self.zdict
+        decompressor = zlib.decompressobj(zdict=zdict) if uses_dict else zlib.decompressobj()
+        chapter_title, _, content = decompressor.decompress(block).decode('utf-8').partition("\n")
+        return chapter_title, content.split("\n") if content else []
+
+    def chapter_numbers(self):
+        """按顺序返回已保存的章节序号。"""
+        with self.lock:
+            index_size = self._refresh_maps()
+            if not index_size:
+                return []
+            return [i + 1 for i, (_, length, _, _) in enumerate(STORE_INDEX_RECORD.iter_unpack(self.index_map[:index_size]))
+                    if length]
+
+    def iter_chapters(self):
+        """按章节顺序产出 (序号, 章节标题, 段落列表)。"""
+        for number in self.chapter_numbers():
+            chapter_title, novel_paragraphs_text = self.get(number)
+            yield number, chapter_title, novel_paragraphs_text
+
+    def close(self):
+        with self.lock:
+            for mapped in (self.data_map, self.index_map):
+                if mapped is not None:
+                    mapped.close()
+            self.data_file.close()
+            self.index_file.close()
+
+
+# --- 全文索引：保存章节时增量写入 SQLite FTS5，中文按二元组（bigram）切分 ---
+# chapters 表只保存书名、章节标题和原文位置（txt 文件路径，或章节存储的“存储文件#章节序号”），不保存正文，
+# 搜索结果的片段从原文位置读取。chapter_fts 为不保存原文的 FTS5 表：SQLite 3.43 及以上使用 contentless_delete=1，
+# 可以直接按 rowid 删除；更早的版本删除时必须提供原来的索引词，索引词压缩后存放在 chapters.fts_tokens 中。
+CHAPTER_INDEX_PATH = os.path.join(os.path.expanduser("~"), "qimao_chapter_index.db")
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_SNIPPET_CHARS = 30 # 搜索结果中命中位置前后各显示的字数
+INDEX_TOKEN_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9A-Za-z]+')
+CHAPTER_INDEX_VERSION = 3 # 切分方式或表结构变化时加一，打开旧索引时重建
+FTS_CONTENTLESS_DELETE = sqlite3.sqlite_version_info >= (3, 43, 0)
+
+
+def is_cjk_run(run):
+    return not run[0].isascii()
+
+
+def bigram_tokens(text):
+    """把文本切分为索引词：连续汉字按相邻两字切分（单个汉字原样保留），字母数字按单词小写。"""
+    tokens = []
+    for run in INDEX_TOKEN_PATTERN.findall(text):
+        if not is_cjk_run(run):
+            tokens.append(run.lower())
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def run_tail_tokens(text):
+    """
+    每串连续汉字的最后一个字。二元组只能按前缀找到不在末尾的字，末尾的字单独存入 tails 列；
+    不放进 tokens 列，以免打乱短语中相邻索引词的位置。
+    """
+    return [run[-1] for run in INDEX_TOKEN_PATTERN.findall(text) if is_cjk_run(run)]
+
+
+def build_match_query(query):
+    """
+    把搜索词转换为 FTS5 MATCH 表达式：空格分隔的每个词切分后作为一个短语（最后一个索引词按前缀匹配，
+    以便“正文3”能匹配“正文3a”），多个词之间为“与”关系。单个汉字既可能是某个二元组的首字，
+    也可能在一串汉字的末尾，两种情况用“或”合并。
+    """
+    terms = []
+    for word in query.split():
+        tokens = bigram_tokens(word)
+        if len(tokens) == 1 and len(tokens[0]) == 1 and is_cjk_run(tokens[0]):
+            terms.append(f'(tails : "{tokens[0]}" OR tokens : "{tokens[0]}"*)')
+        elif tokens:
+            terms.append('tokens : "' + " ".join(tokens) + '"*')
+    return " AND ".join(terms)
+
+
+def make_snippet(content, query):
+    """截取正文中第一次命中搜索词的位置附近的片段，命中处用【】标出。"""
+    candidates = sorted(query.split(), key=len, reverse=True) + sorted(INDEX_TOKEN_PATTERN.findall(query), key=len, reverse=True)
+    lowered = content.lower()
+    for candidate in candidates:
+        position = lowered.find(candidate.lower())
+        if position >= 0:
+            start = max(0, position - SEARCH_SNIPPET_CHARS)
+            end = position + len(candidate)
+            snippet = (content[start:position] + "【" + content[position:end] + "】"
+                       + content[end:end + SEARCH_SNIPPET_CHARS])
+            return snippet.replace("\n", " ")
+    return content[:SEARCH_SNIPPET_CHARS * 2].replace("\n", " ")
+
+
+def read_saved_chapter(file_path):
+    """读取保存的章节 txt 文件（命令行版和图形界面版的格式均可），返回 (章节标题, 段落列表)。"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    chapter_title = os.path.splitext(os.path.basename(file_path))[0]
+    if lines and lines[0].startswith("章节标题"):
+        chapter_title = lines[0].split(":", 1)[-1].strip()
+        lines = lines[1:]
+    return chapter_title, [line for line in lines if line.strip()]
+
+
+def load_indexed_chapter(path):
+    """按索引中记录的原文位置读取章节，返回 (章节标题, 段落列表)；读取失败时抛出 OSError 或 ValueError。"""
+    store_path, _, number = path.rpartition('#')
+    if not (store_path and number.isdigit()):
+        return read_saved_chapter(path)
+    if not os.path.exists(store_path): # ChapterStore 会创建不存在的文件
+        raise FileNotFoundError(f"章节存储不存在: {store_path}")
+    store = ChapterStore(store_path)
+    try:
+        chapter = store.get(int(number))
+    finally:
+        store.close()
+    if chapter is None:
+        raise ValueError(f"章节存储中没有第 {number} 章: {store_path}")
+    return chapter
+
+
+class ChapterIndex:
+    """
+    已保存章节的全文索引。chapters 表保存书名、章节标题和原文位置，chapter_fts 为不保存原文的 FTS5 表，
+    只存放二元组（tokens 列）和每串汉字的末字（tails 列）。同一位置再次保存时替换旧记录。
+    load_chapter 按原文位置读取章节，用于生成搜索片段和重建索引。
+    """
+
+    def __init__(self, db_path=CHAPTER_INDEX_PATH, load_chapter=load_indexed_chapter):
+        self.lock = threading.Lock()
+        self.load_chapter = load_chapter
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        content_dropped = False
+        try:
+            with self.conn:
+                self.conn.execute("BEGIN IMMEDIATE") # 多个进程同时打开旧索引时只重建一次
+                self._create_chapters_table()
+                if self.conn.execute("PRAGMA user_version").fetchone()[0] < CHAPTER_INDEX_VERSION:
+                    content_dropped = self.rebuild()
+                fts_sql = self.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'chapter_fts'").fetchone()[0]
+                self.contentless_delete = 'contentless_delete' in fts_sql
+        except sqlite3.OperationalError as e:
+            self.conn.close()
+            raise RuntimeError(f"当前 Python 的 SQLite 不支持 FTS5 全文索引: {e}")
+        if content_dropped:
+            try:
+                self.conn.execute("VACUUM") # 回收旧版索引中正文占用的空间
+            except sqlite3.OperationalError:
+                pass # 其他进程正在使用索引，空间留给之后新增的章节使用
+
+    def _create_chapters_table(self):
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS chapters (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, "
+            "book TEXT NOT NULL, chapter TEXT NOT NULL, fts_tokens BLOB, indexed_at REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_chapters_book ON chapters(book)")
+
+    def rebuild(self):
+        """
+        按当前的切分方式和表结构重建 FTS 表（调用方负责事务）。旧版 chapters 表中的正文用于重建后删除，
+        没有正文列时按原文位置读取，原文已不存在的章节从索引中删除。返回是否删除了旧版的正文列。
+        """
+        has_content = 'content' in [row[1] for row in self.conn.execute("PRAGMA table_info(chapters)")]
+        rows = self.conn.execute("SELECT id, path, book, chapter, indexed_at, "
+                                 + ("content" if has_content else "NULL") + " FROM chapters").fetchall()
+        self.conn.execute("DROP TABLE IF EXISTS chapter_fts")
+        self.conn.execute("CREATE VIRTUAL TABLE chapter_fts USING fts5(tokens, tails, content='', "
+                          + ("contentless_delete=1, " if FTS_CONTENTLESS_DELETE else "") + "tokenize='unicode61')")
+        self.contentless_delete = FTS_CONTENTLESS_DELETE
+        if has_content:
+            self.conn.execute("DROP TABLE chapters")
+            self._create_chapters_table()
+        if rows:
+            print(f"全文索引格式已更新，正在重建 {len(rows)} 个章节的索引...")
+        missing = 0
+        for chapter_id, path, book, chapter_title, indexed_at, content in rows:
+            if content is None:
+                try:
+                    _, novel_paragraphs_text = self.load_chapter(path)
+                except (OSError, ValueError):
+                    self.conn.execute("DELETE FROM chapters WHERE id = ?", (chapter_id,))
+                    missing += 1
+                    continue
+                content = "\n".join(novel_paragraphs_text)
+            columns = self.fts_columns(chapter_title, content)
+            self.conn.execute("INSERT OR REPLACE INTO chapters(id, path, book, chapter, fts_tokens, indexed_at) "
+                              "VALUES (?, ?, ?, ?, ?, ?)",
+                              (chapter_id, path, book, chapter_title, self._stored_tokens(columns), indexed_at))
+            self.conn.execute("INSERT INTO chapter_fts(rowid, tokens, tails) VALUES (?, ?, ?)", (chapter_id,) + columns)
+        if missing:
+            print(f"{missing} 个章节的原文已不存在，已从全文索引中删除。")
+        self.conn.execute(f"PRAGMA user_version = {CHAPTER_INDEX_VERSION}")
+        return has_content
+
+    @staticmethod
+    def fts_columns(chapter_title, content):
+        text = chapter_title + "\n" + content
+        return " ".join(bigram_tokens(text)), " ".join(run_tail_tokens(text))
+
+    def _stored_tokens(self, columns):
+        """不支持 contentless_delete 时，删除记录需要的索引词（压缩保存）。"""
+        return None if self.contentless_delete else zlib.compress("\n".join(columns).encode('utf-8'))
+
+    def _delete_fts(self, chapter_id, stored_tokens):
+        if self.contentless_delete:
+            self.conn.execute("DELETE FROM chapter_fts WHERE rowid = ?", (chapter_id,))
+        else: # 无原文的 FTS5 表需要用旧的索引词删除旧记录
+            tokens, tails = zlib.decompress(stored_tokens).decode('utf-8').split("\n")
+            self.conn.execute("INSERT INTO chapter_fts(chapter_fts, rowid, tokens, tails) VALUES ('delete', ?, ?, ?)",
+                              (chapter_id, tokens, tails))
+
+    def add_chapter(self, file_path, book, chapter_title, novel_paragraphs_text):
+        """索引一个已保存的章节（在同一事务中更新章节信息和 FTS 索引）。"""
+        file_path = os.path.abspath(file_path)
+        columns = self.fts_columns(chapter_title, "\n".join(novel_paragraphs_text))
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT id, fts_tokens FROM chapters WHERE path = ?", (file_path,)).fetchone()
+            if row:
+                self._delete_fts(*row)
+                self.conn.execute("UPDATE chapters SET book = ?, chapter = ?, fts_tokens = ?, indexed_at = ? WHERE id = ?",
+                                  (book, chapter_title, self._stored_tokens(columns), time.time(), row[0]))
+                chapter_id = row[0]
+            else:
+                chapter_id = self.conn.execute(
+                    "INSERT INTO chapters(path, book, chapter, fts_tokens, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                    (file_path, book, chapter_title, self._stored_tokens(columns), time.time())).lastrowid
+            self.conn.execute("INSERT INTO chapter_fts(rowid, tokens, tails) VALUES (?, ?, ?)", (chapter_id,) + columns)
+
+    def search(self, query, book=None, limit=SEARCH_DEFAULT_LIMIT):
+        """按相关度返回 [(书名, 章节标题, 原文位置, 片段)]；book 为书名中包含的文字。片段从原文读取。"""
+        match_query = build_match_query(query)
+        if not match_query:
+            return []
+        sql = ("SELECT c.book, c.chapter, c.path FROM chapter_fts "
+               "JOIN chapters c ON c.id = chapter_fts.rowid WHERE chapter_fts MATCH ?")
+        params = [match_query]
+        if book:
+            sql += " AND c.book LIKE ?"
+            params.append(f"%{book}%")
+        sql += " ORDER BY chapter_fts.rank LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [(result_book, chapter_title, path, self.snippet(path, query)) for result_book, chapter_title, path in rows]
+
+    def snippet(self, path, query):
+        try:
+            _, novel_paragraphs_text = self.load_chapter(path)
+        except (OSError, ValueError) as e:
+            return f"（无法读取原文: {e}）"
+        return make_snippet("\n".join(novel_paragraphs_text), query)
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,24 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT) # 脚本从所在目录导入 net_instrument、qimao_common
+
+_loaded_scripts = {}
+
+
+@pytest.fixture
+def load_script():
+    """按文件名加载仓库根目录下的脚本（文件名带连字符或中文，不能直接 import），同一脚本只加载一次。"""
+    def load(file_name):
+        if file_name not in _loaded_scripts:
+            spec = importlib.util.spec_from_file_location(f"script_{len(_loaded_scripts)}",
+                                                          os.path.join(REPO_ROOT, file_name))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _loaded_scripts[file_name] = module
+        return _loaded_scripts[file_name]
+    return load
@@ -0,0 +1,50 @@
+from qimao_common import BOILERPLATE_MIN_CHAPTERS, BoilerplateDetector, boilerplate_line_hash
+
+PROMO_LINE = "本书由七猫中文网首发，请勿转载！"
+SHORT_STORY_LINES = ["……", "嗯。", "* * *", "——", "好。"]
+STORY_TEXT = "天地玄黄宇宙洪荒日月盈昃辰宿列张寒来暑往秋收冬藏"
+
+
+def story_line(number):
+    return f"主角走进了{STORY_TEXT[number:number + 6]}。"
+
+
+def make_chapter(number):
+    return ([PROMO_LINE, story_line(number)] + SHORT_STORY_LINES
+            + ["“走吧。”", f"七猫小说 www.qimao.com 最新章节 {number}"])
+
+
+def test_short_lines_and_dialogue_are_not_counted():
+    for paragraph_text in SHORT_STORY_LINES + ["“走吧。”", "", "   "]:
+        assert boilerplate_line_hash(paragraph_text) is None
+    assert boilerplate_line_hash(PROMO_LINE) is not None
+
+
+def test_line_hash_ignores_width_whitespace_and_numbers():
+    assert boilerplate_line_hash("最新章节 12") == boilerplate_line_hash("最新章节３４５")
+
+
+def test_recurring_promo_lines_are_dropped_and_short_story_lines_kept():
+    detector = BoilerplateDetector()
+    for number in range(1, BOILERPLATE_MIN_CHAPTERS + 3):
+        kept = detector.filter(make_chapter(number))
+    assert PROMO_LINE not in kept
+    assert not any(paragraph_text.startswith("七猫小说") for paragraph_text in kept)
+    assert kept == [story_line(number)] + SHORT_STORY_LINES + ["“走吧。”"]
+
+
+def test_nothing_is_dropped_before_enough_chapters():
+    detector = BoilerplateDetector()
+    for number in range(1, BOILERPLATE_MIN_CHAPTERS - 1):
+        assert detector.filter(make_chapter(number)) == make_chapter(number)
+
+
+def test_counter_survives_save_and_reload(tmp_path):
+    path = tmp_path / ".boilerplate.json"
+    detector = BoilerplateDetector(str(path))
+    for number in range(1, BOILERPLATE_MIN_CHAPTERS + 1):
+        detector.filter(make_chapter(number))
+    detector.save()
+    reloaded = BoilerplateDetector(str(path))
+    assert reloaded.chapters == BOILERPLATE_MIN_CHAPTERS
+    assert PROMO_LINE not in reloaded.filter(make_chapter(100))
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from qimao_common import STORE_DICT_SAMPLE_CHAPTERS, ChapterStore, load_indexed_chapter
+
+
+def make_chapter(number):
+    return f"第{number}章", [f"第{number}章第{i}段，张三丰走进了武当山。" for i in range(20)]
+
+
+def test_out_of_order_put_and_reopen(tmp_path):
+    path = str(tmp_path / "chapters.qcs")
+    numbers = [5, 2, 9, 1, 7, 3]
+    store = ChapterStore(path, title="书A")
+    try:
+        for number in numbers:
+            store.put(number, *make_chapter(number))
+        assert store.zdict is not None # 前几章写入后开始使用共享字典
+        assert store.chapter_numbers() == sorted(numbers)
+        assert store.get(4) is None
+        assert store.get(100) is None
+    finally:
+        store.close()
+
+    reopened = ChapterStore(path)
+    try:
+        assert reopened.metadata == {'title': "书A"}
+        assert reopened.chapter_numbers() == sorted(numbers)
+        for number in numbers:
+            assert reopened.get(number) == make_chapter(number)
+        assert [number for number, _, _ in reopened.iter_chapters()] == sorted(numbers)
+        # 重新打开后继续写入（使用已保存的字典），覆盖已有章节
+        reopened.put(2, "第2章（修订）", ["新的正文"])
+        reopened.put(4, *make_chapter(4))
+    finally:
+        reopened.close()
+
+    store = ChapterStore(path)
+    try:
+        assert store.get(2) == ("第2章（修订）", ["新的正文"])
+        assert store.get(4) == make_chapter(4)
+        assert store.chapter_numbers() == sorted(numbers + [4])
+    finally:
+        store.close()
+
+
+def test_chapters_written_before_the_dictionary_stay_readable(tmp_path):
+    path = str(tmp_path / "chapters.qcs")
+    store = ChapterStore(path)
+    try:
+        for number in range(1, STORE_DICT_SAMPLE_CHAPTERS + 3):
+            store.put(number, *make_chapter(number))
+    finally:
+        store.close()
+    store = ChapterStore(path)
+    try:
+        for number in range(1, STORE_DICT_SAMPLE_CHAPTERS + 3):
+            assert store.get(number) == make_chapter(number)
+    finally:
+        store.close()
+
+
+def test_load_indexed_chapter_reads_store_chapters(tmp_path):
+    path = str(tmp_path / "chapters.qcs")
+    store = ChapterStore(path)
+    try:
+        store.put(3, *make_chapter(3))
+    finally:
+        store.close()
+    assert load_indexed_chapter(f"{path}#3") == make_chapter(3)
+    missing_store = str(tmp_path / "missing.qcs")
+    with pytest.raises(FileNotFoundError):
+        load_indexed_chapter(f"{missing_store}#1")
+    assert not os.path.exists(missing_store)
+    with pytest.raises(ValueError):
+        load_indexed_chapter(f"{path}#4")
@@ -0,0 +1,58 @@
+import pytest
+
+
+@pytest.fixture
+def crawl_queue(load_script, tmp_path):
+    queue = load_script("爬取七猫小说.py").CrawlQueue(str(tmp_path / "queue.db"))
+    yield queue
+    queue.close()
+
+
+def test_seed_urls_are_added_once(crawl_queue, load_script, tmp_path):
+    assert crawl_queue.add_seed_urls(["http://x/1", "http://x/2", "http://x/1#top"]) == 2
+    other_process = load_script("爬取七猫小说.py").CrawlQueue(str(tmp_path / "queue.db"))
+    try:
+        assert other_process.add_seed_urls([" http://x/2 ", "http://x/3"]) == 1
+    finally:
+        other_process.close()
+    assert crawl_queue.status_counts() == {'pending': 3}
+
+
+def test_live_lease_is_not_claimed_twice(crawl_queue):
+    crawl_queue.add_seed_urls(["http://x/1"])
+    item = crawl_queue.claim("worker-a", lease_seconds=60)
+    assert item == (1, "http://x/1")
+    assert crawl_queue.claim("worker-b", lease_seconds=60) is None
+    assert crawl_queue.complete(item[0], "worker-a", "第1章", ["正文"], ["http://x/2"])
+    assert crawl_queue.status_counts() == {'done': 1, 'pending': 1}
+
+
+def test_expired_lease_is_taken_over(crawl_queue):
+    crawl_queue.add_seed_urls(["http://x/1"])
+    item = crawl_queue.claim("worker-a", lease_seconds=-1) # worker-a 卡住，租约立即过期
+    assert crawl_queue.claim("worker-b", lease_seconds=60) == item
+    # 接管后原来的进程再写回结果会被忽略
+    assert not crawl_queue.complete(item[0], "worker-a", "第1章", ["旧结果"])
+    assert crawl_queue.complete(item[0], "worker-b", "第1章", ["新结果"])
+    assert list(crawl_queue.iter_done_chapters()) == [("http://x/1", "第1章", ["新结果"])]
+
+
+def test_expired_leases_stop_after_max_attempts(crawl_queue):
+    crawl_queue.add_seed_urls(["http://x/1"])
+    for _ in range(3):
+        assert crawl_queue.claim("worker", lease_seconds=-1, max_attempts=3) == (1, "http://x/1")
+    assert crawl_queue.claim("worker", lease_seconds=-1, max_attempts=3) is None
+    assert crawl_queue.status_counts() == {'failed': 1}
+    assert not crawl_queue.has_outstanding_work()
+    attempts, error = crawl_queue.conn.execute("SELECT attempts, error FROM crawl_queue").fetchone()
+    assert attempts == 3
+    assert "3" in error
+
+
+def test_failed_chapter_is_retried_until_max_attempts(crawl_queue):
+    crawl_queue.add_seed_urls(["http://x/1"])
+    for attempt in range(1, 4):
+        item_id, _ = crawl_queue.claim("worker", max_attempts=3)
+        crawl_queue.fail(item_id, "worker", f"错误 {attempt}", max_attempts=3)
+    assert crawl_queue.status_counts() == {'failed': 1}
+    assert crawl_queue.claim("worker", max_attempts=3) is None
@@ -0,0 +1,129 @@
+import zipfile
+
+import pytest
+from PIL import Image
+
+
+@pytest.fixture
+def weixin(load_script):
+    return load_script("weixin-word-ppt.py")
+
+
+@pytest.fixture
+def image_paths(tmp_path):
+    """一张横向 JPEG、一张带透明通道的竖向 PNG 和一个损坏的图片文件。"""
+    jpeg_path = tmp_path / "1.jpg"
+    Image.new('RGB', (400, 200), (200, 30, 30)).save(jpeg_path, 'JPEG')
+    png_path = tmp_path / "2.png"
+    Image.new('RGBA', (100, 300), (30, 30, 200, 128)).save(png_path, 'PNG')
+    broken_path = tmp_path / "3.jpg"
+    broken_path.write_bytes(b"not an image")
+    return [str(jpeg_path), str(png_path), str(broken_path)]
+
+
+def test_docx_round_trip(weixin, image_paths, tmp_path):
+    docx = pytest.importorskip("docx") # 只用于读回校验，生成 docx 不依赖 python-docx
+    output_path = str(tmp_path / "out.docx")
+    errors = []
+    assert weixin.write_image_docx(output_path, image_paths, log=errors.append) == 2
+    assert len(errors) == 1 and "3.jpg" in errors[0]
+
+    document = docx.Document(output_path)
+    shapes = document.inline_shapes
+    assert len(shapes) == 2
+    content_width_emu = int(weixin.WORD_PAGE_WIDTH_CM * weixin.EMU_PER_CM)
+    assert [shape.width for shape in shapes] == [content_width_emu, content_width_emu]
+    assert shapes[0].height == content_width_emu // 2
+    assert shapes[1].height == content_width_emu * 3
+    section = document.sections[0]
+    assert section.left_margin == 0 and section.right_margin == 0
+
+    with zipfile.ZipFile(output_path) as zf:
+        media = {info.filename: info for info in zf.infolist() if info.filename.startswith("word/media/")}
+        assert sorted(media) == ["word/media/image1.jpeg", "word/media/image2.png"]
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in media.values())
+        with open(image_paths[0], 'rb') as f:
+            assert zf.read("word/media/image1.jpeg") == f.read() # JPEG 原样写入
+
+
+def test_docx_accepts_in_memory_images(weixin, image_paths, tmp_path):
+    docx = pytest.importorskip("docx")
+    with open(image_paths[0], 'rb') as f:
+        in_memory = weixin.InMemoryImage("1.jpg", f.read())
+    output_path = str(tmp_path / "memory.docx")
+    assert weixin.write_image_docx(output_path, [in_memory, image_paths[1]]) == 2
+    assert len(docx.Document(output_path).inline_shapes) == 2
+    with zipfile.ZipFile(output_path) as zf:
+        assert zf.read("word/media/image1.jpeg") == in_memory.data
+
+
+def test_pdf_round_trip(weixin, image_paths, tmp_path):
+    pypdf = pytest.importorskip("pypdf")
+    output_path = str(tmp_path / "out.pdf")
+    errors = []
+    assert weixin.write_image_pdf(output_path, image_paths, log=errors.append) == 2
+    assert len(errors) == 1 and "3.jpg" in errors[0]
+
+    reader = pypdf.PdfReader(output_path, strict=True) # 交叉引用表有误时 strict 模式会报错
+    assert len(reader.pages) == 2
+    for page in reader.pages:
+        assert float(page.mediabox.width) == pytest.approx(weixin.PDF_PAGE_WIDTH_PT, abs=0.01)
+        assert float(page.mediabox.height) == pytest.approx(weixin.PDF_PAGE_HEIGHT_PT, abs=0.01)
+    jpeg_image = reader.pages[0]['/Resources']['/XObject']['/Im0'].get_object()
+    assert jpeg_image['/Filter'] == '/DCTDecode'
+    with open(image_paths[0], 'rb') as f:
+        assert jpeg_image.get_data() == f.read() # JPEG 原样嵌入
+    png_image = reader.pages[1]['/Resources']['/XObject']['/Im0'].get_object()
+    assert png_image['/Filter'] == '/FlateDecode'
+    assert (png_image['/Width'], png_image['/Height']) == (100, 300)
+    assert png_image['/ColorSpace'] == '/DeviceRGB' # 透明通道合成到白色背景上
+
+
+def test_pdf_accepts_in_memory_images(weixin, image_paths, tmp_path):
+    pypdf = pytest.importorskip("pypdf")
+    with open(image_paths[0], 'rb') as f:
+        in_memory = weixin.InMemoryImage("1.jpg", f.read())
+    output_path = str(tmp_path / "memory.pdf")
+    assert weixin.write_image_pdf(output_path, [image_paths[2], in_memory]) == 1
+    reader = pypdf.PdfReader(output_path, strict=True)
+    assert len(reader.pages) == 1
+    assert reader.pages[0]['/Resources']['/XObject']['/Im0'].get_object().get_data() == in_memory.data
+
+
+def test_pptx_round_trip(weixin, image_paths, tmp_path):
+    pptx = pytest.importorskip("pptx")
+    output_path = str(tmp_path / "out.pptx")
+    errors = []
+    # 同一张图片出现两次时只嵌入一份
+    sources = [image_paths[0], image_paths[1], image_paths[2], image_paths[0]]
+    assert weixin.write_image_pptx(output_path, sources, log=errors.append) == 3
+    assert len(errors) == 1 and "3.jpg" in errors[0]
+
+    prs = pptx.Presentation(output_path)
+    slides = list(prs.slides)
+    assert len(slides) == 3
+    for slide in slides:
+        assert len(slide.placeholders) == 0
+        assert [shape.shape_type for shape in slide.shapes] == [pptx.enum.shapes.MSO_SHAPE_TYPE.PICTURE]
+    wide_picture = slides[0].shapes[0]
+    assert wide_picture.width == pytest.approx(prs.slide_width, abs=1) # 横图以宽度为基准
+    assert wide_picture.top == pytest.approx((prs.slide_height - wide_picture.height) / 2, abs=1)
+    tall_picture = slides[1].shapes[0]
+    assert tall_picture.height == pytest.approx(prs.slide_height, abs=1) # 竖图以高度为基准
+    assert tall_picture.left == pytest.approx((prs.slide_width - tall_picture.width) / 2, abs=1)
+
+    assert slides[2].shapes[0].image.sha1 == wide_picture.image.sha1
+    with zipfile.ZipFile(output_path) as zf:
+        media = [name for name in zf.namelist() if name.startswith("ppt/media/")]
+    assert len(media) == 2
+
+
+def test_pptx_accepts_in_memory_images(weixin, image_paths, tmp_path):
+    pptx = pytest.importorskip("pptx")
+    with open(image_paths[0], 'rb') as f:
+        in_memory = weixin.InMemoryImage("1.jpg", f.read())
+    output_path = str(tmp_path / "memory.pptx")
+    assert weixin.write_image_pptx(output_path, [in_memory, in_memory]) == 2
+    slides = list(pptx.Presentation(output_path).slides)
+    assert len(slides) == 2
+    assert slides[0].shapes[0].image.blob == in_memory.data
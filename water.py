@@ -5,6 +5,16 @@ import time
 import json
 import datetime
 import os
+import sqlite3
+import threading
+import heapq
+import itertools
+import math
+
+try:
+    import numpy as np
+except ImportError: # Only the history statistics view needs NumPy
+    np = None
 
 # --- Constants ---
 INITIAL_MINUTES = 30
@@ -17,6 +27,11 @@ BUTTON_GREEN_COLOR = "#32CD32" # LimeGreen
 BUTTON_TEXT_COLOR = "white"
 LABEL_TEXT_COLOR = "#333333" # Dark grey for text
 TIMER_FONT = ("Arial", 48, "bold")
+ALERT_BG_COLOR = "#FFF3CD" # Soft yellow for the in-window notification
+ALERT_BORDER_COLOR = "#FFA500" # Orange
+SHAKE_INTENSITY = 5 # px
+SHAKE_STEP_MS = 50
+SHAKE_STEPS = 6
 TITLE_FONT_FAMILY = "SimHei"
 TITLE_FONT_FALLBACK = "Arial"
 TITLE_FONT_SIZE = 20
@@ -27,8 +42,302 @@ NORMAL_FONT_SIZE = 10
 TIPS_TEXT_FONT_SIZE = 9
 BUTTON_FONT_SIZE = 11
 
+# Concurrent reminders: the water reminder drives the on-screen countdown and waits for
+# "已喝水" before restarting; the others repeat on their own interval once started.
+REMINDER_SETTINGS = {
+    "water": {"interval": INITIAL_MINUTES * 60 + INITIAL_SECONDS, "title": "时间到!",
+              "message": "该喝水啦！点击'已喝水'开始下一次提醒。"},
+    "stretch": {"interval": 60 * 60, "title": "伸展提醒",
+                "message": "已经坐了一个小时啦，起身活动一下肩颈和腰背吧！"},
+    "eyes": {"interval": 20 * 60, "title": "护眼提醒",
+             "message": "让眼睛休息一下吧！看看6米外的地方20秒。"},
+}
+
+# History statistics
+DAILY_GOAL_COUNT = 10 # 2000ml per day at 200ml per cup
+STATS_WINDOW_WIDTH = 540
+STATS_WINDOW_HEIGHT = 460
+STATS_CHART_HEIGHT = 200
+WEEKDAY_NAMES = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+
 # 修改数据文件路径到用户目录
-DATA_FILE_NAME = os.path.join(os.path.expanduser("~"), "water_reminder_data.json")
+DATA_FILE_NAME = os.path.join(os.path.expanduser("~"), "water_reminder_data.json") # 旧版JSON数据，首次启动时自动导入
+DATA_DB_NAME = os.path.join(os.path.expanduser("~"), "water_reminder_data.db")
+
+
+class WaterLogStore:
+    """
+    Append-only storage for drink events, backed by SQLite in WAL mode.
+
+    Every "已喝水" click appends one timestamped row to intake_events inside its
+    own transaction, so a write costs O(1) regardless of history length and a
+    crash can never leave a half-written file behind. Events from previous days
+    are folded into daily_totals by compact(), which runs in a background thread;
+    reading a day's count only touches that day's rollup row and events.
+    """
+
+    def __init__(self, db_path, legacy_json_path=None):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = self._connect()
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS intake_events ("
+                "id INTEGER PRIMARY KEY, ts REAL NOT NULL, day TEXT NOT NULL, amount INTEGER NOT NULL DEFAULT 1)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_intake_events_day ON intake_events(day)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS daily_totals (day TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        if legacy_json_path:
+            self._import_legacy_json(legacy_json_path)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL") # Each commit is fsynced: a click is never lost
+        return conn
+
+    def _import_legacy_json(self, json_path):
+        """Imports the old {"log": {date: count}} JSON file once, then renames it."""
+        if not os.path.exists(json_path):
+            return
+        with self.lock:
+            has_data = self.conn.execute(
+                "SELECT EXISTS(SELECT 1 FROM daily_totals) OR EXISTS(SELECT 1 FROM intake_events)").fetchone()[0]
+        if has_data:
+            return
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                log = json.load(f).get("log", {})
+            rows = [(day, int(count)) for day, count in log.items() if int(count) > 0]
+            with self.lock, self.conn:
+                self.conn.executemany("INSERT OR REPLACE INTO daily_totals(day, count) VALUES (?, ?)", rows)
+            os.replace(json_path, json_path + ".migrated")
+            print(f"Imported {len(rows)} days from {json_path}.")
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Warning: could not import {json_path}: {e}")
+
+    def record_drink(self, amount=1, timestamp=None):
+        """Appends one drink event and returns the updated count for the event's day."""
+        timestamp = time.time() if timestamp is None else timestamp
+        day = datetime.date.fromtimestamp(timestamp).isoformat()
+        with self.lock, self.conn:
+            self.conn.execute("INSERT INTO intake_events(ts, day, amount) VALUES (?, ?, ?)", (timestamp, day, amount))
+        return self.count_for_day(day)
+
+    def count_for_day(self, day):
+        """Returns the total count for an ISO date string (rollup plus not-yet-compacted events)."""
+        with self.lock:
+            rolled_up = self.conn.execute("SELECT count FROM daily_totals WHERE day = ?", (day,)).fetchone()
+            pending = self.conn.execute(
+                "SELECT COALESCE(SUM(amount), 0) FROM intake_events WHERE day = ?", (day,)).fetchone()[0]
+        return (rolled_up[0] if rolled_up else 0) + pending
+
+    def daily_counts(self):
+        """Returns [(iso_day, count), ...] for every recorded day, oldest first."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT day, SUM(count) FROM ("
+                "SELECT day, count FROM daily_totals UNION ALL SELECT day, amount FROM intake_events"
+                ") GROUP BY day ORDER BY day").fetchall()
+
+    def compact(self, before_day=None):
+        """Folds events of days before before_day (default: today) into daily_totals."""
+        before_day = before_day or datetime.date.today().isoformat()
+        conn = self._connect() # Own connection so it can run off the Tk thread
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO daily_totals(day, count) "
+                    "SELECT day, SUM(amount) FROM intake_events WHERE day < ? GROUP BY day "
+                    "ON CONFLICT(day) DO UPDATE SET count = count + excluded.count", (before_day,))
+                conn.execute("DELETE FROM intake_events WHERE day < ?", (before_day,))
+        finally:
+            conn.close()
+
+    def compact_in_background(self):
+        def run():
+            try:
+                self.compact()
+            except sqlite3.Error as e:
+                print(f"Warning: background compaction failed: {e}")
+        threading.Thread(target=run, daemon=True).start()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class IntakeHistory:
+    """
+    Daily drink counts in a NumPy array indexed by day offset from the first recorded day.
+
+    Weekly (Monday-based) and monthly rollups are kept in their own arrays and updated
+    incrementally by add(), so every statistic shown in the history view is a slice or a
+    vector operation and costs milliseconds even with years of data.
+    """
+
+    def __init__(self, start_date):
+        self.start_date = start_date
+        self.start_day_number = np.datetime64(start_date, "D").astype(np.int64)
+        self.start_weekday = start_date.weekday()
+        self.start_month_number = start_date.year * 12 + start_date.month - 1
+        self.length = 0 # Days covered, from start_date through the latest day
+        self.daily = np.zeros(0, dtype=np.int64)
+        self.weekly = np.zeros(0, dtype=np.int64)
+        self.monthly = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_daily_counts(cls, rows, today=None):
+        """Builds the arrays in one vectorized pass from WaterLogStore.daily_counts() rows."""
+        today = today or datetime.date.today()
+        dates = [datetime.date.fromisoformat(day) for day, _ in rows]
+        history = cls(min(dates + [today]))
+        history._ensure_length((today - history.start_date).days + 1)
+        if rows:
+            offsets = np.array([(date - history.start_date).days for date in dates], dtype=np.int64)
+            counts = np.array([count for _, count in rows], dtype=np.int64)
+            history._ensure_length(int(offsets.max()) + 1)
+            np.add.at(history.daily, offsets, counts)
+            days = np.arange(history.length)
+            np.add.at(history.weekly, history._week_indices(days), history.daily[:history.length])
+            np.add.at(history.monthly, history._month_indices(days), history.daily[:history.length])
+        return history
+
+    def _week_indices(self, offsets):
+        return (offsets + self.start_weekday) // 7
+
+    def _month_indices(self, offsets):
+        months = (self.start_day_number + offsets).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        return months - (self.start_month_number - 1970 * 12)
+
+    def _ensure_length(self, length):
+        """Grows the arrays (capacity doubling) so that day offsets < length are valid."""
+        if length <= self.length:
+            return
+        self.length = length
+        last_offset = length - 1
+        for name, needed in (("daily", length),
+                             ("weekly", int(self._week_indices(last_offset)) + 1),
+                             ("monthly", int(self._month_indices(np.int64(last_offset))) + 1)):
+            array = getattr(self, name)
+            if needed > len(array):
+                grown = np.zeros(max(needed, 2 * len(array)), dtype=np.int64)
+                grown[:len(array)] = array
+                setattr(self, name, grown)
+
+    def add(self, date, amount=1):
+        """Records amount drinks on date, updating the daily array and both rollups."""
+        offset = (date - self.start_date).days
+        if offset < 0: # Clock went backwards past the first recorded day; ignore
+            return
+        self._ensure_length(offset + 1)
+        self.daily[offset] += amount
+        self.weekly[self._week_indices(offset)] += amount
+        self.monthly[self._month_indices(np.int64(offset))] += amount
+
+    def last_days(self, days, today):
+        """Counts for the `days` days ending at today (zeros before the first recorded day)."""
+        end = (today - self.start_date).days + 1
+        self._ensure_length(end)
+        window = np.zeros(days, dtype=np.int64)
+        available = min(days, end)
+        window[days - available:] = self.daily[end - available:end]
+        return window
+
+    def last_weeks(self, weeks, today):
+        end = int(self._week_indices((today - self.start_date).days)) + 1
+        window = np.zeros(weeks, dtype=np.int64)
+        available = min(weeks, end)
+        window[weeks - available:] = self.weekly[end - available:end]
+        return window
+
+    def last_months(self, months, today):
+        end = int(self._month_indices(np.int64((today - self.start_date).days))) + 1
+        window = np.zeros(months, dtype=np.int64)
+        available = min(months, end)
+        window[months - available:] = self.monthly[end - available:end]
+        return window
+
+    def streaks(self, today, goal=DAILY_GOAL_COUNT):
+        """Returns (current, longest) runs of consecutive days reaching goal.
+        Today only extends the current streak once its goal is met."""
+        end = (today - self.start_date).days + 1
+        met = self.daily[:end] >= goal
+        completed = met if met[-1] else met[:-1]
+        misses = np.flatnonzero(~completed)
+        current = len(completed) - (misses[-1] + 1 if len(misses) else 0)
+        edges = np.diff(np.concatenate(([0], met.astype(np.int8), [0])))
+        runs = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+        return int(current), int(runs.max()) if len(runs) else 0
+
+    def weekday_averages(self, today):
+        """Average count per weekday (Monday first) over the whole history."""
+        end = (today - self.start_date).days + 1
+        weekdays = (np.arange(end) + self.start_weekday) % 7
+        totals = np.bincount(weekdays, weights=self.daily[:end], minlength=7)
+        day_counts = np.bincount(weekdays, minlength=7)
+        return np.divide(totals, day_counts, out=np.zeros(7), where=day_counts > 0)
+
+
+class ReminderScheduler:
+    """
+    Fires named reminders at exact monotonic-clock deadlines.
+
+    Deadlines live in a heap and only one Tk timer is armed at a time, for the earliest
+    deadline, so the process sleeps between reminders instead of waking every second and
+    callback latency never accumulates into drift. Re-scheduling or cancelling a reminder
+    leaves its old heap entry behind; stale entries are skipped when they reach the top.
+    """
+
+    def __init__(self, root, on_due):
+        self.root = root
+        self.on_due = on_due # Called with the reminder name when it becomes due
+        self.heap = []
+        self.deadlines = {}
+        self.after_id = None
+        self._sequence = itertools.count()
+
+    def schedule(self, name, delay_seconds):
+        """(Re)schedules a reminder delay_seconds from now."""
+        deadline = time.monotonic() + delay_seconds
+        self.deadlines[name] = deadline
+        heapq.heappush(self.heap, (deadline, next(self._sequence), name))
+        self._rearm()
+
+    def cancel(self, name):
+        if self.deadlines.pop(name, None) is not None:
+            self._rearm()
+
+    def is_scheduled(self, name):
+        return name in self.deadlines
+
+    def remaining(self, name):
+        """Seconds until the reminder is due, or None if it is not scheduled."""
+        deadline = self.deadlines.get(name)
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def _rearm(self):
+        while self.heap and self.deadlines.get(self.heap[0][2]) != self.heap[0][0]:
+            heapq.heappop(self.heap) # Stale entry of a cancelled/rescheduled reminder
+        if self.after_id:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+        if self.heap:
+            delay_ms = max(0, math.ceil((self.heap[0][0] - time.monotonic()) * 1000))
+            self.after_id = self.root.after(delay_ms, self._fire_due)
+
+    def _fire_due(self):
+        self.after_id = None
+        now = time.monotonic()
+        due_names = []
+        while self.heap and self.heap[0][0] <= now:
+            deadline, _, name = heapq.heappop(self.heap)
+            if self.deadlines.get(name) == deadline:
+                del self.deadlines[name]
+                due_names.append(name)
+        self._rearm()
+        for name in due_names:
+            self.on_due(name)
+
 
 class WaterReminderApp:
     def __init__(self, root):
@@ -42,10 +351,15 @@ class WaterReminderApp:
         self.time_remaining = INITIAL_MINUTES * 60 + INITIAL_SECONDS
         self.timer_running = False
         self.water_count = 0  # This will be updated from loaded data
-        self.timer_id = None
+        self.display_tick_id = None
+        self.shake_after_id = None
+        self.active_alerts = {} # reminder name -> (title, message) shown in the notification banner
+        self.history = None # IntakeHistory, built once after startup and then updated per drink
+        self.stats_window = None
+        self.scheduler = ReminderScheduler(self.root, self._on_reminder_due)
 
         # --- Data Handling ---
-        self.app_data = self._load_data()
+        self.store = WaterLogStore(DATA_DB_NAME, legacy_json_path=DATA_FILE_NAME)
         # Stores the date string for which self.water_count is currently valid
         self.current_date_str_for_data = "" 
         self._ensure_current_day_data() # Initialize/load today's water count
@@ -75,59 +389,38 @@ class WaterReminderApp:
 
         # --- Handle window close ---
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
-
-    def _load_data(self):
-        """Loads data from the JSON file."""
-        if os.path.exists(DATA_FILE_NAME):
-            try:
-                with open(DATA_FILE_NAME, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # Basic validation for expected structure
-                    if "log" not in data or not isinstance(data["log"], dict):
-                        print(f"Warning: {DATA_FILE_NAME} has unexpected structure. Re-initializing.")
-                        return {"log": {}}
-                    return data
-            except json.JSONDecodeError:
-                print(f"Error: Could not decode JSON from {DATA_FILE_NAME}. Starting with empty data.")
-                return {"log": {}} # Return default structure if file is corrupt
-            except Exception as e:
-                print(f"Error loading data: {e}. Starting with empty data.")
-                return {"log": {}}
-        return {"log": {}} # Return default if file doesn't exist
-
-    def _save_data(self):
-        """Saves the current app_data to the JSON file."""
+        # The countdown is only redrawn while the window is visible
+        self.root.bind("<Map>", self._on_visibility_change)
+        self.root.bind("<Unmap>", self._on_visibility_change)
+        # Build the history arrays once the window is up, so startup stays independent of history length
+        self.root.after_idle(self._load_history)
+
+    def _record_drink(self):
+        """Appends a drink event to the store and returns today's updated count, or None if it could not be saved."""
         try:
-            with open(DATA_FILE_NAME, 'w', encoding='utf-8') as f:
-                json.dump(self.app_data, f, ensure_ascii=False, indent=4)
-        except Exception as e:
+            return self.store.record_drink()
+        except sqlite3.Error as e:
             print(f"Error saving data: {e}")
-            messagebox.showerror("保存错误", f"无法保存数据到 {DATA_FILE_NAME}:\n{e}")
-
+            messagebox.showerror("保存错误", f"无法保存数据到 {DATA_DB_NAME}:\n{e}")
+            return None
 
     def _ensure_current_day_data(self):
         """
-        Checks if the date has changed. If so, updates self.current_date_str_for_data,
-        and resets self.water_count for the new day (or loads it if an entry already exists).
-        Ensures the current day has an entry in self.app_data['log'].
+        Checks if the date has changed. If so, updates self.current_date_str_for_data
+        and loads self.water_count for the new day from the store (0 for a fresh day).
+        Events of previous days are then rolled up in the background.
         """
         today_iso_date = datetime.date.today().isoformat()
 
         if today_iso_date != self.current_date_str_for_data:
             # Date has changed or it's the first run setting this up.
-            # The count for the previous self.current_date_str_for_data (if any) is already in self.app_data["log"]
-            # and would have been saved by a previous _save_data() call.
-            
+            # Every drink was already appended to the store when it happened, so nothing needs saving here.
             self.current_date_str_for_data = today_iso_date
 
-            if self.current_date_str_for_data not in self.app_data["log"]:
-                # New day, or first time running on this day, and no entry exists yet.
-                self.app_data["log"][self.current_date_str_for_data] = 0
-                # No immediate save needed here, will be saved when water count actually changes or on close.
-            
-            # Load the water count for the (new) current day.
-            self.water_count = self.app_data["log"][self.current_date_str_for_data]
-            
+            # Only today's rollup row and events are read, independent of history length.
+            self.water_count = self.store.count_for_day(self.current_date_str_for_data)
+            self.store.compact_in_background()
+
             # It's important to update the display if the day changed and water_count was reset/loaded.
             if hasattr(self, 'water_count_label'): # Check if UI is initialized
                  self.update_water_count_display()
@@ -152,7 +445,12 @@ class WaterReminderApp:
 
         # Water Count Display
         self.water_count_label = tk.Label(self.root, text=f"今日已喝水: {self.water_count} 次", font=self.normal_font_spec, bg=MAIN_BG_COLOR, fg=LABEL_TEXT_COLOR)
-        self.water_count_label.pack(pady=10)
+        self.water_count_label.pack(pady=(10, 0))
+
+        stats_button = tk.Button(self.root, text="📊 历史统计", font=self.normal_font_spec, bg=MAIN_BG_COLOR,
+                                 fg=BUTTON_BLUE_COLOR, relief=tk.FLAT, borderwidth=0, cursor="hand2",
+                                 command=self.show_stats_window)
+        stats_button.pack()
 
         # Health Tips Frame
         tips_frame = tk.Frame(self.root, bg="#E0FFFF", relief=tk.SOLID, borderwidth=1)
@@ -194,6 +492,15 @@ class WaterReminderApp:
                                      padx=button_ipadx, pady=button_ipady)
         self.drank_button.pack(side=tk.RIGHT, expand=True, padx=10)
 
+        # In-window notification banner (placed over the top of the window when a reminder fires)
+        self.alert_frame = tk.Frame(self.root, bg=ALERT_BG_COLOR, highlightbackground=ALERT_BORDER_COLOR,
+                                    highlightthickness=2)
+        self.alert_label = tk.Label(self.alert_frame, text="", font=self.normal_font_spec, bg=ALERT_BG_COLOR,
+                                    fg=LABEL_TEXT_COLOR, justify=tk.LEFT, wraplength=WINDOW_WIDTH - 120)
+        self.alert_label.pack(side=tk.LEFT, padx=10, pady=8)
+        tk.Button(self.alert_frame, text="知道了", font=self.normal_font_spec, bg=BUTTON_BLUE_COLOR,
+                  fg=BUTTON_TEXT_COLOR, relief=tk.GROOVE, command=self.dismiss_alert).pack(side=tk.RIGHT, padx=8)
+
     def update_timer_display(self):
         mins, secs = divmod(self.time_remaining, 60)
         self.timer_display_label.config(text=f"{mins:02d}:{secs:02d}")
@@ -201,16 +508,50 @@ class WaterReminderApp:
     def update_water_count_display(self):
         self.water_count_label.config(text=f"今日已喝水: {self.water_count} 次")
 
-    def countdown(self):
-        if self.timer_running and self.time_remaining > 0:
-            self.time_remaining -= 1
-            self.update_timer_display()
-            self.timer_id = self.root.after(1000, self.countdown)
-        elif self.timer_running and self.time_remaining == 0:
+    def _is_window_visible(self):
+        return self.root.state() != "iconic" and bool(self.root.winfo_viewable())
+
+    def _on_visibility_change(self, event):
+        if event.widget is self.root:
+            self._schedule_display_tick()
+
+    def _schedule_display_tick(self):
+        """Redraws the countdown and arms the next redraw for the moment the shown second changes."""
+        if self.display_tick_id:
+            self.root.after_cancel(self.display_tick_id)
+            self.display_tick_id = None
+        remaining = self.scheduler.remaining("water")
+        if remaining is None:
+            return
+        self.time_remaining = math.ceil(remaining)
+        self.update_timer_display()
+        if self.time_remaining > 0 and self._is_window_visible():
+            delay_ms = math.ceil((remaining - (self.time_remaining - 1)) * 1000) + 1
+            self.display_tick_id = self.root.after(delay_ms, self._schedule_display_tick)
+
+    def _start_water_countdown(self, seconds):
+        self.timer_running = True
+        self.scheduler.schedule("water", seconds)
+        self._schedule_display_tick()
+
+    def _on_reminder_due(self, name):
+        settings = REMINDER_SETTINGS[name]
+        if name == "water":
+            if self.display_tick_id:
+                self.root.after_cancel(self.display_tick_id)
+                self.display_tick_id = None
             self.timer_running = False
+            self.time_remaining = 0
             self.update_timer_display()
-            self.shake_window()
-            messagebox.showinfo("时间到!", "该喝水啦！点击'已喝水'开始下一次提醒。")
+        else:
+            self.scheduler.schedule(name, settings["interval"]) # Repeats on its own interval
+
+        # Non-modal: bring the window forward and show an in-window banner instead of a blocking dialog
+        self.root.deiconify()
+        self.root.lift()
+        self.show_alert(name, settings["title"], settings["message"])
+        self.shake_window()
+        if name == "water":
             self.drank_button.config(bg=BUTTON_GREEN_COLOR) # Make "Drank Water" prominent
             self.start_button.config(state=tk.NORMAL) # Allow starting again
 
@@ -218,73 +559,150 @@ class WaterReminderApp:
         self._ensure_current_day_data() # Ensure date context is current before starting timer actions
 
         if not self.timer_running:
-            self.timer_running = True
             if self.time_remaining == 0: # Reset if timer was at 00:00
-                self.time_remaining = INITIAL_MINUTES * 60 + INITIAL_SECONDS
-            self.update_timer_display()
-            self.countdown()
+                self.time_remaining = REMINDER_SETTINGS["water"]["interval"]
+            self._start_water_countdown(self.time_remaining)
+            for name, settings in REMINDER_SETTINGS.items():
+                if name != "water" and not self.scheduler.is_scheduled(name):
+                    self.scheduler.schedule(name, settings["interval"])
             self.drank_button.config(bg=BUTTON_GREEN_COLOR) # Change "已喝水" to green
             self.start_button.config(state=tk.DISABLED)
-        # This elif condition might need review based on exact desired pause/resume logic
-        # For now, starting reminder implies a fresh countdown sequence
-        # elif self.timer_id: 
-        #     self.root.after_cancel(self.timer_id)
-        #     self.timer_running = True
-        #     self.update_timer_display()
-        #     self.countdown()
-        #     self.drank_button.config(bg=BUTTON_GREEN_COLOR)
-        #     self.start_button.config(state=tk.DISABLED)
 
 
     def handle_drank_water(self):
         self._ensure_current_day_data() # Crucial: ensures water_count and date are for today
 
-        self.water_count += 1
-        self.app_data["log"][self.current_date_str_for_data] = self.water_count
-        self._save_data() # Save data after incrementing
-        self.update_water_count_display()
-
-        if self.timer_id:
-            self.root.after_cancel(self.timer_id)
-
-        self.time_remaining = INITIAL_MINUTES * 60 + INITIAL_SECONDS
-        self.timer_running = True
-        self.update_timer_display()
-        self.countdown()
+        water_count = self._record_drink() # Appended and committed immediately
+        self.dismiss_alert("water")
+        if water_count is not None: # Not saved: the count and history stay as they are
+            self.water_count = water_count
+            self.update_water_count_display()
+            if self.history is not None:
+                self.history.add(datetime.date.fromisoformat(self.current_date_str_for_data))
+                self._refresh_stats_window()
+
+        # Rescheduling replaces the pending water deadline
+        self._start_water_countdown(REMINDER_SETTINGS["water"]["interval"])
         self.drank_button.config(bg=BUTTON_GREEN_COLOR)
         self.start_button.config(state=tk.DISABLED) # Timer is now running, so disable start
 
+    def _load_history(self):
+        if np is None:
+            return
+        try:
+            self.history = IntakeHistory.from_daily_counts(self.store.daily_counts())
+        except sqlite3.Error as e:
+            print(f"Error loading history: {e}")
+
+    def show_stats_window(self):
+        """Opens the history statistics view (7/30/365-day trends, streaks, weekday averages)."""
+        if np is None:
+            messagebox.showerror("缺少依赖", "历史统计需要 NumPy，请运行 'pip install numpy' 安装。")
+            return
+        if self.stats_window is not None and self.stats_window.winfo_exists():
+            self.stats_window.lift()
+            return
+        if self.history is None:
+            self._load_history()
+        if self.history is None:
+            messagebox.showerror("读取错误", f"无法从 {DATA_DB_NAME} 读取历史数据。")
+            return
+
+        self.stats_window = tk.Toplevel(self.root)
+        self.stats_window.title("喝水历史统计")
+        self.stats_window.geometry(f"{STATS_WINDOW_WIDTH}x{STATS_WINDOW_HEIGHT}")
+        self.stats_window.configure(bg=MAIN_BG_COLOR)
+
+        self.stats_range_var = tk.IntVar(value=7)
+        range_frame = tk.Frame(self.stats_window, bg=MAIN_BG_COLOR)
+        range_frame.pack(pady=(10, 0))
+        for days, text in ((7, "近7天"), (30, "近30天"), (365, "近一年（按周）")):
+            tk.Radiobutton(range_frame, text=text, value=days, variable=self.stats_range_var,
+                           command=self._refresh_stats_window, font=self.normal_font_spec,
+                           bg=MAIN_BG_COLOR, fg=LABEL_TEXT_COLOR).pack(side=tk.LEFT, padx=8)
+
+        self.stats_canvas = tk.Canvas(self.stats_window, width=STATS_WINDOW_WIDTH - 40, height=STATS_CHART_HEIGHT,
+                                      bg="white", highlightthickness=1, highlightbackground=BUTTON_BLUE_COLOR)
+        self.stats_canvas.pack(pady=10)
+        self.stats_summary_label = tk.Label(self.stats_window, font=self.normal_font_spec, bg=MAIN_BG_COLOR,
+                                            fg=LABEL_TEXT_COLOR, justify=tk.LEFT,
+                                            wraplength=STATS_WINDOW_WIDTH - 40)
+        self.stats_summary_label.pack(anchor="w", padx=20)
+        self._refresh_stats_window()
+
+    def _refresh_stats_window(self):
+        if self.stats_window is None or not self.stats_window.winfo_exists():
+            return
+        today = datetime.date.today()
+        days = self.stats_range_var.get()
+        daily = self.history.last_days(days, today)
+        values = self.history.last_weeks(52, today) if days == 365 else daily
+
+        # Bar chart (daily bars, or weekly rollups for the one-year view)
+        canvas = self.stats_canvas
+        canvas.delete("all")
+        chart_width = int(canvas["width"])
+        top_value = max(int(values.max()), DAILY_GOAL_COUNT if days != 365 else 1)
+        bar_slot = chart_width / len(values)
+        for i, value in enumerate(values.tolist()):
+            bar_height = (STATS_CHART_HEIGHT - 20) * value / top_value
+            canvas.create_rectangle(i * bar_slot + bar_slot * 0.15, STATS_CHART_HEIGHT - bar_height,
+                                    (i + 1) * bar_slot - bar_slot * 0.15, STATS_CHART_HEIGHT,
+                                    fill=BUTTON_BLUE_COLOR, outline="")
+        if days != 365:
+            goal_y = STATS_CHART_HEIGHT - (STATS_CHART_HEIGHT - 20) * DAILY_GOAL_COUNT / top_value
+            canvas.create_line(0, goal_y, chart_width, goal_y, fill=BUTTON_GREEN_COLOR, dash=(4, 2))
+
+        current_streak, longest_streak = self.history.streaks(today)
+        weekday_averages = self.history.weekday_averages(today)
+        months = self.history.last_months(12, today)
+        month_labels = [(today.year * 12 + today.month - 1 - k) for k in range(11, -1, -1)]
+        self.stats_summary_label.config(text="\n".join([
+            f"近{days}天: 共 {int(daily.sum())} 次，日均 {daily.mean():.1f} 次，"
+            f"达标 {int((daily >= DAILY_GOAL_COUNT).sum())} 天（目标 {DAILY_GOAL_COUNT} 次/天）",
+            f"当前连续达标: {current_streak} 天    最长连续达标: {longest_streak} 天",
+            "星期日均: " + "  ".join(f"{name} {avg:.1f}" for name, avg in zip(WEEKDAY_NAMES, weekday_averages)),
+            "近12个月: " + "  ".join(f"{m // 12}-{m % 12 + 1:02d}: {int(total)}"
+                                   for m, total in zip(month_labels, months)),
+        ]))
+
+    def show_alert(self, name, title, message):
+        """Shows (or updates) the in-window notification banner; the main loop keeps running."""
+        self.active_alerts[name] = (title, message)
+        self.alert_label.config(text="\n".join(f"{t}  {m}" for t, m in self.active_alerts.values()))
+        self.alert_frame.place(relx=0.5, y=10, anchor="n", relwidth=0.92)
+        self.alert_frame.lift()
+
+    def dismiss_alert(self, name=None):
+        """Removes one reminder's alert (or all of them) and hides the banner when empty."""
+        if name is None:
+            self.active_alerts.clear()
+        else:
+            self.active_alerts.pop(name, None)
+        if self.active_alerts:
+            self.alert_label.config(text="\n".join(f"{t}  {m}" for t, m in self.active_alerts.values()))
+        else:
+            self.alert_frame.place_forget()
+
     def shake_window(self):
-        original_x = self.root.winfo_x()
-        original_y = self.root.winfo_y()
-        shake_intensity = 5
-        shake_duration = 50 # ms
-        num_shakes = 6
-
-        for i in range(num_shakes):
-            if i % 2 == 0:
-                self.root.geometry(f"+{original_x + shake_intensity}+{original_y}")
-            else:
-                self.root.geometry(f"+{original_x - shake_intensity}+{original_y}")
-            self.root.update_idletasks()
-            time.sleep(shake_duration / 1000)
-        self.root.geometry(f"+{original_x}+{original_y}")
+        """Starts an after()-driven shake animation; each step returns to the event loop."""
+        if self.shake_after_id: # Already shaking
+            return
+        self._shake_step(self.root.winfo_x(), self.root.winfo_y(), 0)
+
+    def _shake_step(self, original_x, original_y, step):
+        if step >= SHAKE_STEPS:
+            self.root.geometry(f"+{original_x}+{original_y}")
+            self.shake_after_id = None
+            return
+        offset = SHAKE_INTENSITY if step % 2 == 0 else -SHAKE_INTENSITY
+        self.root.geometry(f"+{original_x + offset}+{original_y}")
+        self.shake_after_id = self.root.after(SHAKE_STEP_MS, self._shake_step, original_x, original_y, step + 1)
 
     def on_closing(self):
         """Handles window close event."""
-        # Data is saved on each "drank water" action, but an explicit save here can be a fallback.
-        # However, if _ensure_current_day_data made changes that weren't followed by a count update,
-        # those might not be saved. For robustness, ensure all data is current.
-        if self.app_data: # Check if app_data exists
-             self._ensure_current_day_data() # Make sure current day's 0 is logged if no drinks today
-             if self.current_date_str_for_data and self.current_date_str_for_data not in self.app_data["log"]:
-                 # This case should ideally be covered by _ensure_current_day_data
-                 self.app_data["log"][self.current_date_str_for_data] = 0
-             elif self.current_date_str_for_data and self.app_data["log"][self.current_date_str_for_data] != self.water_count:
-                 # Sync if there's a mismatch, though unlikely with current flow
-                 self.app_data["log"][self.current_date_str_for_data] = self.water_count
-
-             self._save_data()
+        # Every drink is committed to the store as it happens, so closing only releases the database.
+        self.store.close()
         self.root.destroy()
 
 # --- Main ---
@@ -1,21 +1,54 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog # 导入 filedialog
 import requests
-from bs4 import BeautifulSoup
+import requests.adapters
+import net_instrument
+from net_instrument import network_stats, configure_egress, get_http_session
+from lxml import etree
 import datetime
 import os
-from docx import Document
-from docx.shared import Cm as word_Cm
 from pptx import Presentation
 from pptx.util import Cm as ppt_Cm
 from PIL import Image # Pillow库，用于读取图片尺寸
 import threading
 import queue
+import math
+import json
+from urllib.parse import urlsplit, urlunsplit
+import struct
+import zipfile
+import zlib
+import io
+import time
+import shutil
+import uuid
+import hashlib
 
 # --- 常量定义 (来自原始 weixin.py) ---
 USER_AGENT = 'Mozilla/5.0 (iPhone; CPU iPhone OS 11_0 like Mac OS X) AppleWebKit/604.1.38 (KHTML, like Gecko) Version/11.0 Mobile/15A372 Safari/604.1'
 # BASE_DESKTOP_FOLDER_NAME = "weixin_images_gui" # 不再固定到桌面，此常量可以移除或修改用途
 DEFAULT_IMAGE_EXTENSION = "jpg"
+# 小图过滤：宽或高小于 MIN_IMAGE_SIDE_PX，或面积小于 MIN_IMAGE_AREA_PX 的图片（分隔线、图标、表情等）不下载
+MIN_IMAGE_SIDE_PX = 50
+MIN_IMAGE_AREA_PX = 64 * 64 # 只过滤图标级的小图，窄长的正文配图（如 600x60 的标题条）照常下载
+IMAGE_PROBE_BYTES = 16 * 1024 # 探测图片尺寸时最多读取的字节数
+ARTICLE_CHUNK_BYTES = 16 * 1024 # 流式解析文章HTML时每次读取的字节数
+IMAGE_DOWNLOAD_CHUNK_BYTES = 64 * 1024 # 下载图片时每次写入的字节数
+IMAGE_RETRY_BUDGET = 3 # 每张图片下载中断后最多重试（断点续传）的次数
+# 按输出尺寸下载：mmbiz.qpic.cn 可通过路径最后一段返回指定宽度的图片，选择满足显示需要的最小版本
+MMBIZ_IMAGE_WIDTHS = (132, 300, 640)
+OUTPUT_IMAGE_DPI = {'word': 150, 'pdf': 150, 'ppt': 96} # 幻灯片按屏幕分辨率显示
+CM_PER_INCH = 2.54
+WORD_MARGIN_CM = 0.5
+PPT_SLIDE_WIDTH_CM = 33.867
+PPT_SLIDE_HEIGHT_CM = 19.05
+PPT_BLANK_LAYOUT_INDEX = 6 # 默认模板中的“空白”版式（找不到无占位符的版式时使用）
+
+# --- 网络耗时统计 ---
+# 统计代码（直方图、计时连接和 TimedHTTPAdapter）在 net_instrument.py 中，各脚本共用。
+NETWORK_STATS_FILE_NAME = 'network_stats.json'
+NETWORK_LABEL_REFRESH_MS = 1000 # 界面上网络统计摘要的刷新间隔
+
 
 # --- 核心逻辑函数 (从 weixin.py 修改而来) ---
 
@@ -59,40 +92,352 @@ def create_timestamped_folder(status_queue, base_save_path: str): # 接收基础
         return None
 
 
-def download_images_from_url(url: str, save_folder: str, status_queue) -> list[str]:
+def parse_image_size_from_header(data: bytes):
+    """
+    从图片文件开头的若干字节中解析出宽高（支持 PNG/GIF/JPEG/WebP/BMP）。
+    返回 (宽, 高)，无法解析时返回 None。
+    """
+    try:
+        if data.startswith(b'\x89PNG\r\n\x1a\n') and data[12:16] == b'IHDR':
+            return struct.unpack('>II', data[16:24])
+        if data[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack('<HH', data[6:10])
+        if data.startswith(b'BM'):
+            width, height = struct.unpack('<ii', data[18:26])
+            return width, abs(height)
+        if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+            chunk = data[12:16]
+            if chunk == b'VP8 ':
+                width, height = struct.unpack('<HH', data[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b'VP8L':
+                bits = int.from_bytes(data[21:25], 'little')
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b'VP8X':
+                return int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+            return None
+        if data.startswith(b'\xff\xd8'):
+            i = 2
+            while i + 9 < len(data):
+                if data[i] != 0xFF:
+                    return None
+                marker = data[i + 1]
+                if marker == 0xFF: # 填充字节
+                    i += 1
+                    continue
+                if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7: # 无长度字段的标记
+                    i += 2
+                    continue
+                segment_length = struct.unpack('>H', data[i + 2:i + 4])[0]
+                if marker in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+                    height, width = struct.unpack('>HH', data[i + 5:i + 9])
+                    return width, height
+                i += 2 + segment_length
+    except struct.error:
+        return None
+    return None
+
+
+def get_declared_image_size(img_tag):
+    """
+    读取微信图片标签上声明的尺寸：data-w 为原图宽度，data-ratio 为高/宽比。
+    返回 (宽, 高)，属性缺失或无效时返回 None。
+    """
+    try:
+        width = float(img_tag.get("data-w") or 0)
+        ratio = float(img_tag.get("data-ratio") or 0)
+    except (TypeError, ValueError):
+        return None
+    if width <= 0 or ratio <= 0:
+        return None
+    return int(width), int(width * ratio)
+
+
+def probe_image_size(img_url: str, headers: dict, probe_bytes: int = IMAGE_PROBE_BYTES):
+    """
+    只读取图片开头的 probe_bytes 个字节来获取尺寸（Range 请求，服务器不支持时提前关闭流）。
+    返回 (宽, 高)，探测失败时返回 None。
+    """
+    probe_headers = dict(headers)
+    probe_headers['Range'] = f'bytes=0-{probe_bytes - 1}'
+    try:
+        with get_http_session().get(url=img_url, headers=probe_headers, stream=True, timeout=10) as response:
+            response.raise_for_status()
+            data = b''
+            for chunk in response.iter_content(chunk_size=4096):
+                data += chunk
+                size = parse_image_size_from_header(data)
+                if size or len(data) >= probe_bytes:
+                    return size
+            return parse_image_size_from_header(data)
+    except requests.exceptions.RequestException:
+        return None
+
+
+def is_image_too_small(size, min_side_px: int = MIN_IMAGE_SIDE_PX, min_area_px: int = MIN_IMAGE_AREA_PX) -> bool:
+    """判断图片是否属于应跳过的小图/装饰图。尺寸未知时不跳过。"""
+    if not size:
+        return False
+    width, height = size
+    return width < min_side_px or height < min_side_px or width * height < min_area_px
+
+
+def _drain_image_events(parser):
+    """取出解析器中已就绪的事件：产出 <img> 的属性，并释放已解析完的元素以免整棵 DOM 驻留内存。"""
+    for event, element in parser.read_events():
+        if event == 'start':
+            if element.tag == 'img':
+                yield dict(element.attrib)
+        else:
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+
+def iter_article_images(url: str, headers: dict, chunk_size: int = ARTICLE_CHUNK_BYTES):
+    """
+    流式下载文章HTML并增量解析，按出现顺序逐个产出 <img> 标签的属性字典，
+    不必等整页下载完成、也不构建完整的DOM。
+    """
+    parser = etree.HTMLPullParser(events=('start', 'end'), encoding='utf-8')
+    with get_http_session().get(url=url, headers=headers, stream=True, timeout=30) as response:
+        response.raise_for_status() # 如果请求失败则抛出HTTPError
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            parser.feed(chunk)
+            yield from _drain_image_events(parser)
+    parser.close()
+    yield from _drain_image_events(parser)
+
+
+def start_article_image_scan(url: str, headers: dict) -> queue.Queue:
+    """
+    在后台线程中扫描文章，图片标签一出现就放入返回的下载队列。
+    扫描失败时放入异常对象，结束时放入 None。
+    """
+    image_queue = queue.Queue()
+
+    def scan():
+        try:
+            for img_attrs in iter_article_images(url, headers):
+                image_queue.put(img_attrs)
+        except (requests.exceptions.RequestException, etree.LxmlError) as e:
+            image_queue.put(e)
+        finally:
+            image_queue.put(None)
+
+    threading.Thread(target=scan, daemon=True).start()
+    return image_queue
+
+
+def iter_queued_images(image_queue: queue.Queue, on_error):
+    """依次取出扫描线程放入下载队列的图片属性，直到扫描结束。"""
+    while True:
+        item = image_queue.get()
+        if item is None:
+            return
+        if isinstance(item, Exception):
+            on_error(item)
+            continue
+        yield item
+
+
+def get_required_image_width_px(output_types, img_ratio=None):
+    """
+    根据要生成的文档类型计算图片显示时需要的像素宽度（按各输出的 OUTPUT_IMAGE_DPI 换算）。
+    Word 中图片占满页面可用宽度；PPT/PDF 中图片适应页面，img_ratio（高/宽）已知时按实际显示宽度计算。
+    没有可参考的输出类型时返回 None。
+    """
+    display_widths_cm = {}
+    if 'word' in output_types:
+        display_widths_cm['word'] = WORD_PAGE_WIDTH_CM - 2 * WORD_MARGIN_CM
+    boxes_cm = {}
+    if 'ppt' in output_types:
+        boxes_cm['ppt'] = (PPT_SLIDE_WIDTH_CM, PPT_SLIDE_HEIGHT_CM)
+    if 'pdf' in output_types:
+        boxes_cm['pdf'] = (PDF_PAGE_WIDTH_PT * CM_PER_INCH / 72, PDF_PAGE_HEIGHT_PT * CM_PER_INCH / 72)
+    for output_type, (box_width_cm, box_height_cm) in boxes_cm.items():
+        if img_ratio:
+            display_widths_cm[output_type] = fit_image_in_box(1000, 1000 * img_ratio, box_width_cm, box_height_cm)[2]
+        else:
+            display_widths_cm[output_type] = box_width_cm
+    if not display_widths_cm:
+        return None
+    return max(math.ceil(width_cm / CM_PER_INCH * OUTPUT_IMAGE_DPI[output_type])
+               for output_type, width_cm in display_widths_cm.items())
+
+
+def get_sized_image_url(img_url: str, required_width_px, original_width_px=None) -> str:
+    """
+    把 mmbiz.qpic.cn 图片地址（路径最后一段为尺寸，0 表示原图）改写为不小于 required_width_px 的最小尺寸版本。
+    不是微信图片、或没有比当前更小且足够的尺寸时返回原地址。
+    """
+    if not required_width_px:
+        return img_url
+    parts = urlsplit(img_url)
+    if not (parts.hostname or '').endswith('qpic.cn'):
+        return img_url
+    path_head, _, size_segment = parts.path.rpartition('/')
+    if not size_segment.isdigit():
+        return img_url
+    current_width_px = int(size_segment) or original_width_px or math.inf
+    for width_px in MMBIZ_IMAGE_WIDTHS:
+        if required_width_px <= width_px < current_width_px:
+            return urlunsplit(parts._replace(path=f"{path_head}/{width_px}"))
+    return img_url
+
+
+def parse_content_range(value: str):
+    """解析 Content-Range 头（如 'bytes 100-199/1000'），返回 (起始字节, 总长度)；总长度未知时为 None。"""
+    try:
+        unit, _, byte_range = (value or '').partition(' ')
+        span, _, total = byte_range.partition('/')
+        start = int(span.split('-')[0])
+        return start, (int(total) if total.strip() != '*' else None)
+    except ValueError:
+        return None, None
+
+
+def fetch_image_resumable(img_url: str, headers: dict, out, timeout: int = 20,
+                          retry_budget: int = IMAGE_RETRY_BUDGET, require_image: bool = False) -> int:
+    """
+    下载图片并写入可 seek 的二进制文件对象 out（磁盘文件或 BytesIO），返回写入的字节数。
+    传输中断时保留已下载的部分，重试时用 Range 请求从断点续传；
+    通过 If-Range（ETag 或 Last-Modified）和 Content-Range 中的总长度确认图片没有变化，否则从头下载。
+    最多重试 retry_budget 次，仍失败时抛出 requests 异常。
+    require_image 为 True 且响应不是图片时抛出 ValueError（不重试）。
+    """
+    request_headers = dict(headers)
+    request_headers['Accept-Encoding'] = 'identity' # 不压缩传输，续传的字节偏移才与文件一致
+    received = 0
+    expected_total = None
+    validator = None
+    attempt = 0
+    out.seek(0)
+    out.truncate()
+    while True:
+        range_headers = dict(request_headers)
+        if received and validator:
+            range_headers['Range'] = f'bytes={received}-'
+            range_headers['If-Range'] = validator
+        try:
+            with get_http_session().get(url=img_url, headers=range_headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 416 and expected_total is not None and received >= expected_total:
+                    return received # 上次其实已经接收完整
+                content_start, content_total = parse_content_range(response.headers.get('Content-Range'))
+                if response.status_code == 206 and content_start == received and content_total == expected_total:
+                    out.seek(received) # 续传：接在已下载部分之后
+                else:
+                    response.raise_for_status()
+                    if response.status_code == 206: # 续传位置或总长度对不上，说明图片已变化：重新完整下载
+                        received = 0
+                        validator = None
+                        raise requests.exceptions.ChunkedEncodingError("续传响应与已下载部分不一致")
+                    if require_image and not response.headers.get('Content-Type', '').startswith('image/'):
+                        raise ValueError(f"响应不是图片: {response.headers.get('Content-Type')}")
+                    # 完整响应（首次下载，或服务器不支持续传/图片已变化）：从头写入
+                    received = 0
+                    out.seek(0)
+                    out.truncate()
+                    content_length = response.headers.get('Content-Length')
+                    expected_total = int(content_length) if content_length and content_length.isdigit() else None
+                    etag = response.headers.get('ETag')
+                    validator = etag if etag and not etag.startswith('W/') else response.headers.get('Last-Modified')
+                    if response.headers.get('Accept-Ranges', '').lower() == 'none' or expected_total is None:
+                        validator = None
+                for chunk in response.iter_content(IMAGE_DOWNLOAD_CHUNK_BYTES):
+                    out.write(chunk)
+                    received += len(chunk)
+            if expected_total is not None and received != expected_total:
+                raise requests.exceptions.ChunkedEncodingError(f"图片下载不完整: {received}/{expected_total} 字节")
+            out.truncate()
+            return received
+        except requests.exceptions.RequestException as e:
+            status_code = e.response.status_code if isinstance(e, requests.exceptions.HTTPError) else None
+            if status_code and status_code < 500 and status_code not in (408, 429):
+                raise # 客户端错误（如 404）重试也不会成功
+            if attempt >= retry_budget:
+                raise
+            attempt += 1
+            time.sleep(min(2 ** attempt * 0.5, 8))
+
+
+def fetch_image_content(img_url: str, headers: dict, out, sized_url: str = None, timeout: int = 20,
+                        retry_budget: int = IMAGE_RETRY_BUDGET) -> int:
+    """
+    下载图片内容写入 out（支持断点续传）；提供了较小尺寸版本地址时优先下载它，失败再回退到原地址。
+    返回写入的字节数。
+    """
+    if sized_url and sized_url != img_url:
+        try:
+            return fetch_image_resumable(sized_url, headers, out, timeout, retry_budget=0, require_image=True)
+        except (requests.exceptions.RequestException, ValueError):
+            pass
+    return fetch_image_resumable(img_url, headers, out, timeout, retry_budget)
+
+
+class InMemoryImage:
+    """
+    只保存在内存中的已下载图片（内存模式下代替图片文件路径传给文档生成函数）。
+    data 为下载得到的 bytes，各生成函数通过 memoryview/BytesIO 共享同一块缓冲区，不再复制。
+    """
+    __slots__ = ('name', 'data')
+
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+
+def open_image_source(image_source):
+    """返回 PIL/python-pptx 可以读取的对象：文件路径原样返回，内存图片包装为 BytesIO（共享缓冲区）。"""
+    return io.BytesIO(image_source.data) if isinstance(image_source, InMemoryImage) else image_source
+
+
+def image_source_name(image_source) -> str:
+    """图片的显示名称，用于日志。"""
+    return image_source.name if isinstance(image_source, InMemoryImage) else os.path.basename(image_source)
+
+
+def download_images_from_url(url: str, save_folder: str, status_queue,
+                             min_side_px: int = MIN_IMAGE_SIDE_PX, min_area_px: int = MIN_IMAGE_AREA_PX,
+                             target_outputs=None, retry_budget: int = IMAGE_RETRY_BUDGET,
+                             in_memory: bool = False, keep_image_files: bool = True) -> list:
     """
     从给定的微信公众号URL下载图片到指定的文件夹。
-    返回成功下载的图片文件的完整路径列表。
+    文章HTML以流式方式增量解析，图片按在页面中出现的顺序依次下载。
+    下载前先通过 data-w/data-ratio 属性或只读取文件头的方式获取图片尺寸，
+    跳过宽高小于 min_side_px 或面积小于 min_area_px 的小图（传入 0 可关闭过滤）。
+    target_outputs 为要生成的文档类型（如 {'word', 'ppt'}）时启用按输出尺寸下载：
+    微信图片改为下载满足显示宽度的最小尺寸版本，失败时回退原图；为 None 时下载原图。
+    下载中断时按断点续传重试，每张图片最多重试 retry_budget 次。
+    in_memory 为 True 时图片只下载到内存，返回 InMemoryImage 列表直接交给文档生成函数；
+    此时 keep_image_files 为 False 则不在 save_folder 中写入任何图片文件。
+    否则返回成功下载的图片文件的完整路径列表。
     """
     headers = {'user-agent': USER_AGENT}
     downloaded_image_paths = []
 
     log_status(status_queue, f"开始从URL下载图片: {url}")
-    try:
-        response = requests.get(url=url, headers=headers, timeout=30) # 增加超时
-        response.raise_for_status()
-        html_content = response.content.decode('utf-8', errors='ignore')
-    except requests.exceptions.RequestException as e:
-        log_status(status_queue, f"错误：请求URL失败 - {url}, {e}")
-        return downloaded_image_paths
+    # 文章HTML在后台边下载边解析（增量 lxml 解析），图片标签一出现就开始下载
+    image_queue = start_article_image_scan(url, headers)
 
-    soup = BeautifulSoup(html_content, 'lxml')
-    image_tags = soup.select('img') # 主要选择img标签
-
-    if not image_tags:
-        log_status(status_queue, "未在页面中找到 <img> 标签。")
-        # 尝试查找可能的背景图片或其他形式的图片，这部分比较复杂，暂时简化
-        # for style_tag in soup.find_all('style'):
-        #    pass # 更复杂的CSS背景图提取逻辑
+    def required_width_px(img_tag):
+        if not target_outputs:
+            return None
+        declared_size = get_declared_image_size(img_tag)
+        return get_required_image_width_px(target_outputs, declared_size[1] / declared_size[0] if declared_size else None)
 
     image_counter = 0
-    total_images_found = len(image_tags)
-    log_status(status_queue, f"检测到 {total_images_found} 个图片标签。开始下载...")
+    skipped_small_count = 0
+    total_images_found = 0
 
-    for i, img_tag in enumerate(image_tags):
+    for img_tag in iter_queued_images(image_queue, lambda e: log_status(status_queue, f"错误：请求URL失败 - {url}, {e}")):
+        total_images_found += 1
         img_data_src = img_tag.get("data-src") or img_tag.get("src") # 兼容data-src和src
         if not img_data_src:
-            # log_status(status_queue, f"跳过一个没有data-src或src属性的图片标签 ({i+1}/{total_images_found})")
+            # log_status(status_queue, f"跳过一个没有data-src或src属性的图片标签 (第 {total_images_found} 个)")
             continue
 
         # 确保URL是完整的
@@ -102,6 +447,12 @@ def download_images_from_url(url: str, save_folder: str, status_queue) -> list[s
             # log_status(status_queue, f"跳过无效的图片URL: {img_data_src}")
             continue
 
+        if min_side_px or min_area_px:
+            img_size = get_declared_image_size(img_tag) or probe_image_size(img_data_src, headers)
+            if is_image_too_small(img_size, min_side_px, min_area_px):
+                skipped_small_count += 1
+                log_status(status_queue, f"跳过小图（{img_size[0]}x{img_size[1]}px）: {img_data_src}")
+                continue
 
         img_extension = img_tag.get("data-type", DEFAULT_IMAGE_EXTENSION).split('/')[-1] # 如 image/jpeg -> jpeg
         if not img_extension or len(img_extension) > 5 : # 简单过滤无效扩展名
@@ -116,14 +467,26 @@ def download_images_from_url(url: str, save_folder: str, status_queue) -> list[s
 
         img_filename = f"{image_counter}.{img_extension}"
         img_full_path = os.path.join(save_folder, img_filename)
+        partial_path = img_full_path + '.part'
 
         try:
-            log_status(status_queue, f"下载中 ({image_counter + 1}/{total_images_found}): {img_data_src[:70]}...")
-            img_response = requests.get(url=img_data_src, headers=headers, timeout=20)
-            img_response.raise_for_status()
-            with open(img_full_path, 'wb') as f:
-                f.write(img_response.content)
-            downloaded_image_paths.append(img_full_path)
+            log_status(status_queue, f"下载中 (第 {image_counter + 1} 张): {img_data_src[:70]}...")
+            sized_url = get_sized_image_url(
+                img_data_src, required_width_px(img_tag), (get_declared_image_size(img_tag) or (None,))[0])
+            if in_memory:
+                buffer = io.BytesIO()
+                fetch_image_content(img_data_src, headers, buffer, sized_url=sized_url, retry_budget=retry_budget)
+                memory_image = InMemoryImage(img_filename, buffer.getvalue())
+                if keep_image_files: # 原始图片只写出一份备查，生成文档时不再从磁盘读回
+                    with open(img_full_path, 'wb') as f:
+                        f.write(memory_image.data)
+                downloaded_image_paths.append(memory_image)
+            else:
+                # 先写入 .part 文件，下载中断时保留已接收的部分用于续传，完整后再改名
+                with open(partial_path, 'w+b') as f:
+                    fetch_image_content(img_data_src, headers, f, sized_url=sized_url, retry_budget=retry_budget)
+                os.replace(partial_path, img_full_path)
+                downloaded_image_paths.append(img_full_path)
             image_counter += 1
         except requests.exceptions.RequestException as e:
             log_status(status_queue, f"警告：下载图片失败 - {img_data_src[:70]}..., {e}")
@@ -131,48 +494,310 @@ def download_images_from_url(url: str, save_folder: str, status_queue) -> list[s
             log_status(status_queue, f"警告：保存图片失败 - {img_full_path}, {e}")
         except Exception as e:
             log_status(status_queue, f"警告：处理图片时发生未知错误 - {img_data_src[:70]}..., {e}")
+        finally:
+            if not in_memory and os.path.exists(partial_path): # 重试次数用尽仍未完成，丢弃不完整的图片
+                os.remove(partial_path)
 
-    log_status(status_queue, f"图片下载完成，此次共成功保存 {image_counter} 张到文件夹: {save_folder}")
+    if skipped_small_count:
+        log_status(status_queue, f"已跳过 {skipped_small_count} 张小图/装饰图（小于 {min_side_px}px 或面积小于 {min_area_px}px²）")
+    if not total_images_found:
+        log_status(status_queue, "未在页面中找到 <img> 标签。")
+    if in_memory and not keep_image_files:
+        log_status(status_queue, f"图片下载完成，此次共成功下载 {image_counter} 张（仅保存在内存中）")
+    else:
+        log_status(status_queue, f"图片下载完成，此次共成功保存 {image_counter} 张到文件夹: {save_folder}")
     return downloaded_image_paths
 
 
-def generate_word_document(file_name_prefix: str, image_paths: list[str], save_folder: str, status_queue):
-    if not image_paths:
-        log_status(status_queue, "没有图片可用于生成Word文档。")
-        return None
+# --- 输出文档构建缓存 ---
+# 以“输出类型 + 生成参数 + 按顺序排列的各图片内容哈希”为键缓存已生成的文档，
+# 同一篇文章以相同参数重复处理时直接硬链接（不支持硬链接时复制）缓存中的文件，不再重新生成。
+# 缓存目录与各次运行的文件夹位于同一上级目录，硬链接不额外占用磁盘空间；
+# 缓存条目与各次输出的文档共享同一份数据（需要单独修改某个文档时请另存为新文件），
+# 命中前会核对大小和修改时间，输出文档被原地修改过的条目会被丢弃。
+# 修改文档生成逻辑或输出格式时需要增加 BUILD_CACHE_VERSION，使旧的缓存失效。
+BUILD_CACHE_VERSION = 2
+BUILD_CACHE_FOLDER_NAME = '.build_cache'
+BUILD_CACHE_MAX_ENTRIES = 200 # 超出时删除最久未使用的条目
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def hash_image_source(image_source) -> bytes:
+    """计算图片内容（文件或 InMemoryImage）的 SHA-256。"""
+    digest = hashlib.sha256()
+    if isinstance(image_source, InMemoryImage):
+        digest.update(image_source.data)
+    else:
+        with open(image_source, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+    return digest.digest()
+
+
+def build_cache_key(output_type: str, options: dict, image_paths: list) -> str:
+    """构建缓存的键：输出类型、生成参数和按顺序排列的图片内容哈希。"""
+    digest = hashlib.sha256(json.dumps({'version': BUILD_CACHE_VERSION, 'type': output_type, 'options': options},
+                                       sort_keys=True).encode('utf-8'))
+    for image_source in image_paths:
+        digest.update(hash_image_source(image_source))
+    return digest.hexdigest()
+
+
+def link_or_copy_file(src: str, dst: str):
+    """把 src 硬链接到 dst（跨文件系统等不支持时复制），dst 已存在时原子替换。"""
+    temp_path = f"{dst}.{uuid.uuid4().hex}.tmp"
+    try:
+        try:
+            os.link(src, temp_path)
+        except OSError:
+            shutil.copyfile(src, temp_path)
+        os.replace(temp_path, dst)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
-    log_status(status_queue, "开始生成Word文档...")
-    doc = Document()
 
-    for section in doc.sections:
-        section.left_margin = word_Cm(0.5) # 留一些边距
-        section.right_margin = word_Cm(0.5)
-        section.top_margin = word_Cm(0.5)
-        section.bottom_margin = word_Cm(0.5)
+class BuildCache:
+    """
+    输出文档构建缓存目录：每个条目为 <键><扩展名> 文件，以及记录其大小和修改时间的 <键>.json。
+    多个进程/线程可以同时使用，条目均先写入临时文件再原子替换。
+    """
 
-    page_width_cm = doc.sections[0].page_width.cm - (section.left_margin.cm + section.right_margin.cm)
+    def __init__(self, folder: str, max_entries: int = BUILD_CACHE_MAX_ENTRIES):
+        self.folder = folder
+        self.max_entries = max_entries
 
-    for i, img_path in enumerate(image_paths):
+    def _paths(self, key: str, extension: str):
+        return os.path.join(self.folder, key + extension), os.path.join(self.folder, key + '.json')
+
+    def lookup(self, key: str, extension: str):
+        """返回有效的缓存文件路径；没有条目或条目已被修改时返回 None。"""
+        cached_path, meta_path = self._paths(key, extension)
         try:
-            log_status(status_queue, f"添加图片到Word ({i+1}/{len(image_paths)}): {os.path.basename(img_path)}")
-            # 尝试获取图片原始尺寸以保持宽高比
-            with Image.open(img_path) as img:
-                width_px, height_px = img.size
-
-            aspect_ratio = height_px / width_px
-            # display_height_cm = page_width_cm * aspect_ratio # 变量未使用，移除
-
-            doc.add_picture(img_path, width=word_Cm(page_width_cm)) # 高度会自动按比例调整
-            # 如果希望每张图片后分页：
-            # if i < len(image_paths) - 1:
-            #    doc.add_page_break()
-        except Exception as e:
-            log_status(status_queue, f"警告：无法将图片添加到Word - {os.path.basename(img_path)}, {e}")
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            stat = os.stat(cached_path)
+        except (OSError, ValueError):
+            return None
+        if stat.st_size != meta.get('size') or stat.st_mtime_ns != meta.get('mtime_ns'):
+            self.discard(key, extension) # 与之硬链接的输出文档被修改过
+            return None
+        os.utime(meta_path) # 记录最近使用时间，用于淘汰
+        return cached_path
+
+    def store(self, key: str, extension: str, built_path: str):
+        """把新生成的文档加入缓存。"""
+        os.makedirs(self.folder, exist_ok=True)
+        cached_path, meta_path = self._paths(key, extension)
+        link_or_copy_file(built_path, cached_path)
+        stat = os.stat(cached_path)
+        temp_meta_path = f"{meta_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'source': os.path.basename(built_path)}, f)
+        os.replace(temp_meta_path, meta_path)
+        self.prune()
+
+    def discard(self, key: str, extension: str):
+        for path in self._paths(key, extension):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def prune(self):
+        """条目数超过上限时删除最久未使用的条目。"""
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith('.json'):
+                try:
+                    entries.append((os.path.getmtime(os.path.join(self.folder, name)), name[:-len('.json')]))
+                except OSError:
+                    pass
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, key in entries[:len(entries) - self.max_entries]:
+            for name in os.listdir(self.folder):
+                if name.startswith(key + '.'):
+                    try:
+                        os.remove(os.path.join(self.folder, name))
+                    except OSError:
+                        pass
+
+
+def build_document_cached(output_type: str, options: dict, image_paths: list, output_full_path: str, build,
+                          log=print) -> bool:
+    """
+    通过构建缓存生成文档：命中时把缓存文件链接到 output_full_path，否则调用 build() 生成后加入缓存。
+    build() 返回写入的页数；有图片未能写入时（如临时的读取错误）不加入缓存，下次重新生成。
+    缓存目录位于 output_full_path 所在文件夹的上级目录中。build() 失败时异常原样抛出。
+    返回是否命中缓存。
+    """
+    save_folder = os.path.dirname(os.path.abspath(output_full_path))
+    cache = BuildCache(os.path.join(os.path.dirname(save_folder), BUILD_CACHE_FOLDER_NAME))
+    extension = os.path.splitext(output_full_path)[1]
+    try:
+        key = build_cache_key(output_type, options, image_paths)
+    except OSError as e:
+        log(f"计算图片哈希失败，不使用构建缓存: {e}")
+        key = None
+
+    cached_path = cache.lookup(key, extension) if key else None
+    if cached_path:
+        try:
+            link_or_copy_file(cached_path, output_full_path)
+            log(f"内容与参数均未变化，已直接使用缓存的文档: {os.path.basename(output_full_path)}")
+            return True
+        except OSError as e:
+            log(f"使用构建缓存失败，重新生成: {e}")
 
+    try:
+        if os.stat(output_full_path).st_nlink > 1: # 断开与缓存条目的硬链接，避免原地覆盖时改写缓存
+            os.remove(output_full_path)
+    except OSError:
+        pass
+    written = build()
+    if key and written != len(image_paths):
+        log(f"有 {len(image_paths) - written} 张图片未能写入文档，本次结果不加入构建缓存")
+    elif key:
+        try:
+            cache.store(key, extension, output_full_path)
+        except OSError as e:
+            log(f"写入构建缓存失败: {e}")
+    return False
+
+
+# --- 流式 docx 写入 ---
+# 本工具生成的 Word 文档只包含图片，直接按 OOXML 格式逐张写入 zip，
+# 避免 python-docx 为每张图片构建内存对象、保存时整体驻留内存并重复压缩 JPEG/PNG。
+EMU_PER_CM = 360000
+EMU_PER_TWIP = 635
+WORD_PAGE_WIDTH_CM = 21.59 # 与 python-docx 默认模板一致（Letter）
+WORD_PAGE_HEIGHT_CM = 27.94
+DOCX_IMAGE_FORMATS = { # PIL 格式 -> (扩展名, MIME 类型, zip 压缩方式)
+    'JPEG': ('jpeg', 'image/jpeg', zipfile.ZIP_STORED),
+    'PNG': ('png', 'image/png', zipfile.ZIP_STORED),
+    'GIF': ('gif', 'image/gif', zipfile.ZIP_STORED),
+    'BMP': ('bmp', 'image/bmp', zipfile.ZIP_DEFLATED),
+    'TIFF': ('tiff', 'image/tiff', zipfile.ZIP_DEFLATED),
+}
+DOCX_CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    + ''.join(f'<Default Extension="{ext}" ContentType="{mime}"/>' for ext, mime, _ in DOCX_IMAGE_FORMATS.values())
+    + '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+DOCX_PACKAGE_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+DOCX_DOCUMENT_HEAD_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+    'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing" '
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture"><w:body>'
+)
+DOCX_PICTURE_PARAGRAPH_XML = (
+    '<w:p><w:r><w:drawing><wp:inline distT="0" distB="0" distL="0" distR="0">'
+    '<wp:extent cx="{cx}" cy="{cy}"/><wp:docPr id="{index}" name="Picture {index}"/>'
+    '<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+    '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture"><pic:pic>'
+    '<pic:nvPicPr><pic:cNvPr id="0" name="{name}"/><pic:cNvPicPr/></pic:nvPicPr>'
+    '<pic:blipFill><a:blip r:embed="rId{index}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+    '<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+    '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></pic:spPr>'
+    '</pic:pic></a:graphicData></a:graphic></wp:inline></w:drawing></w:r></w:p>'
+)
+
+
+def write_image_docx(output_full_path: str, image_paths: list, margin_cm: float = 0,
+                     page_width_cm: float = WORD_PAGE_WIDTH_CM, page_height_cm: float = WORD_PAGE_HEIGHT_CM,
+                     log=print) -> int:
+    """
+    以流式方式生成只包含图片的 Word 文档：图片宽度等于页面可用宽度，高度按比例缩放。
+    图片文件逐张原样（JPEG/PNG 不再压缩）写入 zip，document.xml 根据图片尺寸逐段生成，
+    内存占用只与单张图片相关。image_paths 中也可以是 InMemoryImage，其内容直接写入 zip。
+    返回成功写入的图片数量。
+    """
+    content_width_emu = int((page_width_cm - 2 * margin_cm) * EMU_PER_CM)
+    embedded_images = [] # (序号, 显示宽度, 显示高度, 部件名)，只保存元数据
+
+    with zipfile.ZipFile(output_full_path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', DOCX_CONTENT_TYPES_XML)
+        zf.writestr('_rels/.rels', DOCX_PACKAGE_RELS_XML)
+
+        for img_path in image_paths:
+            try:
+                with Image.open(open_image_source(img_path)) as img: # 只读取文件头，不解码像素
+                    img_format = img.format
+                    width_px, height_px = img.size
+                if img_format not in DOCX_IMAGE_FORMATS:
+                    raise ValueError(f"Word 不支持的图片格式 {img_format}")
+                if not width_px or not height_px:
+                    raise ValueError("图片尺寸为零")
+                index = len(embedded_images) + 1
+                extension, _, compress_type = DOCX_IMAGE_FORMATS[img_format]
+                part_name = f"image{index}.{extension}"
+                if isinstance(img_path, InMemoryImage):
+                    zf.writestr(f"word/media/{part_name}", img_path.data, compress_type=compress_type)
+                else:
+                    zf.write(img_path, f"word/media/{part_name}", compress_type=compress_type)
+                embedded_images.append((index, content_width_emu, content_width_emu * height_px // width_px, part_name))
+            except Exception as e:
+                log(f"无法将图片添加到Word文档: {image_source_name(img_path)}, 错误: {e}")
+
+        with zf.open('word/document.xml', 'w') as document_xml:
+            document_xml.write(DOCX_DOCUMENT_HEAD_XML.encode('utf-8'))
+            for index, cx, cy, part_name in embedded_images:
+                document_xml.write(DOCX_PICTURE_PARAGRAPH_XML.format(index=index, cx=cx, cy=cy, name=part_name).encode('utf-8'))
+            margin_twips = int(margin_cm * EMU_PER_CM / EMU_PER_TWIP)
+            document_xml.write((
+                f'<w:sectPr><w:pgSz w:w="{int(page_width_cm * EMU_PER_CM / EMU_PER_TWIP)}" '
+                f'w:h="{int(page_height_cm * EMU_PER_CM / EMU_PER_TWIP)}"/>'
+                f'<w:pgMar w:top="{margin_twips}" w:right="{margin_twips}" w:bottom="{margin_twips}" '
+                f'w:left="{margin_twips}" w:header="0" w:footer="0" w:gutter="0"/></w:sectPr>'
+                '</w:body></w:document>'
+            ).encode('utf-8'))
+
+        with zf.open('word/_rels/document.xml.rels', 'w') as rels_xml:
+            rels_xml.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                           b'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">')
+            for index, _, _, part_name in embedded_images:
+                rels_xml.write(
+                    f'<Relationship Id="rId{index}" '
+                    f'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/image" '
+                    f'Target="media/{part_name}"/>'.encode('utf-8'))
+            rels_xml.write(b'</Relationships>')
+
+    return len(embedded_images)
+
+
+def generate_word_document(file_name_prefix: str, image_paths: list, save_folder: str, status_queue):
+    if not image_paths:
+        log_status(status_queue, "没有图片可用于生成Word文档。")
+        return None
+
+    log_status(status_queue, f"开始生成Word文档（共 {len(image_paths)} 张图片）...")
     output_filename = f"{file_name_prefix}.docx"
     output_full_path = os.path.join(save_folder, output_filename)
     try:
-        doc.save(output_full_path)
+        # 留 0.5cm 边距，图片宽度适应页面可用宽度，高度按比例调整
+        build_document_cached(
+            'word', {'margin_cm': WORD_MARGIN_CM, 'page_width_cm': WORD_PAGE_WIDTH_CM,
+                     'page_height_cm': WORD_PAGE_HEIGHT_CM},
+            image_paths, output_full_path,
+            lambda: write_image_docx(output_full_path, image_paths, margin_cm=WORD_MARGIN_CM,
+                                     log=lambda message: log_status(status_queue, f"警告：{message}")),
+            log=lambda message: log_status(status_queue, message))
         log_status(status_queue, f"Word文档已成功保存到: {output_full_path}")
         return output_full_path
     except Exception as e:
@@ -180,72 +805,245 @@ def generate_word_document(file_name_prefix: str, image_paths: list[str], save_f
         return None
 
 
-def generate_ppt_presentation(file_name_prefix: str, image_paths: list[str], save_folder: str, status_queue):
-    if not image_paths:
-        log_status(status_queue, "没有图片可用于生成PPT。")
-        return None
+def fit_image_in_box(img_width_px: int, img_height_px: int, box_width: float, box_height: float):
+    """
+    计算图片在给定区域（幻灯片/页面）中居中并尽可能填满（保持宽高比）时的位置和尺寸。
+    返回 (left, top, width, height)，单位与 box_width/box_height 相同。
+    """
+    img_aspect_ratio = img_width_px / img_height_px
+    box_aspect_ratio = box_width / box_height
 
-    log_status(status_queue, "开始生成PPT演示文稿...")
+    if img_aspect_ratio > box_aspect_ratio:
+        # 图片比区域更宽，以宽度为基准
+        display_width = box_width
+        display_height = display_width / img_aspect_ratio
+    else:
+        # 图片比区域更高（或同样比例），以高度为基准
+        display_height = box_height
+        display_width = display_height * img_aspect_ratio
+
+    return (box_width - display_width) / 2, (box_height - display_height) / 2, display_width, display_height
+
+
+def fit_images_in_box(image_sizes: list, box_width: float, box_height: float) -> list:
+    """
+    一次算出多张图片（[(宽, 高), ...]）在区域中居中填满时的位置和尺寸，返回对应的 (left, top, width, height) 列表。
+    相同尺寸只计算一次（同一篇文章中的图片尺寸大多相同）。
+    """
+    boxes = {}
+    for size in image_sizes:
+        if size not in boxes:
+            boxes[size] = fit_image_in_box(size[0], size[1], box_width, box_height)
+    return [boxes[size] for size in image_sizes]
+
+
+def blank_slide_layout(prs):
+    """返回不会在幻灯片上生成任何占位符的版式（默认模板中为“空白”版式）。"""
+    for layout in prs.slide_layouts:
+        if not any(True for _ in layout.iter_cloneable_placeholders()):
+            return layout
+    return prs.slide_layouts[PPT_BLANK_LAYOUT_INDEX]
+
+
+def write_image_pptx(output_full_path: str, image_paths: list, slide_width_cm: float = PPT_SLIDE_WIDTH_CM,
+                     slide_height_cm: float = PPT_SLIDE_HEIGHT_CM, log=print) -> int:
+    """
+    生成每页一张图片的PPT，图片居中并尽可能填满幻灯片（保持宽高比）。
+    幻灯片使用空白版式，不带占位符。先读取所有图片的文件头（同一来源只读一次），再按尺寸算出各页图片的
+    位置和大小（相同尺寸只算一次）。内容相同的图片由 python-pptx 按 SHA1 识别，只嵌入一份，各页共用。
+    返回成功添加的幻灯片数。
+    """
     prs = Presentation()
-    # 使用16:9的幻灯片尺寸，更常见
-    prs.slide_width = ppt_Cm(33.867) # 16:9 width
-    prs.slide_height = ppt_Cm(19.05) # 16:9 height
+    prs.slide_width = ppt_Cm(slide_width_cm)
+    prs.slide_height = ppt_Cm(slide_height_cm)
 
-    slide_width_cm = prs.slide_width.cm
-    slide_height_cm = prs.slide_height.cm
-    slide_aspect_ratio = slide_width_cm / slide_height_cm
+    image_sizes = {} # 图片来源 -> (宽, 高)
+    slide_images = [] # 每页的 (图片来源, 宽, 高)
+    for img_path in image_paths:
+        source_key = img_path if isinstance(img_path, str) else id(img_path)
+        try:
+            if source_key not in image_sizes:
+                with Image.open(open_image_source(img_path)) as img: # 只读取文件头，不解码像素
+                    width_px, height_px = img.size
+                if not width_px or not height_px:
+                    raise ValueError("图片尺寸为零")
+                image_sizes[source_key] = (width_px, height_px)
+            slide_images.append((img_path,) + image_sizes[source_key])
+        except Exception as e:
+            log(f"无法将图片添加到PPT: {image_source_name(img_path)}, 错误: {e}")
+
+    placements = fit_images_in_box([(width_px, height_px) for _, width_px, height_px in slide_images],
+                                   prs.slide_width, prs.slide_height)
 
-    for i, img_path in enumerate(image_paths):
+    layout = blank_slide_layout(prs)
+    slide_count = 0
+    for (img_path, _, _), (left, top, width, height) in zip(slide_images, placements):
         try:
-            log_status(status_queue, f"添加图片到PPT ({i+1}/{len(image_paths)}): {os.path.basename(img_path)}")
-            slide_layout = prs.slide_layouts[5] # 空白布局
-            slide = prs.slides.add_slide(slide_layout)
+            # 图片的文件头已在上面读取过，添加图片一般不会失败（失败时这一页会留空）
+            slide = prs.slides.add_slide(layout)
+            slide.shapes.add_picture(open_image_source(img_path), round(left), round(top), round(width), round(height))
+            slide_count += 1
+        except Exception as e:
+            log(f"无法将图片添加到PPT: {image_source_name(img_path)}, 错误: {e}")
 
-            with Image.open(img_path) as img:
-                img_width_px, img_height_px = img.size
+    prs.save(output_full_path)
+    return slide_count
 
-            if img_height_px == 0 or img_width_px == 0: # 避免除以零
-                log_status(status_queue, f"警告: 图片尺寸为零，跳过 {os.path.basename(img_path)}")
-                continue
-            img_aspect_ratio = img_width_px / img_height_px
 
-            if img_aspect_ratio > slide_aspect_ratio:
-                pic_display_width_cm = slide_width_cm
-                pic_display_height_cm = pic_display_width_cm / img_aspect_ratio
-            else:
-                pic_display_height_cm = slide_height_cm
-                pic_display_width_cm = pic_display_height_cm * img_aspect_ratio
-
-            left_cm = (slide_width_cm - pic_display_width_cm) / 2
-            top_cm = (slide_height_cm - pic_display_height_cm) / 2
-
-            slide.shapes.add_picture(
-                img_path,
-                ppt_Cm(left_cm),
-                ppt_Cm(top_cm),
-                width=ppt_Cm(pic_display_width_cm),
-                height=ppt_Cm(pic_display_height_cm)
-            )
-        except Exception as e:
-            log_status(status_queue, f"警告：无法将图片添加到PPT - {os.path.basename(img_path)}, {e}")
+def generate_ppt_presentation(file_name_prefix: str, image_paths: list, save_folder: str, status_queue):
+    if not image_paths:
+        log_status(status_queue, "没有图片可用于生成PPT。")
+        return None
 
+    log_status(status_queue, "开始生成PPT演示文稿...")
     output_filename = f"{file_name_prefix}.pptx"
     output_full_path = os.path.join(save_folder, output_filename)
+
     try:
-        prs.save(output_full_path)
+        build_document_cached(
+            'ppt', {'slide_width_cm': PPT_SLIDE_WIDTH_CM, 'slide_height_cm': PPT_SLIDE_HEIGHT_CM},
+            image_paths, output_full_path,
+            lambda: write_image_pptx(output_full_path, image_paths,
+                                     log=lambda message: log_status(status_queue, f"警告：{message}")),
+            log=lambda message: log_status(status_queue, message))
         log_status(status_queue, f"PPT演示文稿已成功保存到: {output_full_path}")
         return output_full_path
     except Exception as e:
         log_status(status_queue, f"错误：保存PPT失败 - {output_full_path}, {e}")
         return None
 
+# --- PDF 输出 ---
+# 每张图片单独一页，JPEG 以 DCTDecode 流原样嵌入（不解码、不重新编码），页面逐页写入文件。
+PDF_PAGE_WIDTH_PT = 595.28 # A4
+PDF_PAGE_HEIGHT_PT = 841.89
+PDF_COLOR_SPACES = {'L': '/DeviceGray', 'RGB': '/DeviceRGB', 'CMYK': '/DeviceCMYK'}
+
+
+def write_image_pdf(output_full_path: str, image_paths: list,
+                    page_width_pt: float = PDF_PAGE_WIDTH_PT, page_height_pt: float = PDF_PAGE_HEIGHT_PT,
+                    log=print) -> int:
+    """
+    生成每页一张图片的 PDF，图片居中并适应页面（与PPT相同的宽高比处理）。
+    JPEG 直接复制文件（或 InMemoryImage 的缓冲区）内容作为图片流，其它格式解码后以 Flate 压缩嵌入。
+    返回成功写入的页数。
+    """
+    object_offsets = {}
+    page_object_ids = []
+    next_object_id = 3 # 1: Catalog, 2: Pages（最后写入）
+
+    with open(output_full_path, 'wb') as pdf:
+        def begin_object(object_id):
+            object_offsets[object_id] = pdf.tell()
+            pdf.write(f"{object_id} 0 obj\n".encode('ascii'))
+
+        pdf.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+        for img_path in image_paths:
+            page_start = pdf.tell()
+            try:
+                with Image.open(open_image_source(img_path)) as img: # JPEG 只读取文件头
+                    width_px, height_px = img.size
+                    if not width_px or not height_px:
+                        raise ValueError("图片尺寸为零")
+                    if img.format == 'JPEG' and img.mode in PDF_COLOR_SPACES:
+                        color_space = PDF_COLOR_SPACES[img.mode]
+                        # Adobe 生成的 CMYK JPEG 颜色是反相存储的
+                        decode = " /Decode [1 0 1 0 1 0 1 0]" if img.mode == 'CMYK' and 'adobe' in img.info else ""
+                        image_filter = "/DCTDecode"
+                        image_data = None
+                        image_length = len(img_path) if isinstance(img_path, InMemoryImage) else os.path.getsize(img_path)
+                    else:
+                        if img.mode in ('RGBA', 'LA', 'P'):
+                            rgba_img = img.convert('RGBA')
+                            flat_img = Image.new('RGB', rgba_img.size, (255, 255, 255))
+                            flat_img.paste(rgba_img, mask=rgba_img.getchannel('A'))
+                        else:
+                            flat_img = img.convert('L' if img.mode in ('1', 'L') else 'RGB')
+                        color_space = PDF_COLOR_SPACES[flat_img.mode]
+                        decode = ""
+                        image_filter = "/FlateDecode"
+                        image_data = zlib.compress(flat_img.tobytes(), 6)
+                        image_length = len(image_data)
+
+                left_pt, top_pt, display_width_pt, display_height_pt = fit_image_in_box(
+                    width_px, height_px, page_width_pt, page_height_pt)
+
+                image_id, content_id, page_id = next_object_id, next_object_id + 1, next_object_id + 2
+
+                begin_object(image_id)
+                pdf.write((f"<< /Type /XObject /Subtype /Image /Width {width_px} /Height {height_px} "
+                           f"/ColorSpace {color_space} /BitsPerComponent 8 /Filter {image_filter}{decode} "
+                           f"/Length {image_length} >>\nstream\n").encode('ascii'))
+                if image_data is None and isinstance(img_path, InMemoryImage):
+                    pdf.write(memoryview(img_path.data))
+                elif image_data is None:
+                    with open(img_path, 'rb') as img_file:
+                        shutil.copyfileobj(img_file, pdf)
+                else:
+                    pdf.write(image_data)
+                pdf.write(b"\nendstream\nendobj\n")
+
+                # PDF 坐标原点在左下角
+                content = (f"q {display_width_pt:.2f} 0 0 {display_height_pt:.2f} "
+                           f"{left_pt:.2f} {top_pt:.2f} cm /Im0 Do Q").encode('ascii')
+                begin_object(content_id)
+                pdf.write(f"<< /Length {len(content)} >>\nstream\n".encode('ascii') + content + b"\nendstream\nendobj\n")
+
+                begin_object(page_id)
+                pdf.write((f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width_pt:.2f} {page_height_pt:.2f}] "
+                           f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>\n"
+                           "endobj\n").encode('ascii'))
+                page_object_ids.append(page_id)
+                next_object_id += 3 # 三个对象都写完后才占用编号，保证交叉引用表中每个编号都有偏移
+            except Exception as e:
+                # 丢弃写了一半的对象（如复制图片时出错），这些编号留给下一页使用
+                pdf.seek(page_start)
+                pdf.truncate()
+                log(f"无法将图片添加到PDF: {image_source_name(img_path)}, 错误: {e}")
+
+        begin_object(2)
+        kids = " ".join(f"{page_id} 0 R" for page_id in page_object_ids)
+        pdf.write(f"<< /Type /Pages /Kids [{kids}] /Count {len(page_object_ids)} >>\nendobj\n".encode('ascii'))
+        begin_object(1)
+        pdf.write(b"<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+
+        xref_offset = pdf.tell()
+        pdf.write(f"xref\n0 {next_object_id}\n0000000000 65535 f \n".encode('ascii'))
+        for object_id in range(1, next_object_id):
+            pdf.write(f"{object_offsets[object_id]:010d} 00000 n \n".encode('ascii'))
+        pdf.write(f"trailer\n<< /Size {next_object_id} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode('ascii'))
+
+    return len(page_object_ids)
+
+
+def generate_pdf_document(file_name_prefix: str, image_paths: list, save_folder: str, status_queue):
+    if not image_paths:
+        log_status(status_queue, "没有图片可用于生成PDF。")
+        return None
+
+    log_status(status_queue, f"开始生成PDF文档（共 {len(image_paths)} 张图片）...")
+    output_filename = f"{file_name_prefix}.pdf"
+    output_full_path = os.path.join(save_folder, output_filename)
+    try:
+        build_document_cached(
+            'pdf', {'page_width_pt': PDF_PAGE_WIDTH_PT, 'page_height_pt': PDF_PAGE_HEIGHT_PT},
+            image_paths, output_full_path,
+            lambda: write_image_pdf(output_full_path, image_paths,
+                                    log=lambda message: log_status(status_queue, f"警告：{message}")),
+            log=lambda message: log_status(status_queue, message))
+        log_status(status_queue, f"PDF文档已成功保存到: {output_full_path}")
+        return output_full_path
+    except Exception as e:
+        log_status(status_queue, f"错误：保存PDF失败 - {output_full_path}, {e}")
+        return None
+
 # --- UI相关的类和函数 ---
 
 class WeixinToolApp:
     def __init__(self, root):
         self.root = root
         self.root.title("微信公众号文章处理工具 v1.2") # 版本号更新
-        self.root.geometry("700x600") # 稍微增加高度以容纳新控件
+        self.root.geometry("700x680") # 稍微增加高度以容纳新控件
 
         # 用于线程通信的状态队列
         self.status_queue = queue.Queue()
@@ -274,29 +1072,53 @@ class WeixinToolApp:
         # 生成选项
         self.gen_word_var = tk.BooleanVar(value=True)
         self.gen_ppt_var = tk.BooleanVar(value=True)
+        self.gen_pdf_var = tk.BooleanVar(value=False)
+        self.sized_download_var = tk.BooleanVar(value=True)
+        self.keep_images_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(root, text="生成 Word 文档 (.docx)", variable=self.gen_word_var).grid(row=3, column=0, columnspan=3, padx=10, pady=5, sticky="w")
         ttk.Checkbutton(root, text="生成 PPT 演示文稿 (.pptx)", variable=self.gen_ppt_var).grid(row=4, column=0, columnspan=3, padx=10, pady=5, sticky="w")
+        ttk.Checkbutton(root, text="生成 PDF 文档 (.pdf)", variable=self.gen_pdf_var).grid(row=5, column=0, columnspan=3, padx=10, pady=5, sticky="w")
+        ttk.Checkbutton(root, text="按输出尺寸下载较小的图片（节省流量）", variable=self.sized_download_var).grid(row=6, column=0, columnspan=3, padx=10, pady=5, sticky="w")
+        ttk.Checkbutton(root, text="保留下载的原始图片文件（取消则图片只在内存中处理）", variable=self.keep_images_var).grid(row=7, column=0, columnspan=3, padx=10, pady=5, sticky="w")
 
         # 开始处理按钮
         self.process_button = ttk.Button(root, text="开始处理", command=self.start_processing_thread)
-        self.process_button.grid(row=5, column=0, columnspan=3, padx=10, pady=10)
+        self.process_button.grid(row=8, column=0, columnspan=3, padx=10, pady=10)
 
         # 状态与日志区域
-        ttk.Label(root, text="状态与日志:").grid(row=6, column=0, padx=10, pady=5, sticky="w")
+        ttk.Label(root, text="状态与日志:").grid(row=9, column=0, padx=10, pady=5, sticky="w")
         self.status_text = scrolledtext.ScrolledText(root, wrap=tk.WORD, width=80, height=15, state='disabled')
-        self.status_text.grid(row=7, column=0, columnspan=3, padx=10, pady=5, sticky="nsew")
+        self.status_text.grid(row=10, column=0, columnspan=3, padx=10, pady=5, sticky="nsew")
 
         # 文件最终保存位置 (可以保留，也可以考虑移除，因为时间戳文件夹会在日志中显示)
-        ttk.Label(root, text="时间戳子文件夹位置:").grid(row=8, column=0, padx=10, pady=5, sticky="w")
+        ttk.Label(root, text="时间戳子文件夹位置:").grid(row=11, column=0, padx=10, pady=5, sticky="w")
         self.save_location_label = ttk.Label(root, text="- 未开始 -", foreground="blue", wraplength=450) # wraplength
-        self.save_location_label.grid(row=8, column=1, columnspan=2, padx=10, pady=5, sticky="w")
+        self.save_location_label.grid(row=11, column=1, columnspan=2, padx=10, pady=5, sticky="w")
+
+        # 网络统计实时摘要（请求数、吞吐量、首字节耗时）
+        ttk.Label(root, text="网络统计:").grid(row=12, column=0, padx=10, pady=5, sticky="w")
+        self.network_label = ttk.Label(root, text="- 未开始 -", wraplength=450)
+        self.network_label.grid(row=12, column=1, columnspan=2, padx=10, pady=5, sticky="w")
+
+        # 出口线路（代理URL、本机IP地址或 direct，用空格或逗号分隔；留空则直连）
+        ttk.Label(root, text="出口线路:").grid(row=13, column=0, padx=10, pady=5, sticky="w")
+        self.egress_entry = ttk.Entry(root, width=70)
+        self.egress_entry.grid(row=13, column=1, columnspan=2, padx=10, pady=(5, 10), sticky="ew")
+        self.egress_specs = []
 
         # 使文本区域和输入框可以随窗口缩放
         root.grid_columnconfigure(1, weight=1)
-        root.grid_rowconfigure(7, weight=1) # 日志区域行
+        root.grid_rowconfigure(10, weight=1) # 日志区域行
 
         # 定期检查队列以更新UI
         self.root.after(100, self.process_status_queue)
+        self.root.after(NETWORK_LABEL_REFRESH_MS, self.refresh_network_label)
+
+    def refresh_network_label(self):
+        """定期刷新网络统计摘要"""
+        if network_stats.hosts:
+            self.network_label.config(text=network_stats.live_summary())
+        self.root.after(NETWORK_LABEL_REFRESH_MS, self.refresh_network_label)
 
     def browse_save_location(self):
         """打开文件夹选择对话框并更新路径"""
@@ -327,7 +1149,7 @@ class WeixinToolApp:
             pass # 队列为空，什么也不做
         self.root.after(100, self.process_status_queue) # 再次安排检查
 
-    def _processing_task(self, article_url, doc_prefix, gen_word, gen_ppt, base_save_folder): # 添加 base_save_folder
+    def _processing_task(self, article_url, doc_prefix, gen_word, gen_ppt, gen_pdf, sized_download, keep_images, base_save_folder): # 添加 base_save_folder
         """实际执行处理任务的函数（在单独线程中运行）"""
         self.update_status_text("开始处理任务...")
         self.save_location_label.config(text="- 处理中... -")
@@ -351,19 +1173,36 @@ class WeixinToolApp:
             self.save_location_label.config(text="- 文件夹创建失败 -")
             return
 
-        downloaded_images = download_images_from_url(article_url, current_session_folder, self.status_queue)
+        network_stats.reset() # 网络统计只针对本次任务
+        target_outputs = None
+        if sized_download: # 按所选输出的显示尺寸下载图片
+            target_outputs = {name for name, enabled in (('word', gen_word), ('ppt', gen_ppt), ('pdf', gen_pdf)) if enabled}
+        # 不保留原始图片时，图片只下载到内存并直接交给文档生成函数
+        downloaded_images = download_images_from_url(article_url, current_session_folder, self.status_queue,
+                                                     target_outputs=target_outputs,
+                                                     in_memory=not keep_images, keep_image_files=keep_images)
 
         if downloaded_images:
             if gen_word:
                 generate_word_document(doc_prefix, downloaded_images, current_session_folder, self.status_queue)
             if gen_ppt:
                 generate_ppt_presentation(doc_prefix, downloaded_images, current_session_folder, self.status_queue)
+            if gen_pdf:
+                generate_pdf_document(doc_prefix, downloaded_images, current_session_folder, self.status_queue)
             log_status(self.status_queue, "所有选定文档创建完成！")
             self.save_location_label.config(text=current_session_folder) # 显示完整的时间戳路径
         else:
             log_status(self.status_queue, "没有下载到图片，无法生成文档。")
             self.save_location_label.config(text="- 未下载到图片 -")
 
+        egress_pool = net_instrument.egress_pool
+        for line in network_stats.report_lines() + (egress_pool.report_lines() if egress_pool is not None else []):
+            log_status(self.status_queue, line)
+        try:
+            network_stats.export_json(os.path.join(current_session_folder, NETWORK_STATS_FILE_NAME))
+        except OSError as e:
+            log_status(self.status_queue, f"警告：导出网络统计失败 - {e}")
+
         self.process_button.config(state='normal') # 任务完成，重新启用按钮
         log_status(self.status_queue, "-------------------- 处理结束 --------------------")
 
@@ -374,6 +1213,9 @@ class WeixinToolApp:
         doc_prefix = self.prefix_entry.get().strip()
         gen_word = self.gen_word_var.get()
         gen_ppt = self.gen_ppt_var.get()
+        gen_pdf = self.gen_pdf_var.get()
+        sized_download = self.sized_download_var.get()
+        keep_images = self.keep_images_var.get()
 
         if not self.selected_save_path: # 检查是否已选择保存路径
             messagebox.showerror("输入错误", "请先选择一个保存文件夹！")
@@ -385,9 +1227,17 @@ class WeixinToolApp:
         if not doc_prefix:
             messagebox.showerror("输入错误", "请输入文档名称前缀！")
             return
-        if not gen_word and not gen_ppt:
-            messagebox.showwarning("选择错误", "请至少选择一种要生成的文档类型 (Word 或 PPT)！")
+        if not gen_word and not gen_ppt and not gen_pdf:
+            messagebox.showwarning("选择错误", "请至少选择一种要生成的文档类型 (Word、PPT 或 PDF)！")
             return
+        egress_specs = self.egress_entry.get().replace('，', ',').replace(',', ' ').split()
+        if egress_specs != self.egress_specs: # 线路配置改变时重建线路池，否则保留各线路的统计和隔离状态
+            try:
+                configure_egress(egress_specs, log=lambda message: log_status(self.status_queue, message))
+            except ValueError as e:
+                messagebox.showerror("输入错误", f"出口线路配置错误：{e}")
+                return
+            self.egress_specs = egress_specs
 
         self.process_button.config(state='disabled') # 禁用按钮防止重复点击
         self.status_text.config(state='normal')
@@ -396,7 +1246,7 @@ class WeixinToolApp:
 
         # 创建并启动线程
         thread = threading.Thread(target=self._processing_task,
-                                  args=(article_url, doc_prefix, gen_word, gen_ppt, self.selected_save_path), # 传递选择的路径
+                                  args=(article_url, doc_prefix, gen_word, gen_ppt, gen_pdf, sized_download, keep_images, self.selected_save_path), # 传递选择的路径
                                   daemon=True) # 设置为守护线程，主程序退出时线程也退出
         thread.start()
 
@@ -1,9 +1,29 @@
 # 导入 requests 库和 BeautifulSoup 库
 import requests
+import requests.adapters
+import net_instrument
+from net_instrument import (network_stats, TimedHTTPAdapter, EgressHTTPAdapter, configure_egress, read_egress_file,
+                            create_http_session, get_http_session)
+from qimao_common import (resolve_response_encoding, STREAM_WRITE_BUFFER_BYTES, ChapterStream, ChapterAssembler,
+                          pump_chapter, BOILERPLATE_FILE_NAME, BoilerplateDetector, BoilerplateFilterSink,
+                          boilerplate_line_hash, STORE_FILE_NAME, ChapterStore, CHAPTER_INDEX_PATH, SEARCH_DEFAULT_LIMIT,
+                          ChapterIndex, read_saved_chapter)
 from bs4 import BeautifulSoup
 import os
+import re
+import sys
+import time
+import html
+import zipfile
+import hashlib
+import sqlite3
+import heapq
+import argparse
+import threading
+import multiprocessing
+from urllib.parse import urlsplit, urljoin
 
-# 目标网页的 URL
+# 目标网页的 URL（单章模式默认抓取的章节）
 url = 'https://www.qimao.com/shuku/1882754-17300808180001/'
 
 # 设置一个 User-Agent，模拟浏览器访问
@@ -11,74 +31,889 @@ headers = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
-print(f"正在尝试从 {url} 获取网页内容...")
+# 多进程抓取（crawl 模式）
+CRAWL_DEFAULT_WORKERS = 4
+CRAWL_LEASE_SECONDS = 120 # 领取的章节在此时间内未完成则视为失效，可被其他进程重新领取
+CRAWL_MAX_ATTEMPTS = 3
+CRAWL_IDLE_SLEEP_SECONDS = 2 # 队列暂时为空但仍有其他进程在处理时的等待时间
 
-try:
-    response = requests.get(url, headers=headers, timeout=10)
+# 多本书目录同步（catalog 模式）
+QIMAO_BOOK_URL = 'https://www.qimao.com/shuku/{book_id}/'
+BOOK_LINK_PATTERN = re.compile(r'/shuku/(\d+)/?$')
+CATALOG_DEFAULT_WORKERS = 16 # 全局并发预算：同时进行的章节请求数
+CATALOG_PROGRESS_FILE = '已下载章节.txt' # 每本书目录下记录已下载章节URL的文件
+PRIORITY_FRESH_CHAPTERS = 0 # 已跟踪的书有新章节：最先抓取
+PRIORITY_NEW_BOOK = 1 # 第一次同步的书：完整补齐
+
+
+# --- 网络耗时统计 ---
+# 统计代码（直方图、计时连接和 TimedHTTPAdapter）在 net_instrument.py 中，各脚本共用。
+
+
+def print_network_report(export_path=None):
+    """打印本进程的网络统计报告（以及各出口线路的状态）；给出 export_path 时同时导出 JSON。"""
+    if not network_stats.hosts:
+        return
+    print()
+    egress_pool = net_instrument.egress_pool
+    for line in network_stats.report_lines() + (egress_pool.report_lines() if egress_pool is not None else []):
+        print(line)
+    if export_path:
+        try:
+            network_stats.export_json(export_path)
+            print(f"网络统计已导出: {export_path}")
+        except OSError as e:
+            print(f"警告：导出网络统计失败 - {e}")
+
+
+def find_next_chapter_url(soup, page_url):
+    """在章节页面中查找“下一章”链接，返回绝对URL；没有时返回 None。"""
+    for link in soup.find_all('a', href=True):
+        if '下一章' in link.get_text() and not link['href'].startswith('javascript'):
+            return urljoin(page_url, link['href'])
+    return None
+
+
+def fetch_chapter(chapter_url, session=None):
+    """
+    获取并解析一个章节页面。
+    返回 (章节标题, 段落文本列表, 下一章URL)；标题未找到时为 "未找到标题"。
+    请求失败时抛出 requests.exceptions.RequestException。
+    """
+    response = (session or get_http_session()).get(chapter_url, headers=headers, timeout=10)
     response.raise_for_status()
-    print("网页内容获取成功！")
-    response.encoding = response.apparent_encoding
+    response.encoding = resolve_response_encoding(response)
 
     # 使用 BeautifulSoup 解析 HTML 内容
     soup = BeautifulSoup(response.text, 'html.parser')
 
     # 提取章节标题
     chapter_title_tag = soup.find('h2', class_='chapter-title')
-    if chapter_title_tag:
-        chapter_title = chapter_title_tag.get_text(strip=True)
-    else:
-        chapter_title = "未找到标题"
-        print("警告：没有找到章节标题，请检查HTML或选择器。")
+    chapter_title = chapter_title_tag.get_text(strip=True) if chapter_title_tag else "未找到标题"
 
     # 提取小说正文
     main_content_area = soup.find('div', class_='article')
-
     novel_paragraphs_text = []
     if main_content_area:
-        paragraphs = main_content_area.find_all('p')
-        
-        if paragraphs:
-            for p_tag in paragraphs:
-                novel_paragraphs_text.append(p_tag.get_text(strip=True))
-        else:
-            print("警告：在指定正文区域内没有找到 <p> 标签。")
-
-    if not novel_paragraphs_text:
-        print("警告：未能提取到小说正文内容。请再次检查HTML或选择器。")
-
-    # 打印提取到的内容
-    print("\n--- 提取结果 ---")
-    print(f"章节标题: {chapter_title}")
-    
-    print("\n小说正文:")
-    if novel_paragraphs_text:
-        for paragraph_text in novel_paragraphs_text:
-            print(paragraph_text)
-    else:
-        print("（正文内容为空）")
+        for p_tag in main_content_area.find_all('p'):
+            novel_paragraphs_text.append(p_tag.get_text(strip=True))
 
-    # 将提取到的内容保存到桌面
-    desktop = os.path.join(os.path.expanduser("~"), "Desktop")
-    filename = f"{chapter_title}.txt" if chapter_title != "未找到标题" else "scraped_novel.txt"
-    file_path = os.path.join(desktop, filename)
+    return chapter_title, novel_paragraphs_text, find_next_chapter_url(soup, response.url)
+
+
+def save_chapter_text(chapter_title, novel_paragraphs_text, save_dir, filename=None):
+    """将章节保存为 txt 文件（默认以章节标题命名），文件名不合法时改用默认文件名。返回保存的文件路径。"""
+    if filename is None:
+        filename = f"{chapter_title}.txt" if chapter_title != "未找到标题" else "scraped_novel.txt"
+    file_path = os.path.join(save_dir, filename)
 
     try:
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(f"章节标题: {chapter_title}\n\n")
             for paragraph_text in novel_paragraphs_text:
                 f.write(paragraph_text + "\n")
-        print(f"\n小说内容已保存到桌面: {file_path}")
     except OSError as e:
         print(f"\n保存文件失败: {e}. 文件名可能包含非法字符。尝试使用默认文件名。")
         # 如果文件名有问题，使用默认文件名
-        default_file_path = os.path.join(desktop, "scraped_novel_content.txt")
-        with open(default_file_path, 'w', encoding='utf-8') as f:
+        file_path = os.path.join(save_dir, "scraped_novel_content.txt")
+        with open(file_path, 'w', encoding='utf-8') as f:
             f.write(f"章节标题: {chapter_title}\n\n")
             for paragraph_text in novel_paragraphs_text:
                 f.write(paragraph_text + "\n")
-        print(f"\n小说内容已保存到桌面: {default_file_path}")
+    return file_path
+
+
+# --- 章节输出端：消费 qimao_common.ChapterStream 产生的章节流 ---
+QIMAO_CONTENT_SELECTORS = (('div', 'class', 'article'),) # 七猫章节页的正文区域
+
+
+def open_chapter_stream(chapter_url, session=None):
+    """按七猫章节页的结构流式获取一个章节（见 ChapterStream）。"""
+    return ChapterStream(chapter_url, session, headers=headers, timeout=10, content_selectors=QIMAO_CONTENT_SELECTORS)
+
+
+class ChapterFileSink:
+    """把章节流写入 txt 文件（格式与 save_chapter_text 相同），文件名在收到标题时确定，写入经过缓冲。"""
+
+    def __init__(self, save_dir, filename_for_title=None):
+        self.save_dir = save_dir
+        self.filename_for_title = filename_for_title or (
+            lambda chapter_title: f"{chapter_title}.txt" if chapter_title != "未找到标题" else "scraped_novel.txt")
+        self.file = None
+        self.file_path = None
+
+    def start(self, chapter_title):
+        self.file_path = os.path.join(self.save_dir, self.filename_for_title(chapter_title))
+        try:
+            self.file = open(self.file_path, 'w', encoding='utf-8', buffering=STREAM_WRITE_BUFFER_BYTES)
+        except OSError as e:
+            print(f"\n保存文件失败: {e}. 文件名可能包含非法字符。尝试使用默认文件名。")
+            self.file_path = os.path.join(self.save_dir, "scraped_novel_content.txt")
+            self.file = open(self.file_path, 'w', encoding='utf-8', buffering=STREAM_WRITE_BUFFER_BYTES)
+        self.file.write(f"章节标题: {chapter_title}\n\n")
+
+    def paragraph(self, paragraph_text):
+        self.file.write(paragraph_text + "\n")
+
+    def finish(self):
+        self.file.close()
+
+    def abort(self):
+        """流中途失败时删除写了一半的文件。"""
+        if self.file is not None:
+            self.file.close()
+            os.remove(self.file_path)
+
+
+class ChapterPrintSink:
+    """把章节流直接打印到屏幕。"""
+
+    def __init__(self):
+        self.paragraph_count = 0
+
+    def start(self, chapter_title):
+        print("\n--- 提取结果 ---")
+        print(f"章节标题: {chapter_title}")
+        print("\n小说正文:")
+
+    def paragraph(self, paragraph_text):
+        self.paragraph_count += 1
+        print(paragraph_text)
+
+    def finish(self):
+        if not self.paragraph_count:
+            print("（正文内容为空）")
+
+    def abort(self):
+        pass
+
+
+def scrape_single_chapter(chapter_url, chapter_index=None):
+    """单章模式：流式抓取一个章节，边解析边打印并保存到桌面（同时加入全文索引）。"""
+    print(f"正在尝试从 {chapter_url} 获取网页内容...")
+
+    try:
+        # 将提取到的内容边打印边保存到桌面；只有需要更新全文索引时才在内存中组装完整章节
+        desktop = os.path.join(os.path.expanduser("~"), "Desktop")
+        file_sink = ChapterFileSink(desktop)
+        sinks = [ChapterPrintSink(), file_sink]
+        assembler = ChapterAssembler() if chapter_index is not None else None
+        if assembler is not None:
+            sinks.append(assembler)
+        chapter_stream = open_chapter_stream(chapter_url)
+        chapter_title, paragraph_count = pump_chapter(chapter_stream, *sinks)
+
+        if chapter_title == "未找到标题":
+            print("警告：没有找到章节标题，请检查HTML或选择器。")
+        if not chapter_stream.content_found or not paragraph_count:
+            print("警告：未能提取到小说正文内容。请再次检查HTML或选择器。")
+        if assembler is not None:
+            index_saved_chapter(chapter_index, file_sink.file_path, "", assembler.chapter_title,
+                                assembler.novel_paragraphs_text)
+        print(f"\n小说内容已保存到桌面: {file_sink.file_path}")
+
+    except requests.exceptions.RequestException as e:
+        print(f"获取网页失败: {e}")
+    except Exception as e:
+        print(f"发生了其他错误: {e}")
+
+
+# --- 全文索引（ChapterIndex 见 qimao_common.py）---
+def index_saved_chapter(chapter_index, file_path, book, chapter_title, novel_paragraphs_text):
+    """把刚保存的章节加入全文索引；索引失败只打印警告，不影响抓取。"""
+    if chapter_index is None:
+        return
+    try:
+        chapter_index.add_chapter(file_path, book, chapter_title, novel_paragraphs_text)
+    except sqlite3.Error as e:
+        print(f"警告：章节加入全文索引失败: {file_path}, {e}")
+
+
+def index_existing_chapters(chapter_index, paths):
+    """把已有的章节 txt 文件（或目录下的所有 txt 文件）加入索引，书名取所在目录名。返回索引的章节数。"""
+    indexed = 0
+    for path in paths:
+        if os.path.isdir(path):
+            file_paths = [os.path.join(root, name) for root, _, names in os.walk(path)
+                          for name in sorted(names)
+                          if (name.endswith('.txt') and name != CATALOG_PROGRESS_FILE) or name == STORE_FILE_NAME]
+        else:
+            file_paths = [path]
+        for file_path in file_paths:
+            if file_path.endswith(STORE_FILE_NAME):
+                store = ChapterStore(file_path)
+                try:
+                    book = store.metadata.get('title', '')
+                    for number, chapter_title, novel_paragraphs_text in store.iter_chapters():
+                        chapter_index.add_chapter(f"{os.path.abspath(file_path)}#{number}", book,
+                                                  chapter_title, novel_paragraphs_text)
+                        indexed += 1
+                finally:
+                    store.close()
+                continue
+            chapter_title, novel_paragraphs_text = read_saved_chapter(file_path)
+            book = re.sub(r'^\d+_', '', os.path.basename(os.path.dirname(os.path.abspath(file_path))))
+            chapter_index.add_chapter(file_path, book, chapter_title, novel_paragraphs_text)
+            indexed += 1
+    return indexed
+
+
+def run_search(chapter_index, query, book=None, limit=SEARCH_DEFAULT_LIMIT):
+    """search 模式：打印命中的书名、章节和片段。"""
+    start_time = time.perf_counter()
+    results = chapter_index.search(query, book, limit)
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+    for result_book, chapter_title, file_path, snippet in results:
+        print(f"《{result_book or '未知书名'}》 {chapter_title}\n    {snippet}\n    {file_path}")
+    print(f"共 {len(results)} 条结果（用时 {elapsed_ms:.1f} 毫秒）。")
+
+
+# --- 多进程抓取：共享 SQLite 工作队列 ---
+class CrawlQueue:
+    """
+    多个进程（或共享文件系统的多台机器）共用的章节抓取队列，保存在一个 SQLite 文件中。
+    进程以租约方式领取章节：租约到期仍未完成的章节会被其他进程重新领取。
+    seen_urls 只保存URL的 64 位哈希，用于防止同一章节被重复加入队列。
+    """
+
+    def __init__(self, db_path, shared_fs=False):
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        # WAL 依赖共享内存，不能用于网络文件系统；多台机器共享时改用回滚日志
+        self.conn.execute("PRAGMA journal_mode=DELETE" if shared_fs else "PRAGMA journal_mode=WAL")
+        self.seen_cache = set()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS crawl_queue ("
+            "id INTEGER PRIMARY KEY, url TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', "
+            "lease_owner TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "title TEXT, content TEXT, error TEXT, finished_at REAL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_crawl_queue_status ON crawl_queue(status, lease_expires)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen_urls (hash INTEGER PRIMARY KEY)")
+
+    @staticmethod
+    def url_hash(page_url):
+        """规范化URL（去掉片段和首尾空白）后的 64 位有符号哈希。"""
+        normalized = page_url.strip().split('#', 1)[0]
+        return int.from_bytes(hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+    def add_urls(self, page_urls, cursor=None):
+        """把未见过的URL加入队列，返回新加入的数量。"""
+        cursor = cursor or self.conn
+        added = 0
+        for page_url in page_urls:
+            url_hash = self.url_hash(page_url)
+            if url_hash in self.seen_cache:
+                continue
+            self.seen_cache.add(url_hash)
+            if cursor.execute("INSERT OR IGNORE INTO seen_urls(hash) VALUES (?)", (url_hash,)).rowcount:
+                cursor.execute("INSERT INTO crawl_queue(url) VALUES (?)", (page_url.strip(),))
+                added += 1
+        return added
+
+    def add_seed_urls(self, page_urls):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            added = self.add_urls(page_urls)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def claim(self, owner, lease_seconds=CRAWL_LEASE_SECONDS, max_attempts=CRAWL_MAX_ATTEMPTS):
+        """
+        领取一个待处理（或租约已过期）的章节，返回 (id, url)；没有可领取的章节时返回 None。
+        租约已过期且尝试次数用完的章节（每次都让工作进程崩溃或卡住）标记为失败，不再领取。
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "UPDATE crawl_queue SET status = 'failed', error = ?, lease_owner = NULL, lease_expires = NULL "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (f"已尝试 {max_attempts} 次，最后一次租约到期仍未完成", now, max_attempts))
+            row = self.conn.execute(
+                "SELECT id, url FROM crawl_queue WHERE status = 'pending' "
+                "OR (status = 'leased' AND lease_expires < ?) ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row:
+                self.conn.execute(
+                    "UPDATE crawl_queue SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1 WHERE id = ?", (owner, now + lease_seconds, row[0]))
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def complete(self, item_id, owner, chapter_title, novel_paragraphs_text, discovered_urls=()):
+        """写回抓取结果并加入新发现的URL。租约已被其他进程接管时忽略结果，返回 False。"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            updated = self.conn.execute(
+                "UPDATE crawl_queue SET status = 'done', title = ?, content = ?, error = NULL, finished_at = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (chapter_title, "\n".join(novel_paragraphs_text), time.time(), item_id, owner)).rowcount
+            if updated:
+                self.add_urls(discovered_urls)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return bool(updated)
+
+    def fail(self, item_id, owner, error, max_attempts=CRAWL_MAX_ATTEMPTS):
+        """记录失败；未超过最大尝试次数时放回队列等待重试。"""
+        self.conn.execute(
+            "UPDATE crawl_queue SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "error = ?, lease_owner = NULL, lease_expires = NULL WHERE id = ? AND lease_owner = ?",
+            (max_attempts, str(error), item_id, owner))
+
+    def has_outstanding_work(self):
+        """队列中是否还有待处理或正在处理的章节。"""
+        return self.conn.execute(
+            "SELECT EXISTS(SELECT 1 FROM crawl_queue WHERE status IN ('pending', 'leased'))").fetchone()[0] == 1
+
+    def status_counts(self):
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM crawl_queue GROUP BY status").fetchall())
+
+    def iter_done_chapters(self):
+        """按加入队列的顺序产出已完成章节的 (url, 标题, 段落列表)。"""
+        for page_url, chapter_title, content in self.conn.execute(
+                "SELECT url, title, content FROM crawl_queue WHERE status = 'done' ORDER BY id"):
+            yield page_url, chapter_title, content.split("\n") if content else []
+
+    def close(self):
+        self.conn.close()
+
+
+def crawl_worker(db_path, worker_name, follow_next=True, shared_fs=False,
+                 lease_seconds=CRAWL_LEASE_SECONDS, max_attempts=CRAWL_MAX_ATTEMPTS, net_stats_path=None,
+                 egress_specs=None, egress_check_url=None):
+    """
+    工作进程：不断从共享队列领取章节，独立完成抓取和解析并写回结果，直到队列中没有剩余工作。
+    网络统计按进程记录，给出 net_stats_path 时导出为 <net_stats_path>.<进程名>.json。
+    出口线路池也按进程建立，各进程分别统计和隔离线路。
+    """
+    configure_egress(egress_specs, egress_check_url, check_headers=headers)
+    crawl_queue = CrawlQueue(db_path, shared_fs)
+    session = create_http_session()
+    completed = 0
+    try:
+        while True:
+            item = crawl_queue.claim(worker_name, lease_seconds, max_attempts)
+            if item is None:
+                if not crawl_queue.has_outstanding_work():
+                    break
+                time.sleep(CRAWL_IDLE_SLEEP_SECONDS) # 其他进程仍在处理，可能还会加入新章节
+                continue
+            item_id, chapter_url = item
+            try:
+                chapter_title, novel_paragraphs_text, next_url = fetch_chapter(chapter_url, session)
+            except Exception as e:
+                crawl_queue.fail(item_id, worker_name, e, max_attempts)
+                print(f"[{worker_name}] 获取网页失败: {chapter_url}, {e}")
+                continue
+            discovered_urls = [next_url] if follow_next and next_url else []
+            if crawl_queue.complete(item_id, worker_name, chapter_title, novel_paragraphs_text, discovered_urls):
+                completed += 1
+                print(f"[{worker_name}] 已完成: {chapter_title}")
+    finally:
+        crawl_queue.close()
+    print(f"[{worker_name}] 队列已处理完毕，本进程共完成 {completed} 章。")
+    print_network_report(f"{net_stats_path}.{worker_name}.json" if net_stats_path else None)
+
+
+def run_crawl(db_path, seed_urls, workers=CRAWL_DEFAULT_WORKERS, follow_next=True, shared_fs=False, output_dir=None,
+              chapter_index=None, net_stats_path=None, egress_specs=None, egress_check_url=None, strip_boilerplate=True,
+              book_entries=()):
+    """
+    crawl 模式：加入起始URL和指定书籍目录中的全部章节，启动多个工作进程处理共享队列，最后可选地导出已完成章节。
+    只给出章节URL时，新章节只能沿“下一章”链接逐个发现，每个起始URL同一时间最多只有一个待抓取的章节，
+    多出的工作进程只能等待；要让速度随进程数增长，需用 book_entries 一次加入整本书的目录，或给出多个起始URL。
+    导出时先统计全部章节再去除重复行，开头几章中的重复行也能去掉。
+    """
+    crawl_queue = CrawlQueue(db_path, shared_fs)
+    seed_urls = list(seed_urls)
+    for book_id in resolve_catalog_book_ids(book_entries):
+        try:
+            book_title, chapter_urls = fetch_book_index(book_id)
+        except requests.exceptions.RequestException as e:
+            print(f"获取书籍目录失败: {book_id}, {e}")
+            continue
+        print(f"《{book_title}》目录中共 {len(chapter_urls)} 章。")
+        seed_urls.extend(chapter_urls)
+    if follow_next and not book_entries and 0 < len(seed_urls) < workers:
+        print(f"提示：只有 {len(seed_urls)} 个起始URL，沿“下一章”链接抓取时最多只有这么多进程同时工作；"
+              f"用 --book 可以一次加入整本书的目录。")
+    if seed_urls:
+        print(f"新加入队列 {crawl_queue.add_seed_urls(seed_urls)} 个起始URL。")
+
+    host_name = os.uname().nodename if hasattr(os, 'uname') else os.environ.get('COMPUTERNAME', 'local')
+    processes = [multiprocessing.Process(target=crawl_worker,
+                                         args=(db_path, f"{host_name}-{os.getpid()}-{i}", follow_next, shared_fs),
+                                         kwargs={'net_stats_path': net_stats_path, 'egress_specs': egress_specs,
+                                                 'egress_check_url': egress_check_url})
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    print(f"队列状态: {crawl_queue.status_counts()}")
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        boilerplate = BoilerplateDetector() if strip_boilerplate else None
+        if boilerplate is not None:
+            for _, _, novel_paragraphs_text in crawl_queue.iter_done_chapters():
+                boilerplate.observe({line_hash for line_hash in map(boilerplate_line_hash, novel_paragraphs_text)
+                                     if line_hash is not None})
+        exported = 0
+        for _, chapter_title, novel_paragraphs_text in crawl_queue.iter_done_chapters():
+            if boilerplate is not None:
+                novel_paragraphs_text = boilerplate.filter(novel_paragraphs_text, observe=False)
+            file_path = save_chapter_text(chapter_title, novel_paragraphs_text, output_dir)
+            index_saved_chapter(chapter_index, file_path, os.path.basename(os.path.abspath(output_dir)),
+                                chapter_title, novel_paragraphs_text)
+            exported += 1
+        print(f"已导出 {exported} 章到: {output_dir}")
+        for line in boilerplate.report_lines() if boilerplate is not None else []:
+            print(line)
+    crawl_queue.close()
+
+# --- 章节存储（ChapterStore 见 qimao_common.py）：打包和导出 ---
+def pack_chapter_files(txt_dir, store_path=None):
+    """把目录中按文件名排序的章节 txt 文件依次写入章节存储，返回写入的章节数。原文件不删除。"""
+    names = sorted(name for name in os.listdir(txt_dir) if name.endswith('.txt') and name != CATALOG_PROGRESS_FILE)
+    store = ChapterStore(store_path or os.path.join(txt_dir, STORE_FILE_NAME),
+                         title=re.sub(r'^\d+_', '', os.path.basename(os.path.abspath(txt_dir))))
+    try:
+        for number, name in enumerate(names, 1):
+            chapter_title, novel_paragraphs_text = read_saved_chapter(os.path.join(txt_dir, name))
+            store.put(number, chapter_title, novel_paragraphs_text)
+    finally:
+        store.close()
+    return len(names)
+
+
+def export_store_txt(store, output_path):
+    """把整本书导出为一个 txt 文件。"""
+    with open(output_path, 'w', encoding='utf-8') as f:
+        if store.metadata.get('title'):
+            f.write(f"{store.metadata['title']}\n\n")
+        for _, chapter_title, novel_paragraphs_text in store.iter_chapters():
+            f.write(f"{chapter_title}\n\n")
+            for paragraph_text in novel_paragraphs_text:
+                f.write(paragraph_text + "\n")
+            f.write("\n")
+
+
+EPUB_CONTAINER_XML = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+    '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>'
+    '</container>'
+)
+EPUB_CHAPTER_XHTML = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE html>\n'
+    '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="zh-CN"><head><title>{title}</title></head>'
+    '<body><h2>{title}</h2>{paragraphs}</body></html>'
+)
+
+
+def export_store_epub(store, output_path):
+    """把整本书导出为 EPUB 3（每章一个 XHTML 文件，附带目录），章节逐个写入 zip。"""
+    book_title = store.metadata.get('title') or os.path.splitext(os.path.basename(output_path))[0]
+    chapters = [] # (文件名, 章节标题)
+    with zipfile.ZipFile(output_path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('mimetype', 'application/epub+zip', compress_type=zipfile.ZIP_STORED) # 必须是第一个、不压缩
+        zf.writestr('META-INF/container.xml', EPUB_CONTAINER_XML)
+        for number, chapter_title, novel_paragraphs_text in store.iter_chapters():
+            file_name = f"chapter{number:05d}.xhtml"
+            paragraphs = "".join(f"<p>{html.escape(text)}</p>" for text in novel_paragraphs_text)
+            zf.writestr(f"OEBPS/{file_name}", EPUB_CHAPTER_XHTML.format(title=html.escape(chapter_title),
+                                                                        paragraphs=paragraphs))
+            chapters.append((file_name, chapter_title))
+
+        nav_items = "".join(f'<li><a href="{name}">{html.escape(title)}</a></li>' for name, title in chapters)
+        zf.writestr('OEBPS/nav.xhtml', (
+            '<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE html>\n'
+            '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="zh-CN">'
+            f'<head><title>{html.escape(book_title)}</title></head><body>'
+            f'<nav epub:type="toc"><h1>目录</h1><ol>{nav_items}</ol></nav></body></html>'))
+        manifest_items = "".join(f'<item id="c{i}" href="{name}" media-type="application/xhtml+xml"/>'
+                                 for i, (name, _) in enumerate(chapters))
+        spine_items = "".join(f'<itemref idref="c{i}"/>' for i in range(len(chapters)))
+        zf.writestr('OEBPS/content.opf', (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            f'<dc:identifier id="book-id">qimao-{html.escape(str(store.metadata.get("book_id", book_title)))}</dc:identifier>'
+            f'<dc:title>{html.escape(book_title)}</dc:title><dc:language>zh-CN</dc:language>'
+            f'<meta property="dcterms:modified">{time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}</meta>'
+            '</metadata><manifest>'
+            '<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>'
+            f'{manifest_items}</manifest><spine>{spine_items}</spine></package>'))
+
+
+# --- 多本书目录同步：全局并发预算 + 优先级 + 公平调度 ---
+def chapter_link_pattern(book_id):
+    return re.compile(rf'/shuku/{book_id}-(\d+)/?$')
+
+
+def fetch_book_index(book_id, session=None):
+    """获取书籍页面，返回 (书名, 按目录顺序排列的章节URL列表)。"""
+    book_url = QIMAO_BOOK_URL.format(book_id=book_id)
+    response = (session or get_http_session()).get(book_url, headers=headers, timeout=10)
+    response.raise_for_status()
+    response.encoding = resolve_response_encoding(response)
+    soup = BeautifulSoup(response.text, 'html.parser')
+
+    title_tag = soup.find('h1') or soup.find('title')
+    book_title = title_tag.get_text(strip=True) if title_tag else str(book_id)
+    pattern = chapter_link_pattern(book_id)
+    chapter_urls = []
+    seen = set()
+    for link in soup.find_all('a', href=True):
+        chapter_url = urljoin(response.url, link['href'])
+        if pattern.search(urlsplit(chapter_url).path) and chapter_url not in seen:
+            seen.add(chapter_url)
+            chapter_urls.append(chapter_url)
+    return book_title, chapter_urls
+
+
+def resolve_catalog_book_ids(entries, session=None):
+    """
+    把命令行给出的条目解析为书籍ID列表（保持顺序、去重）：
+    纯数字视为书籍ID，书籍页面URL取其ID，其他URL视为分类/书单页面，从中提取所有书籍链接。
+    """
+    book_ids = []
+    for entry in entries:
+        entry = entry.strip()
+        if not entry:
+            continue
+        if entry.isdigit():
+            book_ids.append(entry)
+            continue
+        match = BOOK_LINK_PATTERN.search(urlsplit(entry).path)
+        if match:
+            book_ids.append(match.group(1))
+            continue
+        try:
+            response = (session or get_http_session()).get(entry, headers=headers, timeout=10)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"获取书单页面失败: {entry}, {e}")
+            continue
+        response.encoding = resolve_response_encoding(response)
+        soup = BeautifulSoup(response.text, 'html.parser')
+        found = [m.group(1) for m in (BOOK_LINK_PATTERN.search(urlsplit(urljoin(response.url, a['href'])).path)
+                                      for a in soup.find_all('a', href=True)) if m]
+        print(f"书单页面 {entry} 中找到 {len(set(found))} 本书。")
+        book_ids.extend(found)
+    return list(dict.fromkeys(book_ids))
+
+
+class CatalogBook:
+    """目录同步中的一本书：待抓取章节、下载进度和保存目录。"""
+
+    def __init__(self, book_id, book_title, chapter_urls, output_dir):
+        self.book_id = book_id
+        self.book_title = book_title
+        self.save_dir = os.path.join(output_dir, f"{book_id}_{sanitize_name(book_title)}")
+        self.progress_path = os.path.join(self.save_dir, CATALOG_PROGRESS_FILE)
+        self.store = None # 使用章节存储时为 ChapterStore，否则每章保存为一个 txt 文件
+        self.boilerplate = None # 去除重复行时为 BoilerplateDetector
+        done_urls = set()
+        if os.path.exists(self.progress_path):
+            with open(self.progress_path, 'r', encoding='utf-8') as f:
+                done_urls = {line.strip() for line in f if line.strip()}
+        self.tracked = bool(done_urls)
+        # (目录序号, URL)；序号即章节存储中的章节号（txt 模式下用于文件名），保证按章节顺序排列
+        self.pending = [(i, u) for i, u in enumerate(chapter_urls, 1) if u not in done_urls]
+        self.pending.reverse() # 从列表末尾弹出即按目录顺序
+        self.total = len(self.pending)
+        self.completed = 0
+        self.failed = 0
+        self.dispatched = 0
+        self.progress_lock = threading.Lock()
+
+    @property
+    def priority(self):
+        return PRIORITY_FRESH_CHAPTERS if self.tracked else PRIORITY_NEW_BOOK
+
+    def record_done(self, chapter_url):
+        with self.progress_lock:
+            with open(self.progress_path, 'a', encoding='utf-8') as f:
+                f.write(chapter_url + "\n")
+
+
+def sanitize_name(name):
+    """去掉文件名中不允许的字符。"""
+    return re.sub(r'[\\/:*?"<>|]', '_', name).strip() or "untitled"
+
+
+class CatalogScheduler:
+    """
+    在多本书之间分配章节抓取任务。
+    先按优先级（有新章节的已跟踪书籍优先），同一优先级内按已派发数量最少的书轮转，
+    这样章节很多的书不会让其他书一直等待。
+    """
+
+    def __init__(self, books):
+        self.lock = threading.Lock()
+        self.heap = []
+        for order, book in enumerate(books):
+            book.schedule_order = order
+            if book.pending:
+                heapq.heappush(self.heap, (book.priority, 0, order, book))
+
+    def next_task(self):
+        """取出下一个 (书, 目录序号, 章节URL, 已尝试次数)；全部派发完毕时返回 None。"""
+        with self.lock:
+            if not self.heap:
+                return None
+            priority, dispatched, order, book = heapq.heappop(self.heap)
+            index, chapter_url = book.pending.pop()
+            book.dispatched += 1
+            if book.pending:
+                heapq.heappush(self.heap, (priority, dispatched + 1, order, book))
+            return book, index, chapter_url, 0
+
+    def retry(self, book, index, chapter_url):
+        """把失败的章节放回该书队列的最前面。"""
+        with self.lock:
+            was_empty = not book.pending
+            book.pending.append((index, chapter_url))
+            if was_empty:
+                heapq.heappush(self.heap, (book.priority, book.dispatched, book.schedule_order, book))
+
+
+def catalog_worker(scheduler, attempts, print_lock, totals, chapter_index=None):
+    """
+    目录同步工作线程：从调度器取任务，抓取并保存章节。每个线程使用自己的连接会话。
+    抓取或保存失败都计入该章节的尝试次数，未用完时放回队列重试，线程继续处理其他章节。
+    """
+    session = create_http_session()
+
+    def record_failure(book, index, chapter_url, action, error):
+        with print_lock:
+            attempts[chapter_url] = attempts.get(chapter_url, 0) + 1
+            give_up = attempts[chapter_url] >= CRAWL_MAX_ATTEMPTS
+            if give_up:
+                book.failed += 1
+                totals['failed'] += 1
+            print(f"[{book.book_title}] {action}失败{'（已放弃）' if give_up else '，稍后重试'}: {chapter_url}, {error}")
+        if not give_up:
+            scheduler.retry(book, index, chapter_url)
+
+    while True:
+        task = scheduler.next_task()
+        if task is None:
+            break
+        book, index, chapter_url, _ = task
+        try:
+            if book.store is not None:
+                chapter_title, novel_paragraphs_text, _ = fetch_chapter(chapter_url, session)
+                if book.boilerplate is not None:
+                    novel_paragraphs_text = book.boilerplate.filter(novel_paragraphs_text)
+            else:
+                # txt 模式下章节边下载边写入文件，只有需要更新全文索引时才在内存中组装完整章节
+                file_sink = ChapterFileSink(book.save_dir,
+                                            lambda title, index=index: f"{index:05d}_{sanitize_name(title)}.txt")
+                assembler = ChapterAssembler() if chapter_index is not None else None
+                sinks = [file_sink] + ([assembler] if assembler is not None else [])
+                if book.boilerplate is not None:
+                    sinks = [BoilerplateFilterSink(book.boilerplate, *sinks)]
+                chapter_title, _ = pump_chapter(open_chapter_stream(chapter_url, session), *sinks)
+        except Exception as e:
+            record_failure(book, index, chapter_url, "获取章节", e)
+            continue
+
+        try:
+            if book.store is not None:
+                book.store.put(index, chapter_title, novel_paragraphs_text)
+                # 全文索引中用“存储文件#章节号”定位章节
+                index_saved_chapter(chapter_index, f"{book.store.path}#{index}", book.book_title, chapter_title,
+                                    novel_paragraphs_text)
+            elif assembler is not None:
+                index_saved_chapter(chapter_index, file_sink.file_path, book.book_title, chapter_title,
+                                    assembler.novel_paragraphs_text)
+            book.record_done(chapter_url)
+        except Exception as e: # 如磁盘已满、存储文件或索引数据库出错
+            record_failure(book, index, chapter_url, "保存章节", e)
+            continue
+        with print_lock:
+            book.completed += 1
+            totals['completed'] += 1
+            print(f"[{book.book_title}] {book.completed}/{book.total} 章 "
+                  f"（总计 {totals['completed']}/{totals['total']}）: {chapter_title}")
+
+
+def run_catalog(entries, output_dir, workers=CATALOG_DEFAULT_WORKERS, chapter_index=None, use_store=True,
+                strip_boilerplate=True):
+    """
+    catalog 模式：同步多本书的所有未下载章节，最后打印每本书的进度和总计。
+    use_store 为 True 时每本书的章节写入一个压缩章节存储（chapters.qcs），否则每章一个 txt 文件。
+    strip_boilerplate 为 True 时保存前去除各章重复出现的推广、水印行。
+    """
+    session = requests.Session()
+    if net_instrument.egress_pool is not None: # 每条出口线路有自己的连接池
+        adapter = EgressHTTPAdapter(net_instrument.egress_pool)
+    else:
+        adapter = TimedHTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    books = []
+    for book_id in resolve_catalog_book_ids(entries, session):
+        try:
+            book_title, chapter_urls = fetch_book_index(book_id, session)
+        except requests.exceptions.RequestException as e:
+            print(f"获取书籍目录失败: {book_id}, {e}")
+            continue
+        book = CatalogBook(book_id, book_title, chapter_urls, output_dir)
+        os.makedirs(book.save_dir, exist_ok=True)
+        if use_store:
+            book.store = ChapterStore(os.path.join(book.save_dir, STORE_FILE_NAME), title=book_title, book_id=book_id)
+        if strip_boilerplate:
+            book.boilerplate = BoilerplateDetector(os.path.join(book.save_dir, BOILERPLATE_FILE_NAME))
+        books.append(book)
+        state = "有新章节" if book.tracked and book.total else ("首次同步" if not book.tracked else "已是最新")
+        print(f"《{book_title}》: 目录 {len(chapter_urls)} 章，待下载 {book.total} 章（{state}）")
+
+    totals = {'total': sum(book.total for book in books), 'completed': 0, 'failed': 0}
+    print(f"共 {len(books)} 本书，待下载 {totals['total']} 章，并发 {workers}。")
+    scheduler = CatalogScheduler(books)
+    attempts = {}
+    print_lock = threading.Lock()
+    threads = [threading.Thread(target=catalog_worker, args=(scheduler, attempts, print_lock, totals, chapter_index),
+                                daemon=True)
+               for _ in range(workers)]
+    start_time = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print("\n--- 同步结果 ---")
+    for book in books:
+        print(f"《{book.book_title}》: 完成 {book.completed}/{book.total}，失败 {book.failed}")
+        if book.store is not None:
+            book.store.close()
+        if book.boilerplate is not None:
+            try:
+                book.boilerplate.save()
+            except OSError as e:
+                print(f"  警告：保存重复行计数器失败 - {e}")
+            for line in book.boilerplate.report_lines():
+                print(f"  {line}")
+    print(f"总计: 完成 {totals['completed']}/{totals['total']}，失败 {totals['failed']}，"
+          f"用时 {time.time() - start_time:.1f} 秒")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="七猫小说抓取。不带参数时抓取默认的单个章节。")
+    arg_parser.add_argument('--index-db', default=CHAPTER_INDEX_PATH, help="章节全文索引数据库文件")
+    arg_parser.add_argument('--no-index', action='store_true', help="保存章节时不更新全文索引")
+    arg_parser.add_argument('--net-stats', help="把网络请求统计（各阶段耗时分位数、吞吐量）导出为 JSON 文件")
+    arg_parser.add_argument('--egress', action='append', default=[],
+                            help="出口线路，可重复指定：代理URL（http://、socks5://）、本机IP地址或 direct")
+    arg_parser.add_argument('--egress-file', help="出口线路列表文件，每行一条线路")
+    arg_parser.add_argument('--egress-check-url', help="隔离到期的出口线路通过请求此地址检查是否恢复（默认用一个真实请求试探）")
+    subparsers = arg_parser.add_subparsers(dest='command')
+
+    crawl_parser = subparsers.add_parser('crawl', help="多进程抓取：多个工作进程共享一个 SQLite 工作队列")
+    crawl_parser.add_argument('--queue', required=True, help="队列数据库文件，多台机器可放在共享文件系统上")
+    crawl_parser.add_argument('--seed', nargs='*', default=[], help="起始章节URL（已在队列中的会被忽略）")
+    crawl_parser.add_argument('--book', action='append', default=[],
+                              help="书籍ID或书籍页面URL，把目录中的全部章节加入队列，所有工作进程可同时抓取（可重复）")
+    crawl_parser.add_argument('--workers', type=int, default=CRAWL_DEFAULT_WORKERS, help="本机工作进程数")
+    crawl_parser.add_argument('--no-follow', action='store_true', help="不沿“下一章”链接继续加入新章节")
+    crawl_parser.add_argument('--shared-fs', action='store_true', help="队列位于网络/共享文件系统上（不使用 WAL）")
+    crawl_parser.add_argument('--output-dir', help="完成后把已抓取的章节导出为 txt 的目录")
+    crawl_parser.add_argument('--keep-boilerplate', action='store_true', help="导出时保留各章重复出现的推广、水印行")
+
+    catalog_parser = subparsers.add_parser('catalog', help="同步多本书：按优先级和公平轮转在所有书之间分配并发")
+    catalog_parser.add_argument('books', nargs='*', help="书籍ID、书籍页面URL或分类/书单页面URL")
+    catalog_parser.add_argument('--file', help="每行一个书籍ID或URL的列表文件")
+    catalog_parser.add_argument('--workers', type=int, default=CATALOG_DEFAULT_WORKERS, help="全局并发请求数")
+    catalog_parser.add_argument('--output-dir', default=os.path.join(os.path.expanduser("~"), "Desktop", "七猫小说"),
+                                help="保存目录，每本书一个子目录")
+    catalog_parser.add_argument('--txt', action='store_true', help="每章保存为单独的 txt 文件，而不是写入压缩章节存储")
+    catalog_parser.add_argument('--keep-boilerplate', action='store_true', help="保留各章重复出现的推广、水印行")
+
+    export_parser = subparsers.add_parser('export', help="把章节存储导出为 TXT 或 EPUB")
+    export_parser.add_argument('store', help=f"章节存储文件（{STORE_FILE_NAME}）或其所在目录")
+    export_parser.add_argument('--txt', help="导出的 txt 文件路径")
+    export_parser.add_argument('--epub', help="导出的 epub 文件路径")
+
+    pack_parser = subparsers.add_parser('pack', help="把一个目录中的章节 txt 文件打包为章节存储")
+    pack_parser.add_argument('directory', help="章节 txt 文件所在目录（按文件名排序）")
+
+    search_parser = subparsers.add_parser('search', help="在已下载的章节中全文搜索")
+    search_parser.add_argument('query', help="要搜索的人名、词语或句子")
+    search_parser.add_argument('--book', help="只搜索书名包含此文字的书")
+    search_parser.add_argument('--limit', type=int, default=SEARCH_DEFAULT_LIMIT, help="最多显示的结果数")
+
+    index_parser = subparsers.add_parser('index', help="把已有的章节 txt 文件或章节存储加入全文索引")
+    index_parser.add_argument('paths', nargs='+', help="章节 txt 文件、章节存储文件或包含它们的目录")
+
+    args = arg_parser.parse_args()
+    egress_specs = list(args.egress)
+    try:
+        if args.egress_file:
+            egress_specs.extend(read_egress_file(args.egress_file))
+        configure_egress(egress_specs, args.egress_check_url, check_headers=headers)
+    except (OSError, ValueError) as e:
+        arg_parser.error(f"出口线路配置错误: {e}")
+
+    chapter_index = None
+    if not args.no_index or args.command in ('search', 'index'):
+        try:
+            chapter_index = ChapterIndex(args.index_db)
+        except RuntimeError as e:
+            print(f"警告：{e}，本次不更新全文索引。")
+            if args.command in ('search', 'index'):
+                sys.exit(1)
+
+    if args.command == 'search':
+        run_search(chapter_index, args.query, args.book, args.limit)
+    elif args.command == 'index':
+        print(f"已索引 {index_existing_chapters(chapter_index, args.paths)} 个章节。")
+    elif args.command == 'crawl':
+        run_crawl(args.queue, args.seed, args.workers, not args.no_follow, args.shared_fs, args.output_dir,
+                  chapter_index, args.net_stats, egress_specs, args.egress_check_url, not args.keep_boilerplate,
+                  args.book)
+    elif args.command == 'catalog':
+        entries = list(args.books)
+        if args.file:
+            with open(args.file, 'r', encoding='utf-8') as f:
+                entries.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+        if not entries:
+            arg_parser.error("catalog 模式需要至少一个书籍ID或URL")
+        run_catalog(entries, args.output_dir, args.workers, chapter_index, use_store=not args.txt,
+                    strip_boilerplate=not args.keep_boilerplate)
+    elif args.command == 'export':
+        store_path = os.path.join(args.store, STORE_FILE_NAME) if os.path.isdir(args.store) else args.store
+        if not args.txt and not args.epub:
+            arg_parser.error("export 需要 --txt 或 --epub")
+        if not os.path.isfile(store_path):
+            arg_parser.error(f"章节存储文件不存在: {store_path}")
+        chapter_store = ChapterStore(store_path)
+        try:
+            if args.txt:
+                export_store_txt(chapter_store, args.txt)
+                print(f"已导出 TXT: {args.txt}")
+            if args.epub:
+                export_store_epub(chapter_store, args.epub)
+                print(f"已导出 EPUB: {args.epub}")
+        finally:
+            chapter_store.close()
+    elif args.command == 'pack':
+        print(f"已打包 {pack_chapter_files(args.directory)} 个章节到: {os.path.join(args.directory, STORE_FILE_NAME)}")
+    else:
+        scrape_single_chapter(url, chapter_index)
 
-except requests.exceptions.RequestException as e:
-    print(f"获取网页失败: {e}")
-except Exception as e:
-    print(f"发生了其他错误: {e}") 
\ No newline at end of file
+    if args.command != 'crawl': # crawl 模式下各工作进程分别输出自己的统计
+        print_network_report(args.net_stats)
+    if chapter_index is not None:
+        chapter_index.close()
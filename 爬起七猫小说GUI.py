@@ -1,11 +1,31 @@
 import tkinter as tk
-from tkinter import filedialog, scrolledtext, messagebox
+from tkinter import filedialog, scrolledtext, messagebox, ttk
 import requests
+import requests.adapters
+import net_instrument
+from net_instrument import network_stats, configure_egress, get_http_session
+from qimao_common import (resolve_response_encoding, STREAM_WRITE_BUFFER_BYTES, ChapterStream, ChapterAssembler,
+                          pump_chapter, BOILERPLATE_FILE_NAME, BoilerplateDetector, BoilerplateFilterSink, ChapterIndex)
 from bs4 import BeautifulSoup
 import os
 import threading # To prevent GUI freezing during network requests
+import queue
+import time
+import sqlite3
+from collections import OrderedDict
+from urllib.parse import urljoin
+
+# --- Network Timing Statistics ---
+# Histograms, timed connections and TimedHTTPAdapter live in net_instrument.py (shared with the other scripts).
+NETWORK_LABEL_REFRESH_MS = 1000 # How often the live network summary is refreshed
+
 
 # --- Core Scraping Logic (adapted from your script) ---
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
 def scrape_novel_chapter(url):
     """
     Scrapes the chapter title and content from the given URL.
@@ -14,17 +34,16 @@ def scrape_novel_chapter(url):
         url (str): The URL of the novel chapter.
 
     Returns:
-        tuple: (chapter_title, novel_paragraphs_text, error_message)
-               Returns (None, None, error_message) if an error occurs.
+        tuple: (chapter_title, novel_paragraphs_text, error_message, next_chapter_url)
+               Returns (None, None, error_message, None) if an error occurs.
+               next_chapter_url is None when the page has no "下一章" link.
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
     try:
-        response = requests.get(url, headers=headers, timeout=20) # Increased timeout
+        response = get_http_session().get(url, headers=REQUEST_HEADERS, timeout=20) # Increased timeout
         response.raise_for_status()
-        response.encoding = response.apparent_encoding
+        response.encoding = resolve_response_encoding(response)
         soup = BeautifulSoup(response.text, 'html.parser')
+        next_chapter_url = find_next_chapter_url(soup, response.url)
 
         # 提取章节标题 (Extract chapter title)
         chapter_title_tag = soup.find('h2', class_='chapter-title')
@@ -70,26 +89,286 @@ def scrape_novel_chapter(url):
                 if all_text:
                     novel_paragraphs_text = [p.strip() for p in all_text.split('\n') if p.strip()]
                 else:
-                    return chapter_title, [], "在指定正文区域内没有找到 <p> 标签或任何文本内容。" # No <p> tags or any text found in content area
+                    return chapter_title, [], "在指定正文区域内没有找到 <p> 标签或任何文本内容。", next_chapter_url # No <p> tags or any text found in content area
         else:
-            return chapter_title, [], "未能找到主要内容区域。请检查HTML结构或尝试不同的选择器。" # Could not find main content area
+            return chapter_title, [], "未能找到主要内容区域。请检查HTML结构或尝试不同的选择器。", next_chapter_url # Could not find main content area
 
         if not novel_paragraphs_text:
-            return chapter_title, [], "未能提取到小说正文内容。" # Failed to extract novel content
+            return chapter_title, [], "未能提取到小说正文内容。", next_chapter_url # Failed to extract novel content
 
-        return chapter_title, novel_paragraphs_text, None
+        return chapter_title, novel_paragraphs_text, None, next_chapter_url
 
     except requests.exceptions.RequestException as e:
-        return None, None, f"获取网页失败 (Failed to fetch webpage): {e}"
+        return None, None, f"获取网页失败 (Failed to fetch webpage): {e}", None
     except Exception as e:
-        return None, None, f"发生其他错误 (An unexpected error occurred): {e}"
+        return None, None, f"发生其他错误 (An unexpected error occurred): {e}", None
+
+
+def find_next_chapter_url(soup, page_url):
+    """Returns the absolute URL of the page's "下一章" (next chapter) link, or None."""
+    for link in soup.find_all('a', href=True):
+        if '下一章' in link.get_text() and not link['href'].startswith('javascript'):
+            return urljoin(page_url, link['href'])
+    return None
+
+
+# --- Chapter Sinks ---
+# Consumers of the chapter stream produced by qimao_common.ChapterStream (fed by pump_chapter).
+
+
+class ChapterFileSink:
+    """Writes a chapter stream to a text file through a write buffer; the path is chosen once the title is known."""
+
+    def __init__(self, path_for_title):
+        self.path_for_title = path_for_title
+        self.file = None
+        self.file_path = None
+        self.paragraph_count = 0
+
+    def start(self, chapter_title):
+        self.file_path = self.path_for_title(chapter_title)
+        self.file = open(self.file_path, 'w', encoding='utf-8', buffering=STREAM_WRITE_BUFFER_BYTES)
+        self.file.write(f"章节标题 (Chapter Title): {chapter_title}\n\n")
+
+    def paragraph(self, paragraph_text):
+        self.paragraph_count += 1
+        self.file.write(paragraph_text + "\n\n") # Add extra newline for readability
+
+    def finish(self):
+        if not self.paragraph_count:
+            self.file.write("（未能提取到正文内容）((Failed to extract content))")
+        self.file.close()
+
+    def abort(self):
+        """Removes the half-written file when the stream fails."""
+        if self.file is not None:
+            self.file.close()
+            os.remove(self.file_path)
+
+
+class ChapterLogSink:
+    """Sends a chapter stream to a log function: the title, the first `preview_paragraphs` paragraphs and a count."""
+
+    def __init__(self, log, preview_paragraphs=0):
+        self.log = log
+        self.preview_paragraphs = preview_paragraphs
+        self.chapter_title = None
+        self.paragraph_count = 0
+
+    def start(self, chapter_title):
+        self.chapter_title = chapter_title
+        if self.preview_paragraphs:
+            self.log(f"章节标题 (Chapter Title): {chapter_title}")
+
+    def paragraph(self, paragraph_text):
+        self.paragraph_count += 1
+        if self.paragraph_count <= self.preview_paragraphs:
+            self.log(paragraph_text)
+
+    def finish(self):
+        self.log(f"{self.chapter_title}: {self.paragraph_count} 段 ({self.paragraph_count} paragraphs)")
+
+    def abort(self):
+        pass
+
+
+# --- Boilerplate stripping (BoilerplateDetector lives in qimao_common.py) ---
+BOILERPLATE_REPORT_HEADER = "去除重复行 {total} 处 (Removed {total} boilerplate lines, {distinct} distinct, {kilobytes:.1f} KB):"
+
+
+# --- Next-Chapter Prefetching ---
+PREFETCH_DEFAULT_DEPTH = 2 # Chapters fetched ahead of the one being read
+PREFETCH_MAX_DEPTH = 5
+PREFETCH_CACHE_MAX_BYTES = 4 * 1024 * 1024 # Memory cap for cached chapter text (UTF-8 size)
+PREFETCH_CACHE_MAX_ENTRIES = 16
+
+
+class ChapterPrefetcher:
+    """
+    Fetches chapters through a small LRU cache and speculatively fetches the next
+    chapters in the background, so opening the next chapter needs no network wait.
+    A chapter that is still being prefetched is waited for instead of fetched twice.
+    """
+
+    def __init__(self, fetch=scrape_novel_chapter, max_bytes=PREFETCH_CACHE_MAX_BYTES,
+                 max_entries=PREFETCH_CACHE_MAX_ENTRIES):
+        self.fetch = fetch
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.cache = OrderedDict() # url -> (scrape result, size in bytes), least recently used first
+        self.cache_bytes = 0
+        self.in_flight = {} # url -> threading.Event set when that fetch finishes
+        self.generation = 0 # Bumped on every new prefetch chain; older chains stop
+
+    def get(self, url):
+        """Returns (scrape result, from_cache) for url, using the cache or an in-flight prefetch if possible."""
+        while True:
+            with self.lock:
+                if url in self.cache:
+                    self.cache.move_to_end(url)
+                    return self.cache[url][0], True
+                event = self.in_flight.get(url)
+                if event is None:
+                    event = self.in_flight[url] = threading.Event()
+                    break
+            event.wait() # Another thread is fetching this chapter; use its result (or retry if it failed)
+            with self.lock:
+                if url in self.cache:
+                    self.cache.move_to_end(url)
+                    return self.cache[url][0], True
+
+        try:
+            result = self.fetch(url)
+            if result[2] is None: # Only successful chapters are cached
+                self._store(url, result)
+        finally:
+            with self.lock:
+                self.in_flight.pop(url, None)
+            event.set()
+        return result, False
+
+    def _store(self, url, result):
+        size = len(result[0].encode('utf-8')) + sum(len(text.encode('utf-8')) for text in result[1])
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if url in self.cache:
+                self.cache_bytes -= self.cache.pop(url)[1]
+            self.cache[url] = (result, size)
+            self.cache_bytes += size
+            while self.cache_bytes > self.max_bytes or len(self.cache) > self.max_entries:
+                _, (_, evicted_size) = self.cache.popitem(last=False)
+                self.cache_bytes -= evicted_size
+
+    def prefetch(self, next_url, depth):
+        """Starts fetching up to `depth` chapters from next_url onwards in a background thread."""
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        if next_url and depth > 0:
+            threading.Thread(target=self._prefetch_chain, args=(next_url, depth, generation), daemon=True).start()
+
+    def _prefetch_chain(self, url, depth, generation):
+        for _ in range(depth):
+            if not url or generation != self.generation: # The reader moved elsewhere
+                return
+            result, _ = self.get(url)
+            if result[2] is not None:
+                return
+            url = result[3]
+
+# --- Batch Scraping ---
+# Many chapter URLs (typed one per line or imported from a file) go into a job queue that a
+# pool of worker threads drains; each worker has its own keep-alive session, so throughput
+# grows with the worker count. Workers never touch widgets: they report progress through an
+# event queue that the GUI applies every BATCH_POLL_MS milliseconds.
+BATCH_DEFAULT_WORKERS = 4
+BATCH_MAX_WORKERS = 16
+BATCH_POLL_MS = 100
+BATCH_EVENTS_PER_POLL = 200 # Caps UI work per poll so large batches never stall the window
+LOG_MAX_LINES = 1000 # Older status lines are dropped to keep the log widget fast
+BATCH_STATUS_LABELS = {
+    'queued': "排队 (Queued)",
+    'running': "抓取中 (Running)",
+    'done': "完成 (Done)",
+    'failed': "失败 (Failed)",
+    'cancelled': "已取消 (Cancelled)",
+}
+
+
+def chapter_filename_base(chapter_title):
+    """Filename-safe version of a chapter title; "scraped_novel_content" if nothing usable is left."""
+    if not chapter_title or chapter_title == "未找到标题":
+        return "scraped_novel_content"
+    # Remove characters invalid for filenames
+    filename_base = "".join(c for c in chapter_title if c.isalnum() or c in (' ', '.', '_')).rstrip()
+    return filename_base or "scraped_novel_content"
+
+
+def write_chapter_file(file_path, chapter_title, novel_paragraphs):
+    """Writes a chapter as a text file (title line, then one paragraph per block)."""
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(f"章节标题 (Chapter Title): {chapter_title}\n\n")
+        if novel_paragraphs:
+            for paragraph_text in novel_paragraphs:
+                f.write(paragraph_text + "\n\n") # Add extra newline for readability
+        else:
+            f.write("（未能提取到正文内容）((Failed to extract content))")
+
+
+class BatchScraper:
+    """
+    Scrapes a list of chapter URLs with a pool of worker threads. `process(job_number, url)`
+    runs on the worker thread, fetches and saves one chapter and returns
+    (chapter_title, file_path); it raises RequestException, OSError or ValueError on failure.
+    Progress is put on `events` as (kind, job_number, detail) tuples; kind is a
+    BATCH_STATUS_LABELS key, 'log', or 'finished'.
+    """
+
+    def __init__(self, process):
+        self.process = process
+        self.events = queue.Queue()
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.active_workers = 0
+        self.cancelled = threading.Event()
+
+    @property
+    def running(self):
+        with self.lock:
+            return self.active_workers > 0
+
+    def start(self, urls, workers=BATCH_DEFAULT_WORKERS):
+        """Queues urls (job numbers start at 1) and starts up to `workers` threads."""
+        self.cancelled.clear()
+        for job_number, url in enumerate(urls, start=1):
+            self.jobs.put((job_number, url))
+        worker_count = max(1, min(workers, len(urls)))
+        with self.lock:
+            self.active_workers += worker_count
+        for _ in range(worker_count):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def cancel(self):
+        """Stops handing out queued jobs; chapters already being fetched still finish."""
+        self.cancelled.set()
+
+    def _worker(self):
+        try:
+            while True:
+                try:
+                    job_number, url = self.jobs.get_nowait()
+                except queue.Empty:
+                    return
+                if self.cancelled.is_set():
+                    self.events.put(('cancelled', job_number, ""))
+                    continue
+                self.events.put(('running', job_number, ""))
+                try:
+                    chapter_title, file_path = self.process(job_number, url)
+                except requests.exceptions.RequestException as e:
+                    self.events.put(('failed', job_number, f"获取网页失败 (Failed to fetch webpage): {e}"))
+                except OSError as e:
+                    self.events.put(('failed', job_number, f"保存文件失败 (Failed to save file): {e}"))
+                except ValueError as e:
+                    self.events.put(('failed', job_number, str(e)))
+                else:
+                    self.events.put(('done', job_number, (chapter_title, file_path)))
+        finally:
+            with self.lock:
+                self.active_workers -= 1
+                finished = self.active_workers == 0
+            if finished:
+                self.events.put(('finished', None, None))
+
 
 # --- GUI Application ---
 class NovelScraperApp:
     def __init__(self, master):
         self.master = master
         master.title("Python小说抓取器 (Novel Scraper)")
-        master.geometry("700x550") # Adjusted size for better layout
+        master.geometry("760x970") # Adjusted size for better layout
 
         # --- Styling ---
         self.label_font = ("Arial", 10)
@@ -116,21 +395,143 @@ class NovelScraperApp:
         self.scrape_button = tk.Button(master, text="开始抓取 (Start Scraping)", command=self.start_scraping_thread, font=self.button_font, bg="#4CAF50", fg="white")
         self.scrape_button.grid(row=2, column=0, columnspan=3, padx=10, pady=10, sticky="ew")
 
+        # --- Next Chapter / Prefetch ---
+        tk.Label(master, text="预取章节数 (Prefetch depth):", font=self.label_font).grid(row=3, column=0, padx=10, pady=5, sticky="w")
+        self.prefetch_depth_var = tk.IntVar(value=PREFETCH_DEFAULT_DEPTH)
+        tk.Spinbox(master, from_=0, to=PREFETCH_MAX_DEPTH, width=5, textvariable=self.prefetch_depth_var, font=self.entry_font).grid(row=3, column=1, padx=10, pady=5, sticky="w")
+        self.next_button = tk.Button(master, text="下一章 (Next Chapter)", command=self.open_next_chapter, font=self.button_font, state=tk.DISABLED)
+        self.next_button.grid(row=3, column=2, padx=5, pady=5, sticky="ew")
+        self.next_chapter_url = None
+        self.prefetcher = ChapterPrefetcher()
+
         # --- Status/Output Area ---
-        tk.Label(master, text="状态/输出 (Status/Output):", font=self.label_font).grid(row=3, column=0, padx=10, pady=5, sticky="w")
-        self.status_text = scrolledtext.ScrolledText(master, width=80, height=20, wrap=tk.WORD, font=self.text_area_font)
-        self.status_text.grid(row=4, column=0, columnspan=3, padx=10, pady=5, sticky="nsew")
+        tk.Label(master, text="状态/输出 (Status/Output):", font=self.label_font).grid(row=4, column=0, padx=10, pady=5, sticky="w")
+        self.status_text = scrolledtext.ScrolledText(master, width=80, height=12, wrap=tk.WORD, font=self.text_area_font)
+        self.status_text.grid(row=5, column=0, columnspan=3, padx=10, pady=5, sticky="nsew")
         self.status_text.insert(tk.END, "请填入URL和选择保存位置，然后点击“开始抓取”。\n(Please enter the URL, choose a save location, and click 'Start Scraping'.)\n")
 
+        # --- Network Statistics (live summary + JSON export) ---
+        tk.Label(master, text="网络统计 (Network):", font=self.label_font).grid(row=6, column=0, padx=10, pady=5, sticky="w")
+        self.network_label = tk.Label(master, text="-", font=self.label_font, anchor="w")
+        self.network_label.grid(row=6, column=1, padx=10, pady=5, sticky="ew")
+        tk.Button(master, text="导出统计 (Export)", command=self.export_network_stats, font=self.label_font).grid(row=6, column=2, padx=5, pady=5, sticky="ew")
+        master.after(NETWORK_LABEL_REFRESH_MS, self.refresh_network_label)
+
+        # --- Batch Scraping (one URL per line, processed by a worker pool) ---
+        batch_frame = tk.LabelFrame(master, text="批量抓取 (Batch Scraping)", font=self.label_font)
+        batch_frame.grid(row=7, column=0, columnspan=3, padx=10, pady=5, sticky="nsew")
+        batch_frame.grid_columnconfigure(0, weight=1)
+        self.batch_urls_text = scrolledtext.ScrolledText(batch_frame, height=5, wrap=tk.NONE, font=self.text_area_font)
+        self.batch_urls_text.grid(row=0, column=0, rowspan=4, padx=5, pady=5, sticky="nsew")
+        tk.Button(batch_frame, text="导入文件 (Import File)", command=self.import_url_file, font=self.label_font).grid(row=0, column=1, columnspan=2, padx=5, pady=2, sticky="ew")
+        tk.Label(batch_frame, text="线程数 (Workers):", font=self.label_font).grid(row=1, column=1, padx=5, pady=2, sticky="w")
+        self.batch_workers_var = tk.IntVar(value=BATCH_DEFAULT_WORKERS)
+        tk.Spinbox(batch_frame, from_=1, to=BATCH_MAX_WORKERS, width=4, textvariable=self.batch_workers_var, font=self.entry_font).grid(row=1, column=2, padx=5, pady=2, sticky="w")
+        self.batch_start_button = tk.Button(batch_frame, text="开始批量 (Start Batch)", command=self.start_batch, font=self.button_font, bg="#4CAF50", fg="white")
+        self.batch_start_button.grid(row=2, column=1, columnspan=2, padx=5, pady=2, sticky="ew")
+        self.batch_stop_button = tk.Button(batch_frame, text="停止 (Stop)", command=self.stop_batch, font=self.label_font, state=tk.DISABLED)
+        self.batch_stop_button.grid(row=3, column=1, columnspan=2, padx=5, pady=2, sticky="ew")
+
+        self.batch_tree = ttk.Treeview(batch_frame, columns=("number", "status", "title", "url"), show="headings", height=8)
+        for column, heading, width in (("number", "#", 40), ("status", "状态 (Status)", 110),
+                                       ("title", "章节 (Chapter)", 200), ("url", "URL", 300)):
+            self.batch_tree.heading(column, text=heading)
+            self.batch_tree.column(column, width=width, stretch=column in ("title", "url"))
+        self.batch_tree.grid(row=4, column=0, columnspan=2, padx=5, pady=5, sticky="nsew")
+        batch_tree_scroll = ttk.Scrollbar(batch_frame, orient=tk.VERTICAL, command=self.batch_tree.yview)
+        batch_tree_scroll.grid(row=4, column=2, pady=5, sticky="nsw")
+        self.batch_tree.configure(yscrollcommand=batch_tree_scroll.set)
+        self.batch_progress_label = tk.Label(batch_frame, text="-", font=self.label_font, anchor="w")
+        self.batch_progress_label.grid(row=5, column=0, columnspan=3, padx=5, pady=2, sticky="ew")
+
+        # --- Egress Routes (proxy URLs, local IPs or "direct", separated by spaces or commas; empty = direct) ---
+        tk.Label(master, text="出口线路 (Egress):", font=self.label_font).grid(row=8, column=0, padx=10, pady=5, sticky="w")
+        self.egress_entry = tk.Entry(master, width=70, font=self.entry_font)
+        self.egress_entry.grid(row=8, column=1, columnspan=2, padx=10, pady=5, sticky="ew")
+        self.egress_specs = []
+        self.egress_messages = queue.Queue() # Pool messages come from worker threads; shown by refresh_network_label
+
+        # --- Boilerplate stripping (one detector per save folder, i.e. per book) ---
+        self.strip_boilerplate_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(master, text="去除各章重复出现的推广/水印行 (Strip repeated promo/watermark lines)",
+                       variable=self.strip_boilerplate_var, font=self.label_font).grid(row=9, column=0, columnspan=3, padx=10, pady=5, sticky="w")
+        self.boilerplate_detectors = {}
+        self.batch_boilerplate = None
+
+        self.batch_scraper = BatchScraper(self.process_batch_chapter)
+        self.batch_save_dir = None
+        self.batch_counts = {}
+        master.after(BATCH_POLL_MS, self.process_batch_events)
+
         # --- Configure grid column weights for responsiveness ---
         master.grid_columnconfigure(1, weight=1) # Allow entry fields to expand
 
+        # --- Full-text index (optional: scraping works without it) ---
+        try:
+            self.chapter_index = ChapterIndex()
+        except (RuntimeError, sqlite3.Error) as e:
+            self.chapter_index = None
+            self.log_status(f"全文索引不可用 (Full-text index unavailable): {e}")
+
     def log_status(self, message):
-        """Appends a message to the status text area."""
+        """Appends a message to the status text area, keeping at most LOG_MAX_LINES lines."""
         self.status_text.insert(tk.END, message + "\n")
+        excess_lines = int(self.status_text.index('end-1c').split('.')[0]) - LOG_MAX_LINES
+        if excess_lines > 0:
+            self.status_text.delete("1.0", f"{excess_lines + 1}.0")
         self.status_text.see(tk.END) # Auto-scroll to the bottom
         self.master.update_idletasks() # Ensure GUI updates
 
+    def refresh_network_label(self):
+        """Periodically updates the live network summary."""
+        if network_stats.hosts:
+            self.network_label.config(text=network_stats.live_summary())
+        while not self.egress_messages.empty():
+            self.log_status(self.egress_messages.get_nowait())
+        self.master.after(NETWORK_LABEL_REFRESH_MS, self.refresh_network_label)
+
+    def boilerplate_detector(self, save_dir):
+        """Returns the save folder's BoilerplateDetector, or None when stripping is turned off."""
+        if not self.strip_boilerplate_var.get():
+            return None
+        folder = os.path.abspath(save_dir)
+        if folder not in self.boilerplate_detectors:
+            self.boilerplate_detectors[folder] = BoilerplateDetector(os.path.join(folder, BOILERPLATE_FILE_NAME))
+        return self.boilerplate_detectors[folder]
+
+    def apply_egress_settings(self):
+        """Rebuilds the egress pool when the route list changed; returns False (after reporting) if it is invalid."""
+        egress_specs = self.egress_entry.get().replace('，', ',').replace(',', ' ').split()
+        if egress_specs == self.egress_specs: # Unchanged: keep route statistics and quarantines
+            return True
+        try:
+            configure_egress(egress_specs, log=self.egress_messages.put)
+        except ValueError as e:
+            messagebox.showerror("错误 (Error)", f"出口线路配置错误 (Invalid egress routes): {e}")
+            return False
+        self.egress_specs = egress_specs
+        if egress_specs:
+            self.log_status(f"使用 {len(egress_specs)} 条出口线路 (Using {len(egress_specs)} egress routes)")
+        return True
+
+    def export_network_stats(self):
+        """Logs the per-host timing report and saves it as JSON."""
+        if not network_stats.hosts:
+            messagebox.showinfo("网络统计 (Network)", "还没有网络请求。 (No requests recorded yet.)")
+            return
+        egress_pool = net_instrument.egress_pool
+        for line in network_stats.report_lines() + (egress_pool.report_lines() if egress_pool is not None else []):
+            self.log_status(line)
+        path = filedialog.asksaveasfilename(defaultextension=".json", initialfile="network_stats.json",
+                                            filetypes=[("JSON", "*.json")])
+        if not path:
+            return
+        try:
+            network_stats.export_json(path)
+            self.log_status(f"网络统计已导出到 (Network stats exported to): {path}")
+        except OSError as e:
+            messagebox.showerror("导出失败 (Export Failed)", str(e))
+
     def browse_directory(self):
         """Opens a dialog to choose a save directory."""
         directory = filedialog.askdirectory()
@@ -139,9 +540,18 @@ class NovelScraperApp:
             self.save_dir_entry.insert(0, directory)
             self.log_status(f"保存位置已选择 (Save location selected): {directory}")
 
+    def open_next_chapter(self):
+        """Loads the next chapter of the last scraped page (usually already prefetched)."""
+        if not self.next_chapter_url:
+            return
+        self.url_entry.delete(0, tk.END)
+        self.url_entry.insert(0, self.next_chapter_url)
+        self.start_scraping_thread()
+
     def start_scraping_thread(self):
         """Starts the scraping process in a new thread to avoid freezing the GUI."""
         self.scrape_button.config(state=tk.DISABLED, text="正在抓取... (Scraping...)")
+        self.next_button.config(state=tk.DISABLED)
         self.log_status("开始抓取过程... (Starting scraping process...)")
         
         url = self.url_entry.get().strip()
@@ -162,17 +572,170 @@ class NovelScraperApp:
             self.log_status(f"错误：无效的保存文件夹 (Error: Invalid save directory): {save_dir}")
             self.scrape_button.config(state=tk.NORMAL, text="开始抓取 (Start Scraping)")
             return
+        if not self.apply_egress_settings():
+            self.scrape_button.config(state=tk.NORMAL, text="开始抓取 (Start Scraping)")
+            return
+
+        try:
+            prefetch_depth = max(0, min(PREFETCH_MAX_DEPTH, self.prefetch_depth_var.get()))
+        except tk.TclError: # Non-numeric text in the spinbox
+            prefetch_depth = PREFETCH_DEFAULT_DEPTH
 
         # Run scraping in a separate thread
-        thread = threading.Thread(target=self.perform_scraping, args=(url, save_dir))
+        thread = threading.Thread(target=self.perform_scraping,
+                                  args=(url, save_dir, prefetch_depth, self.boilerplate_detector(save_dir)))
         thread.daemon = True # Allows main program to exit even if thread is running
         thread.start()
 
-    def perform_scraping(self, url, save_dir):
-        """The actual scraping and file saving logic."""
+    def import_url_file(self):
+        """Appends the URLs from a text file (one per line) to the batch list."""
+        path = filedialog.askopenfilename(filetypes=[("文本文件 (Text files)", "*.txt"), ("所有文件 (All files)", "*.*")])
+        if not path:
+            return
+        try:
+            with open(path, 'r', encoding='utf-8-sig') as f:
+                urls = [line.strip() for line in f if line.strip().startswith(('http://', 'https://'))]
+        except (OSError, UnicodeDecodeError) as e:
+            messagebox.showerror("导入失败 (Import Failed)", str(e))
+            return
+        if self.batch_urls_text.get("1.0", "end-1c").strip():
+            self.batch_urls_text.insert(tk.END, "\n")
+        self.batch_urls_text.insert(tk.END, "\n".join(urls))
+        self.log_status(f"已导入 {len(urls)} 个URL (Imported {len(urls)} URLs): {path}")
+
+    def start_batch(self):
+        """Queues every URL in the batch list and starts the worker pool."""
+        if self.batch_scraper.running:
+            return
+        urls = list(dict.fromkeys(line.strip() for line in self.batch_urls_text.get("1.0", tk.END).splitlines()
+                                  if line.strip().startswith(('http://', 'https://')))) # Drop duplicates, keep order
+        save_dir = self.save_dir_entry.get().strip()
+        if not urls:
+            messagebox.showerror("错误 (Error)", "请在批量列表中每行填入一个URL。 (Please enter one URL per line in the batch list.)")
+            return
+        if not save_dir or not os.path.isdir(save_dir):
+            messagebox.showerror("错误 (Error)", "选择的保存位置不是一个有效的文件夹。 (The selected save location is not a valid directory.)")
+            return
+        if not self.apply_egress_settings():
+            return
+        try:
+            workers = max(1, min(BATCH_MAX_WORKERS, self.batch_workers_var.get()))
+        except tk.TclError: # Non-numeric text in the spinbox
+            workers = BATCH_DEFAULT_WORKERS
+
+        self.batch_tree.delete(*self.batch_tree.get_children())
+        for job_number, url in enumerate(urls, start=1):
+            self.batch_tree.insert("", tk.END, iid=str(job_number),
+                                   values=(job_number, BATCH_STATUS_LABELS['queued'], "", url))
+        self.batch_save_dir = save_dir
+        self.batch_boilerplate = self.boilerplate_detector(save_dir)
+        self.batch_number_width = len(str(len(urls)))
+        self.batch_counts = {'total': len(urls), 'done': 0, 'failed': 0, 'cancelled': 0}
+        self.batch_start_time = time.time()
+        self.batch_start_button.config(state=tk.DISABLED)
+        self.batch_stop_button.config(state=tk.NORMAL)
+        self.log_status(f"开始批量抓取 {len(urls)} 个章节，{workers} 个线程 (Batch of {len(urls)} chapters, {workers} workers)")
+        self.batch_scraper.start(urls, workers)
+
+    def stop_batch(self):
+        self.batch_scraper.cancel()
+        self.batch_stop_button.config(state=tk.DISABLED)
+        self.log_status("正在停止批量抓取... (Stopping batch...)")
+
+    def process_batch_chapter(self, job_number, url):
+        """
+        Streams one batch chapter straight into its file (called on a worker thread); files are
+        numbered in queue order. The whole chapter is only assembled in memory for the index.
+        """
+        def log(message):
+            self.batch_scraper.events.put(('log', job_number, message))
+
+        file_sink = ChapterFileSink(lambda chapter_title: os.path.join(
+            self.batch_save_dir, f"{job_number:0{self.batch_number_width}d}_{chapter_filename_base(chapter_title)}.txt"))
+        assembler = ChapterAssembler() if self.chapter_index is not None else None
+        sinks = [file_sink, ChapterLogSink(log)] + ([assembler] if assembler is not None else [])
+        if self.batch_boilerplate is not None:
+            sinks = [BoilerplateFilterSink(self.batch_boilerplate, *sinks)]
+        chapter_stream = ChapterStream(url, headers=REQUEST_HEADERS)
+        chapter_title, paragraph_count = pump_chapter(chapter_stream, *sinks)
+        error_msg = chapter_stream.error_message(paragraph_count)
+        if error_msg: # Same rule as single-chapter mode: nothing is saved without content
+            os.remove(file_sink.file_path)
+            raise ValueError(error_msg)
+        if assembler is not None:
+            try:
+                self.chapter_index.add_chapter(file_sink.file_path, os.path.basename(os.path.abspath(self.batch_save_dir)),
+                                               chapter_title or "", assembler.novel_paragraphs_text)
+            except sqlite3.Error as e:
+                log(f"警告：章节加入全文索引失败 (Warning: failed to index chapter): {e}")
+        return chapter_title, file_sink.file_path
+
+    def process_batch_events(self):
+        """Applies worker progress to the job list and log (runs on the GUI thread)."""
+        for _ in range(BATCH_EVENTS_PER_POLL):
+            try:
+                kind, job_number, detail = self.batch_scraper.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'log':
+                self.log_status(f"[{job_number}] {detail}")
+                continue
+            if kind == 'finished':
+                counts = self.batch_counts
+                self.log_status(f"批量抓取结束 (Batch finished): 完成 {counts['done']}，失败 {counts['failed']}，"
+                                f"取消 {counts['cancelled']}，用时 {time.time() - self.batch_start_time:.1f} 秒")
+                if self.batch_boilerplate is not None:
+                    for line in self.batch_boilerplate.report_lines(BOILERPLATE_REPORT_HEADER):
+                        self.log_status(line)
+                    try:
+                        self.batch_boilerplate.save()
+                    except OSError as e:
+                        self.log_status(f"警告：保存重复行计数器失败 (Warning: failed to save boilerplate counter): {e}")
+                self.batch_start_button.config(state=tk.NORMAL)
+                self.batch_stop_button.config(state=tk.DISABLED)
+                continue
+            row = str(job_number)
+            self.batch_tree.set(row, "status", BATCH_STATUS_LABELS[kind])
+            if kind == 'done':
+                chapter_title, file_path = detail
+                self.batch_tree.set(row, "title", chapter_title)
+                self.log_status(f"[{job_number}] 已保存 (Saved): {file_path}")
+            elif kind == 'failed':
+                self.batch_tree.set(row, "title", detail)
+                self.log_status(f"[{job_number}] 抓取错误 (Scraping error): {detail}")
+            elif kind == 'running':
+                self.batch_tree.see(row)
+            if kind in self.batch_counts:
+                self.batch_counts[kind] += 1
+                counts = self.batch_counts
+                self.batch_progress_label.config(
+                    text=f"{counts['done'] + counts['failed'] + counts['cancelled']}/{counts['total']}  "
+                         f"完成 (Done) {counts['done']}  失败 (Failed) {counts['failed']}")
+        self.master.after(BATCH_POLL_MS, self.process_batch_events)
+
+    def index_saved_chapter(self, file_path, save_dir, chapter_title, novel_paragraphs):
+        """Adds a saved chapter to the full-text index; the book name is the save folder's name."""
+        if self.chapter_index is None:
+            return
+        try:
+            self.chapter_index.add_chapter(file_path, os.path.basename(os.path.abspath(save_dir)),
+                                           chapter_title or "", novel_paragraphs or [])
+        except sqlite3.Error as e:
+            self.log_status(f"警告：章节加入全文索引失败 (Warning: failed to index chapter): {e}")
+
+    def perform_scraping(self, url, save_dir, prefetch_depth=PREFETCH_DEFAULT_DEPTH, boilerplate=None):
+        """The actual scraping and file saving logic; boilerplate (a BoilerplateDetector) strips repeated lines."""
         self.log_status(f"正在尝试从 {url} 获取网页内容... (Attempting to fetch content from {url}...)")
         
-        chapter_title, novel_paragraphs, error_msg = scrape_novel_chapter(url)
+        (chapter_title, novel_paragraphs, error_msg, next_chapter_url), from_cache = self.prefetcher.get(url)
+        if from_cache:
+            self.log_status("已从预取缓存读取 (Loaded from prefetch cache)")
+
+        # Start fetching the following chapters while this one is being read and saved
+        self.next_chapter_url = next_chapter_url
+        self.prefetcher.prefetch(next_chapter_url, prefetch_depth)
+        if next_chapter_url:
+            self.next_button.config(state=tk.NORMAL)
 
         if error_msg:
             self.log_status(f"抓取错误 (Scraping error): {error_msg}")
@@ -180,14 +743,20 @@ class NovelScraperApp:
             self.scrape_button.config(state=tk.NORMAL, text="开始抓取 (Start Scraping)")
             return
 
+        if boilerplate is not None and novel_paragraphs:
+            paragraph_count = len(novel_paragraphs)
+            novel_paragraphs = boilerplate.filter(novel_paragraphs)
+            if len(novel_paragraphs) < paragraph_count:
+                removed = paragraph_count - len(novel_paragraphs)
+                self.log_status(f"已去除 {removed} 行重复内容 (Removed {removed} boilerplate lines)")
+            try:
+                boilerplate.save()
+            except OSError as e:
+                self.log_status(f"警告：保存重复行计数器失败 (Warning: failed to save boilerplate counter): {e}")
+
         if not chapter_title or chapter_title == "未找到标题":
             self.log_status("警告：没有找到章节标题，将使用默认文件名。 (Warning: Chapter title not found, using default filename.)")
-            filename_base = "scraped_novel_content"
-        else:
-            # Sanitize filename (remove characters invalid for filenames)
-            filename_base = "".join(c for c in chapter_title if c.isalnum() or c in (' ', '.', '_')).rstrip()
-            if not filename_base: # If title was all special chars
-                filename_base = "scraped_novel_content"
+        filename_base = chapter_filename_base(chapter_title)
         
         filename = f"{filename_base}.txt"
         file_path = os.path.join(save_dir, filename)
@@ -209,14 +778,9 @@ class NovelScraperApp:
 
 
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(f"章节标题 (Chapter Title): {chapter_title}\n\n")
-                if novel_paragraphs:
-                    for paragraph_text in novel_paragraphs:
-                        f.write(paragraph_text + "\n\n") # Add extra newline for readability
-                else:
-                    f.write("（未能提取到正文内容）((Failed to extract content))")
+            write_chapter_file(file_path, chapter_title, novel_paragraphs)
             self.log_status(f"\n小说内容已成功保存到 (Novel content successfully saved to): {file_path}")
+            self.index_saved_chapter(file_path, save_dir, chapter_title, novel_paragraphs)
             messagebox.showinfo("成功 (Success)", f"小说内容已保存到:\n{file_path}")
         except OSError as e:
             self.log_status(f"\n保存文件失败 (Failed to save file): {e}. 文件名可能包含非法字符或路径问题。 (Filename might contain invalid characters or path issues.)")
@@ -224,14 +788,9 @@ class NovelScraperApp:
             default_filename = "scraped_novel_default_name.txt"
             default_file_path = os.path.join(save_dir, default_filename)
             try:
-                with open(default_file_path, 'w', encoding='utf-8') as f:
-                    f.write(f"章节标题 (Chapter Title): {chapter_title}\n\n")
-                    if novel_paragraphs:
-                        for paragraph_text in novel_paragraphs:
-                            f.write(paragraph_text + "\n\n")
-                    else:
-                        f.write("（未能提取到正文内容）((Failed to extract content))")
+                write_chapter_file(default_file_path, chapter_title, novel_paragraphs)
                 self.log_status(f"由于原始文件名问题，内容已使用默认名称保存到 (Due to original filename issues, content saved with default name to): {default_file_path}")
+                self.index_saved_chapter(default_file_path, save_dir, chapter_title, novel_paragraphs)
                 messagebox.showinfo("成功 (Success)", f"小说内容已使用默认名称保存到:\n{default_file_path}")
             except Exception as e_default:
                 self.log_status(f"使用默认文件名保存也失败了 (Saving with default filename also failed): {e_default}")